@@ -151,32 +151,27 @@ async def populate_data(sheet_service: AsyncSheetServiceWithQueue):
     logger.info("--- STARTING DATA POPULATION ---")
 
     # --- Заполнение Товаров ---
+    # Пакетный create_rows: одна транзакция SQLite и один патч кэша на весь список,
+    # воркер отправит подряд идущие CREATE в лист одним append-запросом
     logger.info("\n--- POPULATING PRODUCTS ---")
-    products_created_count = 0
-    for product_payload in TEST_PRODUCTS_DATA:
-        logger.info(f"Attempting to create product: {product_payload.get('product_name')}")
-        # В реальном сценарии, если ID уже существует, create_row просто добавит новую строку.
-        # Для тестовых данных это может быть приемлемо, или нужна логика "update_or_create".
-        # Пока что просто создаем.
-        created_product = await sheet_service.create_row("Товары", product_payload)
-        if created_product:
-            products_created_count += 1
-            logger.info(f"Product '{product_payload.get('product_name')}' queued for creation. Optimistic data: {created_product}")
-        else:
-            logger.error(f"Failed to queue product '{product_payload.get('product_name')}' for creation.")
+    # В реальном сценарии, если ID уже существует, create_rows просто добавит новые строки.
+    # Для тестовых данных это может быть приемлемо, или нужна логика "update_or_create".
+    created_products = await sheet_service.create_rows("Товары", TEST_PRODUCTS_DATA)
+    if created_products is None:
+        logger.error(f"Failed to queue {len(TEST_PRODUCTS_DATA)} products for creation.")
+        products_created_count = 0
+    else:
+        products_created_count = len(created_products)
     logger.info(f"--- {products_created_count}/{len(TEST_PRODUCTS_DATA)} products queued for creation ---")
 
     # --- Заполнение Заказов ---
     logger.info("\n--- POPULATING ORDERS ---")
-    orders_created_count = 0
-    for order_payload in TEST_ORDERS_DATA:
-        logger.info(f"Attempting to create order: {order_payload.get('order_number')}")
-        created_order = await sheet_service.create_row("Заказы", order_payload)
-        if created_order:
-            orders_created_count += 1
-            logger.info(f"Order '{order_payload.get('order_number')}' queued for creation. Optimistic data: {created_order}")
-        else:
-            logger.error(f"Failed to queue order '{order_payload.get('order_number')}' for creation.")
+    created_orders = await sheet_service.create_rows("Заказы", TEST_ORDERS_DATA)
+    if created_orders is None:
+        logger.error(f"Failed to queue {len(TEST_ORDERS_DATA)} orders for creation.")
+        orders_created_count = 0
+    else:
+        orders_created_count = len(created_orders)
     logger.info(f"--- {orders_created_count}/{len(TEST_ORDERS_DATA)} orders queued for creation ---")
 
     # Даем время воркеру обработать очередь
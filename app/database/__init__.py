@@ -10,6 +10,11 @@ from .models import (
     SqliteBase,
     PendingSheetOperation,
 )
+from .cache_snapshot import SheetChangeSet, SheetSnapshot
+from .compact_rows import CompactRow, compact_row_class
+from .catalog_views import CatalogViews
+from .cache_query import CacheQuery, Contains, InSet, NotNull, Prefix, Range, SortKey
+from .sheet_backends import SheetBackend, ShillelaghGSheetBackend, LocalFakeSheetBackend
 from .sheet_service import AsyncSheetServiceWithQueue
 from config import (
     GOOGLE_SHEET_URL,
@@ -28,6 +33,21 @@ __all__ = [
     "Mailing",
     "User",  # ДОБАВЛЕНО User
     "PendingSheetOperation",
+    "SheetChangeSet",
+    "SheetSnapshot",
+    "CompactRow",
+    "compact_row_class",
+    "CatalogViews",
+    "CacheQuery",
+    "Range",
+    "InSet",
+    "Prefix",
+    "Contains",
+    "NotNull",
+    "SortKey",
+    "SheetBackend",
+    "ShillelaghGSheetBackend",
+    "LocalFakeSheetBackend",
     "AsyncSheetServiceWithQueue",
     "GOOGLE_SHEET_URL",
     "CREDENTIALS_JSON_PATH",
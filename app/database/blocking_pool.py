@@ -0,0 +1,144 @@
+# robotiaga-perfumeshopnew/app/database/blocking_pool.py
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingCallPool:
+    """Ограниченный пул потоков для блокирующих вызовов бэкенда листов (отдельный от executor'а asyncio).
+
+    Не больше max_workers вызовов выполняются одновременно, остальные ждут в очереди пула.
+    on_wait(секунды) получает время ожидания вызова в очереди, on_load(в очереди, в работе) -
+    загрузку пула при каждом ее изменении. Вызов, отмененный до старта (например, отменена
+    ожидающая его задача), не выполняется. Потоки - демоны: вызов, не завершившийся к
+    дедлайну close(), брошен и не держит выход процесса.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        on_wait: Optional[Callable[[float], None]] = None,
+        on_load: Optional[Callable[[int, int], None]] = None,
+    ):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._on_wait = on_wait
+        self._on_load = on_load
+        self._work_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._threads: list = []
+        self._idle_threads = 0
+        self._queued = 0
+        self._running = 0
+        self._futures: Set[Future] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def submit(self, func: Callable[..., Any], *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Blocking pool '{self.name}' is closed.")
+            self._futures.add(future)
+            self._queued += 1
+            if self._idle_threads > 0:
+                self._idle_threads -= 1  # Вызов заберет простаивающий поток
+            elif len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.name}-{len(self._threads) + 1}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+        future.add_done_callback(self._forget)
+        self._work_queue.put((future, func, args, time.perf_counter()))
+        self._report_load()
+        return future
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Выполняет func(*args) в пуле. Отмена ожидающей задачи снимает вызов с очереди, если он еще не начался."""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _forget(self, future: Future):
+        with self._lock:
+            self._futures.discard(future)
+            if future.cancelled():
+                # Отменен, пока ждал в очереди: поток его пропустит
+                self._queued -= 1
+        self._report_load()
+
+    def _report_load(self):
+        if self._on_load is not None:
+            self._on_load(self._queued, self._running)
+
+    def _worker(self):
+        while True:
+            item = self._work_queue.get()
+            if item is None:
+                return
+            future, func, args, submitted_at = item
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._idle_threads += 1
+                continue
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            self._report_load()
+            if self._on_wait is not None:
+                self._on_wait(time.perf_counter() - submitted_at)
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._idle_threads += 1
+                self._report_load()
+
+    async def close(self, timeout: float) -> int:
+        """Закрывает пул: отменяет вызовы в очереди и до timeout секунд ждет выполняющиеся.
+
+        Возвращает число брошенных вызовов (не завершились к дедлайну).
+        """
+        with self._lock:
+            self._closed = True
+            futures = list(self._futures)
+            threads_count = len(self._threads)
+        for future in futures:
+            future.cancel()  # Уже выполняющийся вызов не отменяется
+        for _ in range(threads_count):
+            self._work_queue.put(None)
+        running = [future for future in futures if not future.done()]
+        if not running:
+            return 0
+        done, still_running = await asyncio.wait(
+            [asyncio.wrap_future(future) for future in running], timeout=max(0.0, timeout)
+        )
+        for future in done:
+            if not future.cancelled():
+                future.exception()  # Ошибку получает ожидавший вызов, здесь ее только забираем
+        if still_running:
+            logger.warning(
+                f"Blocking pool '{self.name}': {len(still_running)} call(s) still running after "
+                f"{timeout:.1f}s, abandoning them."
+            )
+        return len(still_running)
@@ -0,0 +1,92 @@
+# robotiaga-perfumeshopnew/app/database/cache_index.py
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class HashIndex:
+    """Хэш-индекс по одному атрибуту строк in-memory кэша: значение -> кортеж строк.
+
+    Индекс неизменяемый: он входит в снимок листа (SheetSnapshot), который читатели
+    используют без блокировок. Изменения порождают новый индекс через with_changes(),
+    при этом пересобираются только затронутые корзины.
+    """
+
+    __slots__ = ("attr_name", "_buckets")
+
+    def __init__(
+        self, attr_name: str, buckets: Optional[Dict[Any, Tuple[Dict[str, Any], ...]]] = None
+    ):
+        self.attr_name = attr_name
+        self._buckets: Dict[Any, Tuple[Dict[str, Any], ...]] = buckets or {}
+
+    @classmethod
+    def build(cls, attr_name: str, rows: Iterable[Dict[str, Any]]) -> "HashIndex":
+        buckets: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in rows:
+            value = row.get(attr_name)
+            if cls.is_indexable(value):
+                buckets.setdefault(value, []).append(row)
+        return cls(attr_name, {value: tuple(bucket) for value, bucket in buckets.items()})
+
+    @staticmethod
+    def is_indexable(value: Any) -> bool:
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        return True
+
+    def with_changes(
+        self,
+        replaced: Sequence[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = (),
+        added: Sequence[Dict[str, Any]] = (),
+    ) -> "HashIndex":
+        """Новый индекс с учетом изменений.
+
+        replaced - пары (старая строка, новая строка или None для удаления),
+        added - новые строки. Строки сравниваются по идентичности объекта.
+        """
+        buckets = dict(self._buckets)
+        touched: Dict[Any, List[Dict[str, Any]]] = {}
+
+        def working_bucket(value: Any) -> List[Dict[str, Any]]:
+            if value not in touched:
+                touched[value] = list(buckets.get(value, ()))
+            return touched[value]
+
+        for old_row, new_row in replaced:
+            old_value = old_row.get(self.attr_name)
+            new_value = new_row.get(self.attr_name) if new_row is not None else None
+            new_indexable = new_row is not None and self.is_indexable(new_value)
+            if self.is_indexable(old_value):
+                bucket = working_bucket(old_value)
+                position = next(
+                    (i for i, row in enumerate(bucket) if row is old_row), None
+                )
+                if position is not None:
+                    if new_indexable and new_value == old_value:
+                        # Значение ключа не изменилось - подменяем строку на месте, сохраняя порядок
+                        bucket[position] = new_row
+                        continue
+                    del bucket[position]
+            if new_indexable:
+                working_bucket(new_value).append(new_row)
+        for row in added:
+            value = row.get(self.attr_name)
+            if self.is_indexable(value):
+                working_bucket(value).append(row)
+
+        for value, bucket in touched.items():
+            if bucket:
+                buckets[value] = tuple(bucket)
+            else:
+                buckets.pop(value, None)
+        return HashIndex(self.attr_name, buckets)
+
+    def lookup(self, value: Any) -> Optional[Tuple[Dict[str, Any], ...]]:
+        """Возвращает строки с данным значением или None, если значение нельзя искать по индексу."""
+        if not self.is_indexable(value):
+            return None
+        return self._buckets.get(value, ())
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,174 @@
+# robotiaga-perfumeshopnew/app/database/cache_persistence.py
+import datetime
+import decimal
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Заголовок файла: сигнатура и версия формата. Дальше - сжатый zlib JSON с данными листов.
+# JSON, а не pickle: чтение файла не может выполнить код, даже если файл подменили.
+# v1 (pickle) больше не читается - такой снимок игнорируется, и кэш загружается из листов
+_FILE_MAGIC = b"PSWS"
+_FILE_FORMAT_VERSION = 2
+_FILE_HEADER = struct.Struct("<4sH")
+# Значения, которых нет в JSON, пишутся объектом с одним ключом-тегом
+_DATETIME_TAG = "$datetime"
+_DATE_TAG = "$date"
+_TIME_TAG = "$time"
+_DECIMAL_TAG = "$decimal"
+_MISSING_TAG = "$missing"
+
+
+class PersistedSheet:
+    """Сохраненное на диск содержимое кэша одного листа."""
+
+    __slots__ = ("rows", "version", "fetched_at", "revision_token")
+
+    def __init__(
+        self,
+        rows: List[Dict[str, Any]],
+        version: int,
+        fetched_at: Optional[datetime.datetime],
+        revision_token: Optional[str],
+    ):
+        self.rows = rows
+        self.version = version
+        self.fetched_at = fetched_at  # UTC, когда строки были скачаны из листа
+        self.revision_token = revision_token
+
+
+class _MissingValue:
+    """Маркер атрибута, которого нет в строке (отличается от None, в JSON - {"$missing": 1})."""
+
+
+_MISSING = _MissingValue()
+
+
+def _encode_value(value: Any) -> Any:
+    """json.dumps(default=...): даты, Decimal и маркер отсутствующего атрибута -> объекты с тегом.
+
+    Другие типы не сохраняются (TypeError, снимок не пишется): строкой они вернулись бы
+    другим типом, и первый refresh после теплого старта считал бы такие строки измененными.
+    """
+    if value is _MISSING:
+        return {_MISSING_TAG: 1}
+    if isinstance(value, datetime.datetime):
+        return {_DATETIME_TAG: value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_DATE_TAG: value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {_TIME_TAG: value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {_DECIMAL_TAG: str(value)}
+    raise TypeError(f"Cache snapshot cannot store value of type {type(value).__name__}")
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    """json.loads(object_hook=...): обратное преобразование объектов с тегом."""
+    if len(obj) != 1:
+        return obj
+    tag, value = next(iter(obj.items()))
+    if tag == _MISSING_TAG:
+        return _MISSING
+    if tag == _DATETIME_TAG:
+        return datetime.datetime.fromisoformat(value)
+    if tag == _DATE_TAG:
+        return datetime.date.fromisoformat(value)
+    if tag == _TIME_TAG:
+        return datetime.time.fromisoformat(value)
+    if tag == _DECIMAL_TAG:
+        return decimal.Decimal(value)
+    return obj
+
+
+def _encode_rows(rows) -> Tuple[List[str], List[tuple]]:
+    """Строки -> (колонки, кортежи значений): имена атрибутов не повторяются в каждой строке."""
+    columns: List[str] = []
+    seen = set()
+    for row in rows:
+        for column in row:
+            if column not in seen:
+                seen.add(column)
+                columns.append(column)
+    return columns, [tuple(row.get(column, _MISSING) for column in columns) for row in rows]
+
+
+def _decode_rows(columns: List[str], encoded: List[tuple]) -> List[Dict[str, Any]]:
+    rows = []
+    for values in encoded:
+        if any(value is _MISSING for value in values):
+            rows.append(
+                {column: value for column, value in zip(columns, values) if value is not _MISSING}
+            )
+        else:
+            rows.append(dict(zip(columns, values)))
+    return rows
+
+
+def write_cache_snapshot_file(
+    path: str, spreadsheet_id: str, sheets: Dict[str, PersistedSheet]
+):
+    """Атомарно записывает кэш листов в компактный бинарный файл (tmp + os.replace)."""
+    payload = {
+        "spreadsheet_id": spreadsheet_id,
+        "saved_at": datetime.datetime.utcnow(),
+        "sheets": {
+            alias: {
+                "version": sheet.version,
+                "fetched_at": sheet.fetched_at,
+                "revision_token": sheet.revision_token,
+                "encoded_rows": _encode_rows(sheet.rows),
+            }
+            for alias, sheet in sheets.items()
+        },
+    }
+    body = zlib.compress(
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_encode_value).encode("utf-8"),
+        6,
+    )
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_FORMAT_VERSION))
+        f.write(body)
+    os.replace(tmp_path, path)
+
+
+def read_cache_snapshot_file(path: str, spreadsheet_id: str) -> Dict[str, PersistedSheet]:
+    """Листы из файла снимка; пустой словарь, если файла нет, он поврежден или от другой таблицы."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logger.warning(f"Could not read cache snapshot file '{path}': {e}")
+        return {}
+    try:
+        magic, format_version = _FILE_HEADER.unpack_from(data)
+        if magic != _FILE_MAGIC or format_version != _FILE_FORMAT_VERSION:
+            logger.warning(
+                f"Cache snapshot file '{path}' has unsupported format ({magic!r}, v{format_version}). Ignoring it."
+            )
+            return {}
+        payload = json.loads(
+            zlib.decompress(data[_FILE_HEADER.size :]).decode("utf-8"), object_hook=_decode_object
+        )
+    except Exception as e:
+        logger.warning(f"Cache snapshot file '{path}' is corrupted, ignoring it: {e}")
+        return {}
+    if payload.get("spreadsheet_id") != spreadsheet_id:
+        return {}
+    return {
+        alias: PersistedSheet(
+            _decode_rows(*stored["encoded_rows"]),
+            stored["version"],
+            stored["fetched_at"],
+            stored["revision_token"],
+        )
+        for alias, stored in payload.get("sheets", {}).items()
+    }
@@ -0,0 +1,404 @@
+# robotiaga-perfumeshopnew/app/database/cache_query.py
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .cache_index import HashIndex
+from .cache_snapshot import SheetSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+# --- Предикаты фильтра ---
+# Значение в filter_criteria - либо само значение (равенство, как раньше), либо один из предикатов ниже.
+
+
+class Predicate:
+    """Условие на значение одного атрибута строки. compile() вызывается один раз на запрос."""
+
+    def compile(self) -> Callable[[Any], bool]:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"<{self.describe()}>"
+
+
+class Equals(Predicate):
+    """Равенство (то же, что просто значение в filter_criteria)."""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def compile(self) -> Callable[[Any], bool]:
+        value = self.value
+        return lambda candidate: candidate == value
+
+    def describe(self) -> str:
+        return f"== {self.value!r}"
+
+
+class Range(Predicate):
+    """low <= значение <= high (границы можно не задавать или сделать строгими). Пустые и несравнимые значения не проходят."""
+
+    def __init__(
+        self,
+        low: Any = None,
+        high: Any = None,
+        include_low: bool = True,
+        include_high: bool = True,
+    ):
+        if low is None and high is None:
+            raise ValueError("Range needs at least one bound.")
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def compile(self) -> Callable[[Any], bool]:
+        low, high = self.low, self.high
+        include_low, include_high = self.include_low, self.include_high
+
+        def test(candidate: Any) -> bool:
+            if candidate is None:
+                return False
+            try:
+                if low is not None and (candidate < low if include_low else candidate <= low):
+                    return False
+                if high is not None and (candidate > high if include_high else candidate >= high):
+                    return False
+            except TypeError:
+                return False
+            return True
+
+        return test
+
+    def describe(self) -> str:
+        parts = []
+        if self.low is not None:
+            parts.append(f"{'>=' if self.include_low else '>'} {self.low!r}")
+        if self.high is not None:
+            parts.append(f"{'<=' if self.include_high else '<'} {self.high!r}")
+        return " and ".join(parts)
+
+
+class InSet(Predicate):
+    """Значение входит в набор. По индексированному атрибуту выбирается объединением корзин индекса."""
+
+    def __init__(self, values: Iterable[Any]):
+        self.values = tuple(values)
+        hashable = all(HashIndex.is_indexable(value) for value in self.values)
+        self._value_set = frozenset(self.values) if hashable else None
+
+    def compile(self) -> Callable[[Any], bool]:
+        value_set, values = self._value_set, self.values
+        if value_set is None:
+            return lambda candidate: candidate in values
+
+        def test(candidate: Any) -> bool:
+            try:
+                return candidate in value_set
+            except TypeError:  # Нехэшируемое значение в ячейке
+                return candidate in values
+
+        return test
+
+    def index_values(self) -> Optional[Tuple[Any, ...]]:
+        """Различные значения для поиска по индексу или None, если набор нельзя искать по хэшу."""
+        return tuple(self._value_set) if self._value_set is not None else None
+
+    def describe(self) -> str:
+        return f"in {list(self.values)!r}"
+
+
+class Prefix(Predicate):
+    """Строка начинается с prefix (по умолчанию без учета регистра)."""
+
+    def __init__(self, prefix: str, case_sensitive: bool = False):
+        self.prefix = prefix
+        self.case_sensitive = case_sensitive
+
+    def compile(self) -> Callable[[Any], bool]:
+        if self.case_sensitive:
+            prefix = self.prefix
+            return lambda candidate: isinstance(candidate, str) and candidate.startswith(prefix)
+        prefix = self.prefix.lower()
+        return lambda candidate: isinstance(candidate, str) and candidate.lower().startswith(prefix)
+
+    def describe(self) -> str:
+        return f"startswith {self.prefix!r}{'' if self.case_sensitive else ' (ci)'}"
+
+
+class Contains(Predicate):
+    """Строка содержит подстроку (по умолчанию без учета регистра)."""
+
+    def __init__(self, substring: str, case_sensitive: bool = False):
+        self.substring = substring
+        self.case_sensitive = case_sensitive
+
+    def compile(self) -> Callable[[Any], bool]:
+        if self.case_sensitive:
+            substring = self.substring
+            return lambda candidate: isinstance(candidate, str) and substring in candidate
+        substring = self.substring.lower()
+        return lambda candidate: isinstance(candidate, str) and substring in candidate.lower()
+
+    def describe(self) -> str:
+        return f"contains {self.substring!r}{'' if self.case_sensitive else ' (ci)'}"
+
+
+class NotNull(Predicate):
+    """Ячейка заполнена: значение не None и не пустая строка."""
+
+    def compile(self) -> Callable[[Any], bool]:
+        return lambda candidate: candidate is not None and candidate != ""
+
+    def describe(self) -> str:
+        return "is not null"
+
+
+def _as_predicate(spec: Any) -> Predicate:
+    return spec if isinstance(spec, Predicate) else Equals(spec)
+
+
+# --- Сортировка ---
+
+
+class SortKey:
+    """Ключ сортировки: атрибут, направление и явное место пустых (None) значений.
+
+    Строкой: "attr" - по возрастанию, "-attr" - по убыванию; пустые значения по умолчанию в конце.
+    """
+
+    __slots__ = ("attr", "descending", "nulls_first")
+
+    def __init__(self, attr: str, descending: bool = False, nulls_first: bool = False):
+        self.attr = attr
+        self.descending = descending
+        self.nulls_first = nulls_first
+
+    @classmethod
+    def parse(cls, spec: Union[str, "SortKey"]) -> "SortKey":
+        if isinstance(spec, SortKey):
+            return spec
+        if spec.startswith("-"):
+            return cls(spec[1:], descending=True)
+        return cls(spec)
+
+    def describe(self) -> str:
+        return f"{self.attr} {'desc' if self.descending else 'asc'} nulls {'first' if self.nulls_first else 'last'}"
+
+
+class _Descending:
+    """Обертка значения с обратным порядком (для нечисловых атрибутов в убывающей сортировке)."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.value == other.value
+
+
+def _descending_value(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return -value
+    return _Descending(value)
+
+
+def _typed_value(value: Any) -> Tuple[str, Any]:
+    """Значение с именем типа впереди: разнотипные значения одной колонки сравниваются без TypeError."""
+    return (type(value).__name__, value)
+
+
+def _build_sort_key(sort_keys: Sequence[SortKey], typed: bool) -> Callable[[Any], tuple]:
+    """Один составной ключ на все атрибуты: (признак пустого значения, значение) подряд по каждому атрибуту.
+
+    Кортежи сравниваются поэлементно: значения сравниваются, только если признаки равны,
+    а два None равны между собой - поэтому пустые значения никогда не вызывают TypeError.
+    """
+    lines = ["def sort_key(row):", "    get = row.get"]
+    parts = []
+    for position, sort_key in enumerate(sort_keys):
+        name = f"v{position}"
+        lines.append(f"    {name} = get({sort_key.attr!r})")
+        if typed:
+            converted = f"typed({name})"
+            if sort_key.descending:
+                converted = f"Desc({converted})"
+        else:
+            converted = f"desc({name})" if sort_key.descending else name
+        null_flag = f"{name} is not None" if sort_key.nulls_first else f"{name} is None"
+        parts.append(f"{null_flag}, None if {name} is None else {converted}")
+    lines.append(f"    return ({', '.join(parts)},)")
+    namespace: Dict[str, Any] = {"desc": _descending_value, "typed": _typed_value, "Desc": _Descending}
+    exec("\n".join(lines), namespace)
+    return namespace["sort_key"]
+
+
+# --- Запрос ---
+
+
+class QueryPlan:
+    """Выбранный путь выполнения: откуда берутся кандидаты и что проверяется построчно."""
+
+    __slots__ = ("path", "index_attr", "candidates", "residual")
+
+    def __init__(self, path: str, index_attr: Optional[str], candidates: Sequence[Any], residual: List[str]):
+        self.path = path  # index | index_union | scan
+        self.index_attr = index_attr
+        self.candidates = candidates
+        self.residual = residual  # Атрибуты, которые проверяет скомпилированный предикат
+
+
+class CacheQuery:
+    """Запрос к снимку листа: предикаты компилируются один раз, план учитывает индексы снимка.
+
+    filter_criteria - {атрибут: значение или Predicate}; order_by - строки ("-attr") или SortKey;
+    limit/offset как в SQL. Без сортировки строки отдаются потоково и перебор
+    останавливается, как только набрано offset + limit строк.
+    """
+
+    def __init__(
+        self,
+        filter_criteria: Optional[Dict[str, Any]] = None,
+        order_by: Optional[Sequence[Union[str, SortKey]]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ):
+        self.predicates: Dict[str, Predicate] = {
+            attr: _as_predicate(spec) for attr, spec in (filter_criteria or {}).items()
+        }
+        self.sort_keys: List[SortKey] = [SortKey.parse(spec) for spec in (order_by or [])]
+        self.limit = limit or None
+        self.offset = max(0, offset or 0)
+        self._tests: Dict[str, Callable[[Any], bool]] = {
+            attr: predicate.compile() for attr, predicate in self.predicates.items()
+        }
+        self._matchers: Dict[frozenset, Optional[Callable[[Any], bool]]] = {}
+        self._sort_key = _build_sort_key(self.sort_keys, typed=False) if self.sort_keys else None
+
+    def _matcher(self, attrs: Sequence[str]) -> Optional[Callable[[Any], bool]]:
+        """Один вызываемый предикат на строку по нескольким атрибутам (равенство проверяется без вызова функции)."""
+        cache_key = frozenset(attrs)
+        if cache_key in self._matchers:
+            return self._matchers[cache_key]
+        if not attrs:
+            self._matchers[cache_key] = None
+            return None
+        namespace: Dict[str, Any] = {}
+        conditions = []
+        for position, attr in enumerate(attrs):
+            predicate = self.predicates[attr]
+            if isinstance(predicate, Equals):
+                namespace[f"v{position}"] = predicate.value
+                conditions.append(f"get({attr!r}) == v{position}")
+            else:
+                namespace[f"t{position}"] = self._tests[attr]
+                conditions.append(f"t{position}(get({attr!r}))")
+        exec(f"def match(row):\n    get = row.get\n    return {' and '.join(conditions)}", namespace)
+        self._matchers[cache_key] = namespace["match"]
+        return namespace["match"]
+
+    def plan(self, snapshot: SheetSnapshot) -> QueryPlan:
+        """Самая селективная корзина индекса (равенство) или объединение корзин (InSet); иначе полный перебор."""
+        best: Optional[Tuple[str, str, Sequence[Any]]] = None
+        for attr, predicate in self.predicates.items():
+            index = snapshot.indexes.get(attr)
+            if index is None:
+                continue
+            if isinstance(predicate, Equals):
+                bucket = index.lookup(predicate.value)
+                if bucket is None:
+                    continue
+                candidate = ("index", attr, bucket)
+            elif isinstance(predicate, InSet) and predicate.index_values() is not None:
+                buckets = [index.lookup(value) or () for value in predicate.index_values()]
+                candidate = ("index_union", attr, tuple(itertools.chain.from_iterable(buckets)))
+            else:
+                continue
+            if best is None or len(candidate[2]) < len(best[2]):
+                best = candidate
+                if not best[2]:
+                    break
+        if best is None:
+            return QueryPlan("scan", None, snapshot.rows, list(self.predicates))
+        path, index_attr, candidates = best
+        # Корзина индекса уже гарантирует условие по своему атрибуту
+        residual = [attr for attr in self.predicates if attr != index_attr]
+        return QueryPlan(path, index_attr, candidates, residual)
+
+    def execute(self, snapshot: SheetSnapshot) -> List[Any]:
+        return self._run(self.plan(snapshot))[0]
+
+    def _run(self, plan: QueryPlan, counters: Optional[Dict[str, int]] = None) -> Tuple[List[Any], str]:
+        candidates: Iterable[Any] = plan.candidates
+        if counters is not None:
+            candidates = self._counting(candidates, counters, "rows_examined")
+        match = self._matcher(plan.residual)
+        matched: Iterable[Any] = filter(match, candidates) if match is not None else candidates
+        if counters is not None:
+            matched = self._counting(matched, counters, "rows_matched")
+        offset, limit = self.offset, self.limit
+        if self._sort_key is None:
+            stop = offset + limit if limit is not None else None
+            return list(itertools.islice(matched, offset, stop)), "stream"
+        matched = list(matched)
+        try:
+            return self._sorted(matched, self._sort_key), self._sort_strategy(len(matched))
+        except TypeError:
+            # В колонке разнотипные значения (например, числа и текст) - сортируем с типом впереди
+            logger.warning(
+                f"Mixed value types in sort keys {[key.attr for key in self.sort_keys]}, sorting by (type, value)."
+            )
+            typed_key = _build_sort_key(self.sort_keys, typed=True)
+            return self._sorted(matched, typed_key), f"{self._sort_strategy(len(matched))} (typed)"
+
+    def _sort_strategy(self, matched_count: int) -> str:
+        if self.limit is not None and self.offset + self.limit < matched_count:
+            return "top_n"
+        return "full_sort"
+
+    def _sorted(self, rows: List[Any], sort_key: Callable[[Any], tuple]) -> List[Any]:
+        offset, limit = self.offset, self.limit
+        if limit is not None and offset + limit < len(rows):
+            # Частичная сортировка: heapq.nsmallest устойчив так же, как sorted()[:n]
+            return heapq.nsmallest(offset + limit, rows, key=sort_key)[offset:]
+        return sorted(rows, key=sort_key)[offset:]
+
+    @staticmethod
+    def _counting(rows: Iterable[Any], counters: Dict[str, int], name: str) -> Iterable[Any]:
+        for row in rows:
+            counters[name] += 1
+            yield row
+
+    def explain(self, snapshot: SheetSnapshot) -> Dict[str, Any]:
+        """Выполняет запрос и описывает выбранный путь: индекс или перебор, сколько строк просмотрено и отдано."""
+        plan = self.plan(snapshot)
+        counters = {"rows_examined": 0, "rows_matched": 0}
+        started = time.perf_counter()
+        rows, strategy = self._run(plan, counters)
+        return {
+            "sheet": snapshot.sheet_alias,
+            "snapshot_version": snapshot.version,
+            "sheet_rows": len(snapshot.rows),
+            "path": plan.path,
+            "index": plan.index_attr,
+            "candidates": len(plan.candidates),
+            "residual_predicates": {attr: self.predicates[attr].describe() for attr in plan.residual},
+            "order_by": [sort_key.describe() for sort_key in self.sort_keys],
+            "strategy": strategy,  # stream | top_n | full_sort
+            "offset": self.offset,
+            "limit": self.limit,
+            **counters,
+            "rows_returned": len(rows),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
@@ -0,0 +1,222 @@
+# robotiaga-perfumeshopnew/app/database/cache_snapshot.py
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from .cache_index import HashIndex
+
+
+class SheetChangeSet:
+    """Набор изменений листа между двумя версиями снимка (ключи - значения первичного ключа)."""
+
+    __slots__ = (
+        "sheet_alias",
+        "version",
+        "added_keys",
+        "changed_keys",
+        "removed_keys",
+        "source",
+    )
+
+    def __init__(
+        self,
+        sheet_alias: str,
+        version: int,
+        added_keys: Iterable[Any] = (),
+        changed_keys: Iterable[Any] = (),
+        removed_keys: Iterable[Any] = (),
+        source: str = "refresh",
+    ):
+        self.sheet_alias = sheet_alias
+        self.version = version
+        self.added_keys: FrozenSet[Any] = frozenset(added_keys)
+        self.changed_keys: FrozenSet[Any] = frozenset(changed_keys)
+        self.removed_keys: FrozenSet[Any] = frozenset(removed_keys)
+        self.source = source  # refresh | optimistic | confirmed | snapshot
+
+    def is_empty(self) -> bool:
+        return not (self.added_keys or self.changed_keys or self.removed_keys)
+
+    def __repr__(self):
+        return (
+            f"<SheetChangeSet(sheet='{self.sheet_alias}', version={self.version}, source='{self.source}', "
+            f"added={len(self.added_keys)}, changed={len(self.changed_keys)}, removed={len(self.removed_keys)})>"
+        )
+
+
+def _keyed_rows(
+    rows: Iterable[Dict[str, Any]], key_attr: str
+) -> Dict[Tuple[Any, int], Dict[str, Any]]:
+    """Строки по ключу (значение PK, номер повтора) - в листе PK может дублироваться или быть пустым."""
+    occurrences: Dict[Any, int] = {}
+    keyed = {}
+    for row in rows:
+        key_value = row.get(key_attr)
+        if not HashIndex.is_indexable(key_value):
+            key_value = repr(key_value)
+        occurrence = occurrences.get(key_value, 0)
+        occurrences[key_value] = occurrence + 1
+        keyed[(key_value, occurrence)] = row
+    return keyed
+
+
+class SheetSnapshot:
+    """Неизменяемый версионированный снимок in-memory кэша одного листа.
+
+    Читатели получают ссылку на текущий снимок без блокировок и копирования.
+    Писатели никогда не меняют опубликованный снимок (и словари строк в нем):
+    они строят следующий снимок с version + 1 и атомарно подменяют ссылку.
+
+    row_factory (если задан) приводит каждую попадающую в снимок строку к компактному
+    представлению (см. compact_rows); строки, уже приведенные, он возвращает как есть.
+    """
+
+    __slots__ = ("sheet_alias", "rows", "version", "indexes", "updated_at", "row_factory")
+
+    def __init__(
+        self,
+        sheet_alias: str,
+        rows: Tuple[Dict[str, Any], ...],
+        version: int,
+        indexes: Dict[str, HashIndex],
+        updated_at: Optional[float] = None,
+        row_factory: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.sheet_alias = sheet_alias
+        self.rows = rows
+        self.version = version
+        self.indexes = indexes
+        self.updated_at = time.monotonic() if updated_at is None else updated_at
+        self.row_factory = row_factory
+
+    @classmethod
+    def build(
+        cls,
+        sheet_alias: str,
+        rows: Iterable[Dict[str, Any]],
+        indexed_attributes: Sequence[str],
+        version: int,
+        row_factory: Optional[Callable[[Any], Any]] = None,
+    ) -> "SheetSnapshot":
+        rows = tuple(map(row_factory, rows)) if row_factory is not None else tuple(rows)
+        indexes = {
+            attr_name: HashIndex.build(attr_name, rows)
+            for attr_name in indexed_attributes
+        }
+        return cls(sheet_alias, rows, version, indexes, row_factory=row_factory)
+
+    def find_candidates(
+        self, filter_criteria: Dict[str, Any]
+    ) -> Optional[Tuple[Dict[str, Any], ...]]:
+        """Строки из самой селективной подходящей корзины индекса или None, если индекс неприменим."""
+        candidates = None
+        for attr_name, index in self.indexes.items():
+            if attr_name not in filter_criteria:
+                continue
+            bucket = index.lookup(filter_criteria[attr_name])
+            if bucket is not None and (candidates is None or len(bucket) < len(candidates)):
+                candidates = bucket
+                if not candidates:
+                    break
+        return candidates
+
+    def select(self, filter_criteria: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Строки, у которых все атрибуты из filter_criteria равны заданным значениям."""
+        if not filter_criteria:
+            return list(self.rows)
+        candidates = self.find_candidates(filter_criteria)
+        if candidates is None:
+            candidates = self.rows
+        return [
+            row
+            for row in candidates
+            if all(row.get(k) == v for k, v in filter_criteria.items())
+        ]
+
+    def with_changes(
+        self,
+        replaced: Sequence[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = (),
+        added: Sequence[Dict[str, Any]] = (),
+        rows: Optional[Tuple[Dict[str, Any], ...]] = None,
+    ) -> "SheetSnapshot":
+        """Следующая версия снимка: replaced - пары (старая строка, новая или None), added - новые строки.
+
+        rows - итоговый порядок строк, если он уже известен (например, после диффа с листом);
+        его строки должны быть теми же объектами, что в replaced и added.
+        """
+        row_factory = self.row_factory
+        if row_factory is not None and rows is None:
+            replaced = [
+                (old_row, None if new_row is None else row_factory(new_row))
+                for old_row, new_row in replaced
+            ]
+            added = [row_factory(row) for row in added]
+        if rows is not None:
+            new_rows = rows
+        elif replaced:
+            replacements = {id(old_row): new_row for old_row, new_row in replaced}
+            kept_rows = []
+            for row in self.rows:
+                row_id = id(row)
+                if row_id not in replacements:
+                    kept_rows.append(row)
+                elif replacements[row_id] is not None:
+                    kept_rows.append(replacements[row_id])
+            kept_rows.extend(added)
+            new_rows = tuple(kept_rows)
+        else:
+            new_rows = self.rows + tuple(added)
+        indexes = {
+            attr_name: index.with_changes(replaced, added)
+            for attr_name, index in self.indexes.items()
+        }
+        return SheetSnapshot(
+            self.sheet_alias, new_rows, self.version + 1, indexes, row_factory=row_factory
+        )
+
+    def diff(
+        self, fetched_rows: Iterable[Dict[str, Any]], key_attr: str
+    ) -> Tuple["SheetSnapshot", SheetChangeSet]:
+        """Сравнивает снимок со свежими строками листа по первичному ключу.
+
+        Неизмененные строки переиспользуются (те же объекты), индексы патчатся только
+        для вставок, изменений и удалений. Если изменений нет - возвращается этот же снимок.
+        """
+        # Приводятся только новые и измененные строки: неизмененные сравниваются как есть
+        row_factory = self.row_factory or (lambda row: row)
+        old_keyed = _keyed_rows(self.rows, key_attr)
+        new_rows: List[Dict[str, Any]] = []
+        replaced: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = []
+        added: List[Dict[str, Any]] = []
+        added_keys, changed_keys, removed_keys = set(), set(), set()
+        for key, row in _keyed_rows(fetched_rows, key_attr).items():
+            old_row = old_keyed.pop(key, None)
+            if old_row is None:
+                row = row_factory(row)
+                added.append(row)
+                added_keys.add(key[0])
+                new_rows.append(row)
+            elif old_row == row:
+                new_rows.append(old_row)
+            else:
+                row = row_factory(row)
+                replaced.append((old_row, row))
+                changed_keys.add(key[0])
+                new_rows.append(row)
+        for key, old_row in old_keyed.items():
+            replaced.append((old_row, None))
+            removed_keys.add(key[0])
+
+        if not (replaced or added):
+            # Порядок строк в листе мог поменяться без изменения данных - это не изменение
+            return self, SheetChangeSet(self.sheet_alias, self.version)
+        new_snapshot = self.with_changes(replaced, added, rows=tuple(new_rows))
+        return new_snapshot, SheetChangeSet(
+            self.sheet_alias,
+            new_snapshot.version,
+            added_keys,
+            changed_keys,
+            removed_keys,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
@@ -0,0 +1,190 @@
+# robotiaga-perfumeshopnew/app/database/catalog_views.py
+import math
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .cache_index import HashIndex
+from .cache_snapshot import SheetSnapshot
+
+
+def _is_category(value: Any) -> bool:
+    return value is not None and value != ""
+
+
+def _name_sort_key(pk_attr: str):
+    """product_name.lower(), при равных именах - по первичному ключу: порядок не зависит от порядка строк в снимке."""
+    return lambda row: (str(row.get("product_name") or "").lower(), str(row.get(pk_attr)))
+
+
+class CatalogViews:
+    """Материализованные представления каталога товаров для бота.
+
+    - categories: отсортированный список непустых категорий;
+    - products_by_category: товары категории, отсортированные по product_name.lower() (затем по ключу);
+    - page_counts(page_size): число страниц по каждой категории.
+
+    Объект неизменяемый. updated() пересчитывает только категории, затронутые изменившимися
+    ключами, и переиспользует остальные списки. version растет при любом изменении
+    представлений, categories_version - при изменении списка категорий, category_versions[c] -
+    при изменении товаров категории c: по ним бот может кэшировать то, что уже отрисовал.
+    """
+
+    __slots__ = (
+        "sheet_alias",
+        "pk_attr",
+        "version",
+        "snapshot_version",
+        "sheet_rows",
+        "categories",
+        "categories_version",
+        "products_by_category",
+        "category_versions",
+        "_categories_by_key",
+        "_page_counts",
+    )
+
+    def __init__(
+        self,
+        sheet_alias: str,
+        pk_attr: str,
+        version: int,
+        snapshot_version: int,
+        sheet_rows: int,
+        categories: Tuple[Any, ...],
+        categories_version: int,
+        products_by_category: Dict[Any, Tuple[Any, ...]],
+        category_versions: Dict[Any, int],
+        categories_by_key: Dict[Any, FrozenSet[Any]],
+    ):
+        self.sheet_alias = sheet_alias
+        self.pk_attr = pk_attr
+        self.version = version
+        self.snapshot_version = snapshot_version
+        self.sheet_rows = sheet_rows  # Всего строк в листе, включая товары без категории
+        self.categories = categories
+        self.categories_version = categories_version
+        self.products_by_category = products_by_category
+        self.category_versions = category_versions
+        self._categories_by_key = categories_by_key
+        self._page_counts: Dict[int, Dict[Any, int]] = {}
+
+    @classmethod
+    def build(cls, snapshot: SheetSnapshot, pk_attr: str, version: int = 1) -> "CatalogViews":
+        grouped: Dict[Any, List[Any]] = {}
+        categories_by_key: Dict[Any, set] = {}
+        for row in snapshot.rows:
+            category = row.get("category")
+            if not _is_category(category):
+                continue
+            grouped.setdefault(category, []).append(row)
+            key_value = row.get(pk_attr)
+            if HashIndex.is_indexable(key_value):
+                categories_by_key.setdefault(key_value, set()).add(category)
+        products_by_category = {
+            category: tuple(sorted(rows, key=_name_sort_key(pk_attr))) for category, rows in grouped.items()
+        }
+        return cls(
+            snapshot.sheet_alias,
+            pk_attr,
+            version,
+            snapshot.version,
+            len(snapshot.rows),
+            tuple(sorted(products_by_category, key=str)),
+            version,
+            products_by_category,
+            {category: version for category in products_by_category},
+            {key: frozenset(categories) for key, categories in categories_by_key.items()},
+        )
+
+    def updated(self, snapshot: SheetSnapshot, touched_keys: Iterable[Any]) -> Optional["CatalogViews"]:
+        """Представления для нового снимка с пересчетом только затронутых категорий.
+
+        None - если затронутые строки не найти по первичному ключу (тогда нужен полный build).
+        """
+        pk_index = snapshot.indexes.get(self.pk_attr)
+        if pk_index is None:
+            return None
+        categories_by_key = dict(self._categories_by_key)
+        touched_categories = set()
+        for key_value in touched_keys:
+            rows = pk_index.lookup(key_value)
+            if rows is None:
+                return None
+            touched_categories.update(categories_by_key.pop(key_value, ()))
+            new_categories = frozenset(
+                row.get("category") for row in rows if _is_category(row.get("category"))
+            )
+            if new_categories:
+                categories_by_key[key_value] = new_categories
+            touched_categories.update(new_categories)
+
+        next_version = self.version + 1
+        products_by_category = dict(self.products_by_category)
+        category_versions = dict(self.category_versions)
+        changed = False
+        sort_key = _name_sort_key(self.pk_attr)
+        for category in touched_categories:
+            rows = tuple(sorted(snapshot.select({"category": category}), key=sort_key))
+            previous = products_by_category.get(category, ())
+            if len(rows) == len(previous) and all(a is b for a, b in zip(rows, previous)):
+                continue
+            changed = True
+            if rows:
+                products_by_category[category] = rows
+                category_versions[category] = next_version
+            else:
+                products_by_category.pop(category, None)
+                category_versions.pop(category, None)
+
+        if not changed:
+            views = CatalogViews(
+                self.sheet_alias, self.pk_attr, self.version, snapshot.version, len(snapshot.rows),
+                self.categories,
+                self.categories_version, self.products_by_category, self.category_versions,
+                categories_by_key,
+            )
+            views._page_counts = self._page_counts
+            return views
+        categories = tuple(sorted(products_by_category, key=str))
+        return CatalogViews(
+            self.sheet_alias,
+            self.pk_attr,
+            next_version,
+            snapshot.version,
+            len(snapshot.rows),
+            categories,
+            next_version if categories != self.categories else self.categories_version,
+            products_by_category,
+            category_versions,
+            categories_by_key,
+        )
+
+    def products(self, category: Any) -> Tuple[Any, ...]:
+        return self.products_by_category.get(category, ())
+
+    def page_counts(self, page_size: int) -> Dict[Any, int]:
+        """Число страниц по категориям для page_size (считается один раз на версию представлений)."""
+        counts = self._page_counts.get(page_size)
+        if counts is None:
+            counts = self._page_counts[page_size] = {
+                category: math.ceil(len(rows) / page_size)
+                for category, rows in self.products_by_category.items()
+            }
+        return counts
+
+    def page(self, category: Any, page: int, page_size: int) -> Tuple[Tuple[Any, ...], int, int]:
+        """Товары страницы категории, скорректированный номер страницы (1..total_pages) и число страниц."""
+        rows = self.products(category)
+        total_pages = self.page_counts(page_size).get(category, 0)
+        page = max(1, min(page, total_pages))
+        start = (page - 1) * page_size
+        return rows[start : start + page_size], page, total_pages
+
+    def category_version(self, category: Any) -> int:
+        return self.category_versions.get(category, 0)
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+    def __bool__(self) -> bool:
+        # Пустые представления (нет категорий) - не то же самое, что пустой лист
+        return True
@@ -0,0 +1,89 @@
+# robotiaga-perfumeshopnew/app/database/change_probes.py
+import logging
+import threading
+from typing import Callable, Optional
+
+import gspread
+from gspread.urls import DRIVE_FILES_API_V3_URL
+
+logger = logging.getLogger(__name__)
+
+
+class SheetChangeProbe:
+    """Дешевая проверка "изменился ли лист" перед полным скачиванием.
+
+    probe_revision_blocking() возвращает токен ревизии листа. Если токен совпал с
+    токеном, полученным при прошлом скачивании, лист можно не скачивать.
+    None означает "неизвестно" - тогда лист скачивается как обычно.
+    Методы блокирующие, сервис вызывает их в своих пулах потоков (BlockingCallPool).
+    tokens_survive_restart - токен описывает сам источник и после перезапуска процесса
+    значит то же самое (только такие токены сохраняются в снимок кэша на диске).
+    spreadsheet_wide - токен один на всю таблицу (не зависит от листа): при загрузке
+    нескольких листов сразу достаточно одной пробы.
+    """
+
+    name = "base"
+    tokens_survive_restart = False
+    spreadsheet_wide = False
+
+    def probe_revision_blocking(self, sheet_alias: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class DriveRevisionChangeProbe(SheetChangeProbe):
+    """Ревизия всего файла таблицы из Drive API (поле version) - один легкий запрос.
+
+    Google не отдает ревизию отдельного листа, поэтому любое изменение таблицы
+    считается изменением каждого листа. Это консервативно: лишние скачивания
+    возможны, пропуск реально измененного листа - нет.
+    """
+
+    name = "drive_revision"
+    tokens_survive_restart = True
+    spreadsheet_wide = True
+
+    def __init__(self, credentials_path: str, spreadsheet_id: str):
+        self.credentials_path = credentials_path
+        self.spreadsheet_id = spreadsheet_id
+        self._gspread_client: Optional[gspread.Client] = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self) -> gspread.Client:
+        with self._client_lock:
+            if self._gspread_client is None:
+                self._gspread_client = gspread.service_account(
+                    filename=self.credentials_path
+                )
+            return self._gspread_client
+
+    def probe_revision_blocking(self, sheet_alias: str) -> Optional[str]:
+        try:
+            response = self._get_client().http_client.request(
+                "get",
+                f"{DRIVE_FILES_API_V3_URL}/{self.spreadsheet_id}",
+                params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+            )
+            metadata = response.json()
+        except Exception as e:
+            logger.warning(f"(Sync) Drive revision probe failed for '{sheet_alias}': {e}")
+            return None
+        return metadata.get("version") or metadata.get("modifiedTime")
+
+
+class VersionCounterChangeProbe(SheetChangeProbe):
+    """Токен из счетчика версий листа, который ведет сам источник данных (например, локальный fake-бэкенд).
+
+    Счетчик живет в памяти источника и в новом процессе снова начинается с 1, поэтому
+    токен включает source_id экземпляра источника: токен прошлого процесса не совпадет
+    с новым, даже если номера версий равны.
+    """
+
+    name = "version_counter"
+
+    def __init__(self, get_sheet_version: Callable[[str], Optional[int]], source_id: str = ""):
+        self._get_sheet_version = get_sheet_version
+        self.source_id = source_id
+
+    def probe_revision_blocking(self, sheet_alias: str) -> Optional[str]:
+        version = self._get_sheet_version(sheet_alias)
+        return None if version is None else f"{self.source_id}:{version}"
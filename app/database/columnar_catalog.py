@@ -0,0 +1,199 @@
+# robotiaga-perfumeshopnew/app/database/columnar_catalog.py
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .cache_snapshot import SheetSnapshot
+
+# Поля сортировки каталога -> колонка ColumnarCatalog
+CATALOG_SORT_FIELDS = ("name", "price", "quantity")
+
+
+def _to_float(value: Any) -> float:
+    """Число из ячейки листа; пустое или нечисловое значение - NaN (не проходит числовые фильтры)."""
+    if value is None or value == "" or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _encode_dictionary(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any], Dict[Any, int]]:
+    """Словарное кодирование колонки: коды строк, значения по коду и обратный словарь (пустое значение - код -1)."""
+    codes = np.empty(len(values), dtype=np.int32)
+    dictionary: List[Any] = []
+    lookup: Dict[Any, int] = {}
+    for position, value in enumerate(values):
+        if value is None or value == "":
+            codes[position] = -1
+            continue
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(dictionary)
+            dictionary.append(value)
+        codes[position] = code
+    return codes, dictionary, lookup
+
+
+class CatalogQueryResult:
+    """Результат запроса к каталогу: позиции строк в нужном порядке (строки материализуются только для страницы)."""
+
+    __slots__ = ("_rows", "_positions")
+
+    def __init__(self, rows: Tuple[Any, ...], positions: np.ndarray):
+        self._rows = rows
+        self._positions = positions
+
+    @classmethod
+    def empty(cls) -> "CatalogQueryResult":
+        return cls((), np.empty(0, dtype=np.int64))
+
+    @property
+    def total(self) -> int:
+        return int(self._positions.size)
+
+    def rows(self, offset: int = 0, limit: Optional[int] = None) -> List[Any]:
+        offset = max(0, offset)
+        end = None if limit is None else offset + max(0, limit)
+        return [self._rows[position] for position in self._positions[offset:end].tolist()]
+
+    def page(self, page: int, page_size: int) -> Tuple[List[Any], int, int]:
+        """Строки страницы, скорректированный номер страницы (1..total_pages) и число страниц."""
+        total_pages = math.ceil(self.total / page_size) if page_size > 0 else 0
+        page = max(1, min(page, total_pages))
+        return self.rows((page - 1) * page_size, page_size), page, total_pages
+
+    def __len__(self) -> int:
+        return self.total
+
+
+class ColumnarCatalog:
+    """Колоночное представление листа "Товары" для векторных фильтров и сортировок.
+
+    Строится по неизменяемому снимку: числовые колонки (цена, остаток) - float64 с NaN
+    для пустых ячеек, категория и статус - словарные коды int32, имя - ранг
+    product_name.lower() среди всех строк. Строки снимка не копируются: результат
+    запроса - позиции в snapshot.rows. Каталог соответствует одной версии снимка
+    и при изменении листа строится заново (matches()).
+    """
+
+    __slots__ = (
+        "sheet_alias",
+        "version",
+        "rows",
+        "price",
+        "quantity",
+        "category_codes",
+        "categories",
+        "_category_lookup",
+        "status_codes",
+        "statuses",
+        "_status_lookup",
+        "name_rank",
+    )
+
+    def __init__(self, snapshot: SheetSnapshot):
+        rows = snapshot.rows
+        self.sheet_alias = snapshot.sheet_alias
+        self.version = snapshot.version
+        self.rows = rows
+        self.price = np.fromiter(
+            (_to_float(row.get("price_per_unit")) for row in rows), dtype=np.float64, count=len(rows)
+        )
+        self.quantity = np.fromiter(
+            (_to_float(row.get("available_quantity")) for row in rows), dtype=np.float64, count=len(rows)
+        )
+        self.category_codes, self.categories, self._category_lookup = _encode_dictionary(
+            [row.get("category") for row in rows]
+        )
+        self.status_codes, self.statuses, self._status_lookup = _encode_dictionary(
+            [row.get("status") for row in rows]
+        )
+        # Ранг имени: как sorted(key=product_name.lower()) в обработчиках, при равенстве - порядок листа
+        names = [str(row.get("product_name") or "").lower() for row in rows]
+        self.name_rank = np.empty(len(rows), dtype=np.int64)
+        self.name_rank[sorted(range(len(rows)), key=names.__getitem__)] = np.arange(len(rows))
+
+    def matches(self, snapshot: SheetSnapshot) -> bool:
+        return self.rows is snapshot.rows and self.version == snapshot.version
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def category_list(self) -> List[Any]:
+        """Непустые категории, у которых есть хотя бы одна строка, в отсортированном порядке."""
+        codes = self.category_codes[self.category_codes >= 0]
+        present = np.flatnonzero(np.bincount(codes, minlength=len(self.categories)))
+        return sorted((self.categories[code] for code in present.tolist()), key=str)
+
+    @staticmethod
+    def _codes_mask(
+        codes: np.ndarray, lookup: Dict[Any, int], values: Union[Any, Iterable[Any]]
+    ) -> np.ndarray:
+        if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+            values = (values,)
+        wanted = [lookup[value] for value in values if value in lookup]
+        if not wanted:
+            return np.zeros(codes.size, dtype=bool)
+        if len(wanted) == 1:
+            return codes == wanted[0]
+        return np.isin(codes, wanted)
+
+    def query(
+        self,
+        category: Union[None, Any, Iterable[Any]] = None,
+        status: Union[None, Any, Iterable[Any]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_quantity: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+        order_by: Sequence[str] = ("name",),
+    ) -> CatalogQueryResult:
+        """Фильтр масками и сортировка argsort'ом.
+
+        category/status - значение или набор значений; цены и остаток - границы включительно
+        (пустые ячейки не проходят); in_stock - остаток > 0 (False - остаток не положителен или пуст).
+        order_by - поля из CATALOG_SORT_FIELDS, "-" в начале - по убыванию; пустые значения всегда в конце.
+        """
+        mask = np.ones(len(self.rows), dtype=bool)
+        if category is not None:
+            mask &= self._codes_mask(self.category_codes, self._category_lookup, category)
+        if status is not None:
+            mask &= self._codes_mask(self.status_codes, self._status_lookup, status)
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if min_quantity is not None:
+            mask &= self.quantity >= min_quantity
+        if in_stock is not None:
+            mask &= (self.quantity > 0) if in_stock else ~(self.quantity > 0)
+        positions = np.flatnonzero(mask)
+        if order_by and positions.size > 1:
+            positions = positions[np.lexsort(self._sort_keys(positions, order_by))]
+        return CatalogQueryResult(self.rows, positions)
+
+    def _sort_keys(self, positions: np.ndarray, order_by: Sequence[str]) -> List[np.ndarray]:
+        """Ключи для np.lexsort (последний ключ - главный); сортировка устойчивая, как sorted()."""
+        keys: List[np.ndarray] = []
+        for field in order_by:
+            descending = field.startswith("-")
+            field_name = field[1:] if descending else field
+            if field_name == "name":
+                column = self.name_rank[positions]
+                keys.append(-column if descending else column)
+                continue
+            if field_name == "price":
+                column = self.price[positions]
+            elif field_name == "quantity":
+                column = self.quantity[positions]
+            else:
+                raise ValueError(
+                    f"Unknown catalog sort field '{field_name}', expected one of {CATALOG_SORT_FIELDS}."
+                )
+            missing = np.isnan(column)
+            values = np.where(missing, 0.0, -column if descending else column)
+            keys.extend([missing, values])  # Сначала по признаку пустого значения, затем по значению
+        return list(reversed(keys))
@@ -0,0 +1,188 @@
+# robotiaga-perfumeshopnew/app/database/compact_rows.py
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Type
+
+from .sheet_backends import model_attribute_names
+
+# Маркер незаполненного атрибута в сгенерированном коде (отличается от None)
+_MISSING = object()
+
+
+class CompactRow(Mapping):
+    """Строка кэша без словаря на каждую строку: значения лежат в __slots__ класса листа.
+
+    Классы строк генерируются по моделям GSheetBase (compact_row_class). Строка ведет себя
+    как словарь только для чтения (get, [], in, keys/items, {**row}, dict(row)) и дает доступ
+    к значениям как к атрибутам (row.product_name). Атрибута, которого не было в исходной
+    строке, нет и в CompactRow (get вернет default, как у словаря). Ключи, которых нет в модели,
+    хранятся в _extra.
+    """
+
+    __slots__ = ("_extra",)
+
+    _fields: Tuple[str, ...] = ()
+    _field_set: frozenset = frozenset()
+    _model_name: str = ""
+
+    # Генерируются в compact_row_class
+    from_mapping: Callable[[Any], "CompactRow"]
+    _values: Callable[["CompactRow"], tuple]
+    _values_of: Callable[[Any], tuple]
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_set:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        else:
+            extra = self._extra
+            if extra is not None and key in extra:
+                return extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._field_set:
+            return getattr(self, key, default)
+        extra = self._extra
+        if extra is not None:
+            return extra.get(key, default)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._field_set:
+            return hasattr(self, key)
+        extra = self._extra
+        return extra is not None and key in extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._fields:
+            if hasattr(self, name):
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        count = sum(1 for name in self._fields if hasattr(self, name))
+        return count + (len(self._extra) if self._extra is not None else 0)
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is type(self):
+            return self._values() == other._values() and self._extra == other._extra
+        if isinstance(other, dict):
+            # Быстрый путь для диффа снимка со свежими строками листа: без промежуточных словарей
+            values = self._values()
+            if values != self._values_of(other):
+                return False
+            extra_count = len(other) - (len(self._fields) - values.count(_MISSING))
+            extra = self._extra
+            if extra is None:
+                return extra_count == 0
+            return extra_count == len(extra) and all(
+                other.get(k, _MISSING) == v for k, v in extra.items()
+            )
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None  # как у dict
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __reduce__(self):
+        # Сгенерированные классы не импортируются по имени - сериализуем как обычный словарь
+        return (dict, (self.to_dict(),))
+
+    def __repr__(self) -> str:
+        return f"{self._model_name}Row({self.to_dict()!r})"
+
+
+def _build_from_mapping(row_class: Type[CompactRow]) -> Callable[[Any], CompactRow]:
+    """Генерирует конструктор из словаря без цикла по полям (как namedtuple генерирует __new__)."""
+    lines = [
+        "def from_mapping(data):",
+        "    if type(data) is row_class:",
+        "        return data",
+        "    row = new_row(row_class)",
+        "    get = data.get",
+        "    present = 0",
+    ]
+    for name in row_class._fields:
+        lines.extend(
+            [
+                f"    value = get({name!r}, MISSING)",
+                "    if value is not MISSING:",
+                f"        row.{name} = value",
+                "        present += 1",
+            ]
+        )
+    lines.extend(
+        [
+            "    if len(data) != present:",
+            "        row._extra = {k: v for k, v in data.items() if k not in field_set} or None",
+            "    else:",
+            "        row._extra = None",
+            "    return row",
+        ]
+    )
+    namespace = {
+        "row_class": row_class,
+        "new_row": object.__new__,
+        "MISSING": _MISSING,
+        "field_set": row_class._field_set,
+    }
+    exec("\n".join(lines), namespace)
+    return namespace["from_mapping"]
+
+
+def _build_values(row_class: Type[CompactRow]) -> Tuple[Callable, Callable]:
+    """Генерирует кортеж значений строки и такой же кортеж для словаря (для сравнения без циклов)."""
+    own_items = "".join(f"getattr(self, {name!r}, MISSING), " for name in row_class._fields)
+    mapping_items = "".join(f"get({name!r}, MISSING), " for name in row_class._fields)
+    namespace = {"MISSING": _MISSING}
+    exec(
+        f"def _values(self):\n    return ({own_items})\n"
+        f"def _values_of(data):\n    get = data.get\n    return ({mapping_items})\n",
+        namespace,
+    )
+    return namespace["_values"], namespace["_values_of"]
+
+
+_ROW_CLASSES: Dict[type, Type[CompactRow]] = {}
+
+
+def compact_row_class(model_class: type) -> Type[CompactRow]:
+    """Класс компактной строки для модели листа (кэшируется: один класс на модель)."""
+    row_class = _ROW_CLASSES.get(model_class)
+    if row_class is not None:
+        return row_class
+    fields = tuple(model_attribute_names(model_class))
+    for name in fields:
+        if not name.isidentifier() or hasattr(CompactRow, name):
+            raise ValueError(
+                f"Attribute '{name}' of model {model_class.__name__} cannot be used as a compact row field."
+            )
+    row_class = type(
+        f"{model_class.__name__}Row",
+        (CompactRow,),
+        {
+            "__slots__": fields,
+            "_fields": fields,
+            "_field_set": frozenset(fields),
+            "_model_name": model_class.__name__,
+            "__module__": __name__,
+        },
+    )
+    row_class.from_mapping = staticmethod(_build_from_mapping(row_class))
+    values, values_of = _build_values(row_class)
+    row_class._values = values
+    row_class._values_of = staticmethod(values_of)
+    _ROW_CLASSES[model_class] = row_class
+    return row_class
+
+
+def compact_row_factory(model_class: Optional[type]) -> Optional[Callable[[Any], CompactRow]]:
+    """Функция "словарь -> компактная строка" для модели или None, если модели нет."""
+    if model_class is None:
+        return None
+    return compact_row_class(model_class).from_mapping
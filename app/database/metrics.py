@@ -0,0 +1,249 @@
+# robotiaga-perfumeshopnew/app/database/metrics.py
+import asyncio
+import logging
+import math
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _label_values(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}."
+            )
+        return tuple(str(labels[label_name]) for label_name in self.labelnames)
+
+    def _labels_text(self, label_values: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, label_values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+    def _key_text(self, label_values: Tuple[str, ...]) -> str:
+        """Ключ серии в get_metrics(): "label=value,label=value" ("" - метрика без меток)."""
+        return ",".join(f"{name}={value}" for name, value in zip(self.labelnames, label_values))
+
+    def samples_text(self) -> List[str]:
+        raise NotImplementedError
+
+    def as_dict(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples_text(self) -> List[str]:
+        return [
+            f"{self.name}{self._labels_text(key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {self._key_text(key): value for key, value in sorted(self._values.items())}
+
+
+class Gauge(Counter):
+    """Текущее значение (может расти и уменьшаться)."""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам (как histogram в Prometheus: корзины накопительные)."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames, lock, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for position, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    state["counts"][position] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples_text(self) -> List[str]:
+        lines = []
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, state["counts"]):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{self._labels_text(key, [('le', _format_value(upper_bound))])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._labels_text(key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{self._labels_text(key)} {state['count']}")
+        return lines
+
+    def _quantile(self, state: Dict[str, Any], quantile: float) -> Optional[float]:
+        """Оценка квантиля по корзинам (верхняя граница корзины, в которую он попал)."""
+        if not state["count"]:
+            return None
+        rank = quantile * state["count"]
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self.buckets, state["counts"]):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return upper_bound if upper_bound != math.inf else self.buckets[-2]
+        return self.buckets[-2]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            self._key_text(key): {
+                "count": state["count"],
+                "sum": round(state["sum"], 6),
+                "avg": round(state["sum"] / state["count"], 6) if state["count"] else None,
+                "p50_le": self._quantile(state, 0.5),
+                "p99_le": self._quantile(state, 0.99),
+            }
+            for key, state in sorted(self._values.items())
+        }
+
+
+class MetricsRegistry:
+    """Набор метрик сервиса: отдается текстом в формате Prometheus и словарем для get_metrics()."""
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self._full_name(name), documentation, labelnames, self._lock))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self._full_name(name), documentation, labelnames, self._lock))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(
+            Histogram(self._full_name(name), documentation, labelnames, self._lock, buckets)
+        )
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in self._metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.documentation}")
+                lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+                lines.extend(metric.samples_text())
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: metric.as_dict() for name, metric in self._metrics.items()}
+
+
+class MetricsHttpServer:
+    """Минимальный HTTP-эндпоинт GET /metrics на asyncio (без внешних зависимостей)."""
+
+    def __init__(self, render: Callable[[], Awaitable[str]], host: str = "127.0.0.1", port: int = 9108):
+        self._render = render
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        sockets = self._server.sockets or []
+        if sockets:
+            self.port = sockets[0].getsockname()[1]
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # Заголовки запроса не нужны, но их надо дочитать до пустой строки
+            while True:
+                header_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+                if header_line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", (await self._render()).encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not Found\n", "text/plain"
+            writer.write(
+                (
+                    f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+                ).encode("latin-1")
+                + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Metrics endpoint request failed: {e}")
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
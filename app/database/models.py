@@ -7,6 +7,7 @@ from sqlalchemy import (
     Date,
     Text,
     Boolean,
+    Index,
 )  # Добавлен Boolean
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 import datetime
@@ -170,6 +171,15 @@ class PendingSheetOperation(SqliteBase):
     __tablename__ = (
         "pending_sheet_operations"  # Это PENDING_OPERATIONS_TABLE_NAME из config.py
     )
+    __table_args__ = (
+        # Выборка воркера: WHERE status IN (...) ORDER BY created_at, id LIMIT n
+        Index(
+            "ix_pending_sheet_operations_status_created_at",
+            "status",
+            "created_at",
+            "id",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     sheet_alias: Mapped[str] = mapped_column(String, nullable=False)
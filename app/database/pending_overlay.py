@@ -0,0 +1,203 @@
+# robotiaga-perfumeshopnew/app/database/pending_overlay.py
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .cache_index import HashIndex
+from .models import PendingSheetOperation
+
+
+class OverlayOperation:
+    """Операция очереди, которую еще не видел ни один скачанный снимок листа.
+
+    confirmed_at (time.monotonic) - когда запись подтверждена листом; до скачивания,
+    начатого позже этого момента, операция продолжает накладываться на свежие строки.
+    """
+
+    __slots__ = ("op_id", "operation_type", "filter_criteria", "data_payload", "confirmed_at")
+
+    def __init__(
+        self,
+        op_id: int,
+        operation_type: str,
+        filter_criteria: Optional[dict],
+        data_payload: Optional[dict],
+    ):
+        self.op_id = op_id
+        self.operation_type = operation_type.upper()
+        self.filter_criteria = filter_criteria
+        self.data_payload = data_payload
+        self.confirmed_at: Optional[float] = None
+
+    @classmethod
+    def from_pending(cls, operation: PendingSheetOperation) -> "OverlayOperation":
+        return cls(
+            operation.id,
+            operation.operation_type,
+            json.loads(operation.filter_criteria_json) if operation.filter_criteria_json else None,
+            json.loads(operation.data_payload_json) if operation.data_payload_json else None,
+        )
+
+
+def _matches(row: Dict[str, Any], criteria: dict) -> bool:
+    return all(row.get(k) == v for k, v in criteria.items())
+
+
+def apply_overlay_operations(
+    rows: Sequence[Dict[str, Any]], operations: Sequence[OverlayOperation], pk_attr: str
+) -> List[Dict[str, Any]]:
+    """Накладывает операции по порядку на скачанные строки листа (строки не изменяются, измененные копируются).
+
+    Семантика та же, что у оптимистичной записи и у бэкенда: CREATE добавляет строку,
+    UPDATE дополняет строки под фильтром, DELETE их убирает. Операции могут быть уже
+    применены в листе (подтверждены, но скачивание началось раньше), поэтому наложение
+    идемпотентно: CREATE не добавляет строку, если она уже есть (по PK, а без PK - по
+    совпадению всех значений payload).
+    """
+    result: List[Optional[Dict[str, Any]]] = list(rows)
+    positions_by_key: Optional[Dict[Any, List[int]]] = None
+
+    def key_positions() -> Dict[Any, List[int]]:
+        nonlocal positions_by_key
+        if positions_by_key is None:
+            positions_by_key = {}
+            for position, row in enumerate(result):
+                if row is None:
+                    continue
+                key_value = row.get(pk_attr)
+                if HashIndex.is_indexable(key_value):
+                    positions_by_key.setdefault(key_value, []).append(position)
+        return positions_by_key
+
+    def matching_positions(criteria: dict) -> List[int]:
+        key_value = criteria.get(pk_attr)
+        if pk_attr in criteria and HashIndex.is_indexable(key_value):
+            candidates: Iterable[int] = key_positions().get(key_value, ())
+        else:
+            candidates = range(len(result))
+        return [
+            position
+            for position in candidates
+            if result[position] is not None and _matches(result[position], criteria)
+        ]
+
+    def move_key(position: int, old_key: Any, new_key: Any):
+        if positions_by_key is None or old_key == new_key:
+            return
+        if HashIndex.is_indexable(old_key) and position in positions_by_key.get(old_key, ()):
+            positions_by_key[old_key].remove(position)
+        if HashIndex.is_indexable(new_key):
+            positions_by_key.setdefault(new_key, []).append(position)
+
+    for operation in operations:
+        if operation.operation_type == "CREATE":
+            payload = operation.data_payload
+            if not payload:
+                continue
+            if pk_attr in payload and HashIndex.is_indexable(payload[pk_attr]):
+                if key_positions().get(payload[pk_attr]):
+                    continue
+            elif any(row is not None and _matches(row, payload) for row in result):
+                continue
+            result.append(dict(payload))
+            move_key(len(result) - 1, None, payload.get(pk_attr))
+        elif operation.operation_type == "UPDATE":
+            if not operation.filter_criteria or not operation.data_payload:
+                continue
+            for position in matching_positions(operation.filter_criteria):
+                row = result[position]
+                result[position] = {**row, **operation.data_payload}
+                move_key(position, row.get(pk_attr), result[position].get(pk_attr))
+        elif operation.operation_type == "DELETE":
+            if not operation.filter_criteria:
+                continue
+            for position in matching_positions(operation.filter_criteria):
+                move_key(position, result[position].get(pk_attr), None)
+                result[position] = None
+    return [row for row in result if row is not None]
+
+
+class PendingOperationsOverlay:
+    """Неподтвержденные (и еще не скачанные) операции очереди по листам, в порядке ID.
+
+    Операция попадает в слой при постановке в очередь (или при восстановлении из SQLite
+    на старте) и накладывается на каждый скачанный снимок листа, пока ее не увидит
+    скачивание, начатое после подтверждения записи, или пока она не завершится ошибкой.
+    Так обновление листа, пришедшее раньше воркера, не стирает оптимистичную запись.
+    """
+
+    def __init__(self):
+        self._operations: Dict[str, Dict[int, OverlayOperation]] = {}
+
+    def add(self, sheet_alias: str, operation: OverlayOperation):
+        self._operations.setdefault(sheet_alias, {})[operation.op_id] = operation
+
+    def confirm(
+        self,
+        sheet_alias: str,
+        op_id: int,
+        result_info: Any = None,
+        confirmed_at: Optional[float] = None,
+    ):
+        """Запись подтверждена: операция накладывается до первого скачивания, начатого после confirmed_at.
+
+        Для CREATE в payload добавляются атрибуты, которые заполнил лист (как в подтвержденной записи кэша).
+        """
+        operation = self._operations.get(sheet_alias, {}).get(op_id)
+        if operation is None:
+            return
+        operation.confirmed_at = time.monotonic() if confirmed_at is None else confirmed_at
+        if operation.operation_type == "CREATE" and isinstance(result_info, dict) and operation.data_payload:
+            operation.data_payload = {**result_info, **operation.data_payload}
+
+    def discard(self, sheet_alias: str, op_id: int) -> bool:
+        """Убирает операцию из слоя (ошибка записи). True - операция была в слое."""
+        sheet_operations = self._operations.get(sheet_alias)
+        if not sheet_operations or sheet_operations.pop(op_id, None) is None:
+            return False
+        if not sheet_operations:
+            del self._operations[sheet_alias]
+        return True
+
+    def operations(self, sheet_alias: str) -> List[OverlayOperation]:
+        sheet_operations = self._operations.get(sheet_alias)
+        if not sheet_operations:
+            return []
+        return [sheet_operations[op_id] for op_id in sorted(sheet_operations)]
+
+    def prune_seen(self, sheet_alias: str, fetch_started_at: float) -> int:
+        """Убирает подтвержденные операции, которые уже видит скачивание, начатое в fetch_started_at."""
+        sheet_operations = self._operations.get(sheet_alias)
+        if not sheet_operations:
+            return 0
+        seen = [
+            op_id
+            for op_id, operation in sheet_operations.items()
+            if operation.confirmed_at is not None and operation.confirmed_at <= fetch_started_at
+        ]
+        for op_id in seen:
+            del sheet_operations[op_id]
+        if not sheet_operations:
+            del self._operations[sheet_alias]
+        return len(seen)
+
+    def apply(
+        self, sheet_alias: str, rows: Sequence[Dict[str, Any]], pk_attr: str
+    ) -> Sequence[Dict[str, Any]]:
+        """Строки листа с наложенными операциями слоя (без операций - те же строки)."""
+        operations = self.operations(sheet_alias)
+        if not operations:
+            return rows
+        return apply_overlay_operations(rows, operations, pk_attr)
+
+    def has_operations(self, sheet_alias: str) -> bool:
+        return bool(self._operations.get(sheet_alias))
+
+    def counts(self) -> Dict[str, int]:
+        return {sheet_alias: len(operations) for sheet_alias, operations in self._operations.items()}
+
+    def clear(self):
+        self._operations.clear()
+
+    def __len__(self) -> int:
+        return sum(len(operations) for operations in self._operations.values())
@@ -0,0 +1,142 @@
+# robotiaga-perfumeshopnew/app/database/queue_coalescing.py
+import json
+from typing import Dict, List, Optional, Tuple
+
+from .models import PendingSheetOperation
+
+
+class CoalescedOperation:
+    """Одна удаленная запись, в которую слиты одна или несколько операций из очереди."""
+
+    __slots__ = ("operation_type", "filter_criteria", "data_payload", "source_operations")
+
+    def __init__(
+        self,
+        operation_type: str,
+        filter_criteria: Optional[dict],
+        data_payload: Optional[dict],
+        source_operation: PendingSheetOperation,
+    ):
+        self.operation_type = operation_type
+        self.filter_criteria = filter_criteria
+        self.data_payload = data_payload
+        self.source_operations: List[PendingSheetOperation] = [source_operation]
+
+    @classmethod
+    def from_pending(cls, operation: PendingSheetOperation) -> "CoalescedOperation":
+        return cls(
+            operation.operation_type,
+            json.loads(operation.filter_criteria_json)
+            if operation.filter_criteria_json
+            else None,
+            json.loads(operation.data_payload_json)
+            if operation.data_payload_json
+            else None,
+            operation,
+        )
+
+    def as_batch_item(self) -> Tuple[str, Optional[dict], Optional[dict]]:
+        return self.operation_type, self.filter_criteria, self.data_payload
+
+
+def _primary_key_of(operation: CoalescedOperation, pk_attr: str) -> Optional[str]:
+    """Ключ строки, если операция адресует ровно одну строку по первичному ключу, иначе None."""
+    if operation.operation_type == "CREATE":
+        if not operation.data_payload or pk_attr not in operation.data_payload:
+            return None
+        key_value = operation.data_payload[pk_attr]
+    else:
+        if not operation.filter_criteria or set(operation.filter_criteria) != {pk_attr}:
+            return None
+        if operation.operation_type == "UPDATE" and not operation.data_payload:
+            return None
+        key_value = operation.filter_criteria[pk_attr]
+    return json.dumps(key_value, sort_keys=True, default=str)
+
+
+def _changes_primary_key(operation: CoalescedOperation, pk_attr: str) -> bool:
+    return (
+        operation.operation_type == "UPDATE"
+        and operation.data_payload is not None
+        and pk_attr in operation.data_payload
+        and operation.filter_criteria is not None
+        and operation.data_payload[pk_attr] != operation.filter_criteria.get(pk_attr)
+    )
+
+
+def coalesce_operations(
+    operations: List[PendingSheetOperation], pk_attr: str
+) -> Tuple[List[CoalescedOperation], List[PendingSheetOperation]]:
+    """Сливает операции одного листа (в порядке очереди) перед отправкой в GSheet.
+
+    - подряд идущие UPDATE с одинаковым фильтром по PK -> один UPDATE (поздние значения побеждают);
+    - UPDATE строки, CREATE которой еще не отправлен -> вливается в payload CREATE;
+    - CREATE и следующий за ним DELETE той же строки -> взаимно уничтожаются.
+
+    Сливаются только операции, адресующие строку по первичному ключу. Любая другая
+    операция листа (фильтр по другим полям, смена PK) - барьер: через нее не сливаем.
+    Возвращает (операции к отправке, операции, которые отправлять не нужно вовсе).
+    """
+    effective: List[Optional[CoalescedOperation]] = []
+    cancelled: List[PendingSheetOperation] = []
+    # Ключ PK -> позиция последней операции этой строки в effective, с которой еще можно сливать
+    open_positions: Dict[str, int] = {}
+
+    for operation in operations:
+        current = CoalescedOperation.from_pending(operation)
+        key = _primary_key_of(current, pk_attr)
+        if key is None or _changes_primary_key(current, pk_attr):
+            open_positions.clear()
+            effective.append(current)
+            continue
+
+        position = open_positions.get(key)
+        previous = effective[position] if position is not None else None
+
+        if (
+            previous is not None
+            and current.operation_type == "UPDATE"
+            and previous.operation_type in ("CREATE", "UPDATE")
+        ):
+            # UPDATE после CREATE или UPDATE той же строки - вливаем значения в предыдущую операцию
+            previous.data_payload = {**(previous.data_payload or {}), **current.data_payload}
+            previous.source_operations.append(operation)
+            continue
+        if (
+            previous is not None
+            and current.operation_type == "DELETE"
+            and previous.operation_type == "CREATE"
+        ):
+            # Строка создана и удалена, не дойдя до листа - не отправляем ни то, ни другое
+            cancelled.extend(previous.source_operations)
+            cancelled.append(operation)
+            effective[position] = None
+            del open_positions[key]
+            continue
+
+        effective.append(current)
+        if (
+            current.operation_type == "CREATE"
+            and previous is not None
+            and previous.operation_type != "DELETE"
+        ):
+            # Повторный CREATE того же PK даст в листе дубль - дальше по этому ключу не сливаем
+            del open_positions[key]
+            continue
+        open_positions[key] = len(effective) - 1
+
+    return [op for op in effective if op is not None], cancelled
+
+
+def operation_ordering_key(
+    operation: PendingSheetOperation, pk_attr: str
+) -> Optional[str]:
+    """Ключ строки, в пределах которого операции очереди обязаны выполняться строго по порядку.
+
+    None - операция не адресует одну строку по PK (фильтр по другим полям, смена PK)
+    и упорядочивается со всеми операциями своего листа.
+    """
+    current = CoalescedOperation.from_pending(operation)
+    if _changes_primary_key(current, pk_attr):
+        return None
+    return _primary_key_of(current, pk_attr)
@@ -0,0 +1,208 @@
+# robotiaga-perfumeshopnew/app/database/queue_storage.py
+import asyncio
+import datetime
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, insert, literal_column, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from .models import PendingSheetOperation
+
+logger = logging.getLogger(__name__)
+
+
+def configure_sqlite_queue_engine(
+    async_engine: AsyncEngine,
+    journal_mode: str = "WAL",
+    synchronous: str = "NORMAL",
+    busy_timeout_ms: int = 5000,
+):
+    """Выставляет PRAGMA на каждое новое соединение движка очереди.
+
+    WAL позволяет читать очередь во время записи, а synchronous=NORMAL в режиме WAL
+    не делает fsync на каждый коммит (при сбое питания теряются лишь последние
+    коммиты, целостность базы сохраняется).
+    """
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        finally:
+            cursor.close()
+
+
+def ensure_queue_indexes(sync_connection):
+    """Создает индексы таблицы очереди, которых нет (create_all не добавляет их к существующей таблице)."""
+    for index in PendingSheetOperation.__table__.indexes:
+        index.create(sync_connection, checkfirst=True)
+
+
+READY_STATUSES = ("pending", "retry")
+
+
+async def select_ready_operations(
+    session: AsyncSession,
+    limit: int,
+    after: Optional[Tuple[datetime.datetime, int]] = None,
+    exclude_sheets: Iterable[str] = (),
+    only_sheets: Optional[Iterable[str]] = None,
+) -> List[PendingSheetOperation]:
+    """До limit самых старых операций, готовых к отправке (pending и retry), по (created_at, id).
+
+    after - продолжить после операции (created_at, id) (постраничный проход очереди);
+    exclude_sheets / only_sheets - пропустить листы / взять только эти листы.
+    Каждый статус выбирается отдельным запросом: так SQLite идет по индексу
+    (status, created_at, id) в нужном порядке и читает не больше limit строк,
+    а с status IN (...) ему пришлось бы сортировать все готовые строки очереди.
+    """
+    conditions = []
+    if after is not None:
+        conditions.append(
+            tuple_(PendingSheetOperation.created_at, PendingSheetOperation.id) > tuple_(*after)
+        )
+    exclude_sheets = list(exclude_sheets)
+    if exclude_sheets:
+        conditions.append(PendingSheetOperation.sheet_alias.notin_(exclude_sheets))
+    if only_sheets is not None:
+        conditions.append(PendingSheetOperation.sheet_alias.in_(list(only_sheets)))
+    operations: List[PendingSheetOperation] = []
+    for status in READY_STATUSES:
+        result = await session.execute(
+            select(PendingSheetOperation)
+            .where(PendingSheetOperation.status == status, *conditions)
+            .order_by(PendingSheetOperation.created_at, PendingSheetOperation.id)
+            .limit(limit)
+        )
+        operations.extend(result.scalars())
+    operations.sort(key=lambda operation: (operation.created_at, operation.id))
+    return operations[:limit]
+
+
+def claim_operations_statement(
+    operation_ids: List[int], claimed_at: datetime.datetime
+):
+    """Условный перевод операций в "processing"; RETURNING отдает ID только реально забранных.
+
+    Статус проверяется как +status: унарный плюс не дает SQLite взять индекс по статусу
+    (иначе для id IN (...) он перебирает все готовые строки очереди вместо поиска по rowid).
+    """
+    return (
+        update(PendingSheetOperation)
+        .where(
+            PendingSheetOperation.id.in_(operation_ids),
+            literal_column("+status").in_(READY_STATUSES),
+        )
+        .values(
+            status="processing",
+            attempts=PendingSheetOperation.attempts + 1,
+            last_attempt_at=claimed_at,
+        )
+        .returning(PendingSheetOperation.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class SqliteQueueWriter:
+    """Единственный долгоживущий писатель очереди SQLite с групповым коммитом.
+
+    Постановки в очередь не открывают по ORM-сессии: они складываются в asyncio.Queue,
+    а фоновая задача забирает все накопившиеся запросы и вставляет их одной
+    транзакцией через одно соединение. Каждый вызывающий получает свои ID после коммита.
+    """
+
+    def __init__(self, async_engine: AsyncEngine, max_batch_rows: int = 500):
+        self.async_engine = async_engine
+        self.max_batch_rows = max(1, max_batch_rows)
+        self._requests: "asyncio.Queue[Tuple[List[Dict[str, Any]], asyncio.Future]]" = (
+            asyncio.Queue()
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._connection: Optional[AsyncConnection] = None
+        self.stats: Dict[str, int] = {"commits": 0, "rows": 0, "requests": 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._connection = await self.async_engine.connect()
+        self._task = asyncio.create_task(self._writer_loop())
+
+    async def enqueue(self, values: Dict[str, Any]) -> int:
+        return (await self.enqueue_many([values]))[0]
+
+    async def enqueue_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Ставит строки в очередь одной транзакцией и возвращает их ID в том же порядке."""
+        if not rows:
+            return []
+        if not self.is_running:
+            raise RuntimeError("SqliteQueueWriter is not running.")
+        future = asyncio.get_running_loop().create_future()
+        await self._requests.put((rows, future))
+        return await future
+
+    async def _writer_loop(self):
+        stopping = False
+        while not stopping:
+            rows, future = await self._requests.get()
+            if rows is None:
+                break
+            group = [(rows, future)]
+            group_rows = len(rows)
+            # Групповой коммит: забираем все уже ожидающие запросы
+            while group_rows < self.max_batch_rows and not self._requests.empty():
+                request = self._requests.get_nowait()
+                if request[0] is None:
+                    stopping = True
+                    break
+                group.append(request)
+                group_rows += len(request[0])
+            await self._write_group(group)
+
+    async def _write_group(
+        self, group: List[Tuple[List[Dict[str, Any]], asyncio.Future]]
+    ):
+        all_rows = [row for rows, _ in group for row in rows]
+        try:
+            async with self._connection.begin():
+                result = await self._connection.execute(
+                    insert(PendingSheetOperation).returning(
+                        PendingSheetOperation.id, sort_by_parameter_order=True
+                    ),
+                    all_rows,
+                )
+                ids = list(result.scalars())
+        except Exception as e:
+            logger.error(
+                f"SQLite queue writer failed to commit {len(all_rows)} row(s): {e}",
+                exc_info=True,
+            )
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats["commits"] += 1
+        self.stats["rows"] += len(all_rows)
+        self.stats["requests"] += len(group)
+        position = 0
+        for rows, future in group:
+            if not future.done():
+                future.set_result(ids[position : position + len(rows)])
+            position += len(rows)
+
+    async def close(self):
+        """Дописывает уже поставленные запросы и закрывает соединение."""
+        if self.is_running:
+            await self._requests.put((None, None))
+            await self._task
+        self._task = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
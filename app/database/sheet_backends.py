@@ -0,0 +1,755 @@
+# robotiaga-perfumeshopnew/app/database/sheet_backends.py
+import collections
+import datetime
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Type
+
+import gspread
+from sqlalchemy import create_engine as create_sync_engine
+from sqlalchemy.inspection import inspect as sqlalchemy_inspect
+from sqlalchemy.orm import Session as SyncSqlAlchemySession
+from sqlalchemy.orm import sessionmaker
+
+from .change_probes import (
+    DriveRevisionChangeProbe,
+    SheetChangeProbe,
+    VersionCounterChangeProbe,
+)
+from .models import GSheetBase
+from .sheet_values import (
+    VALUES_RENDER_PARAMS,
+    SheetValuesDecoder,
+    model_column_attributes,
+    sheet_range,
+)
+
+logger = logging.getLogger(__name__)
+
+# Операция пачки: (тип операции, критерии фильтра, данные)
+BatchOperation = Tuple[str, Optional[dict], Optional[dict]]
+
+
+def model_attribute_names(model_class: Type[GSheetBase]) -> List[str]:
+    return [col.key for col in sqlalchemy_inspect(model_class).mapper.column_attrs]
+
+
+class SheetBackend:
+    """Источник данных листов: все удаленное чтение и запись сервиса идут через него.
+
+    Методы *_blocking блокирующие, сервис вызывает их в своих пулах потоков (BlockingCallPool).
+    Контракт ошибок общий для реализаций: fetch_rows_blocking возвращает None,
+    create_row_blocking - None, update/delete - 0, а apply_operations_blocking
+    отдает (False, текст ошибки) по каждой неудавшейся операции.
+    """
+
+    name = "base"
+    # fetch_sheets_rows_blocking читает все листы одним запросом (иначе - лист за листом)
+    supports_batch_fetch = False
+    # Запись находит строки по ключу, а не по номеру: несколько групп операций одного
+    # листа можно отправлять параллельно (иначе - строго по одной группе на лист)
+    supports_concurrent_sheet_writes = False
+
+    def __init__(self, model_map: Dict[str, Type[GSheetBase]]):
+        self.model_map = model_map
+        self.catalog: Dict[str, str] = {}
+
+    def apply_catalog(self, catalog: Dict[str, str]):
+        """Каталог листов (название -> адрес листа), с которым работает бэкенд."""
+        self.catalog = dict(catalog)
+
+    def get_model(self, sheet_alias: str) -> Type[GSheetBase]:
+        model_class = self.model_map.get(sheet_alias)
+        if not model_class:
+            raise ValueError(f"GSheet ORM model for alias '{sheet_alias}' not found.")
+        if sheet_alias not in self.catalog:
+            raise ValueError(f"GSheet alias '{sheet_alias}' not in catalog.")
+        return model_class
+
+    def list_sheets_blocking(self, expected_titles: Iterable[str]) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def fetch_rows_blocking(self, sheet_alias: str) -> Optional[List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def fetch_sheets_rows_blocking(
+        self, sheet_aliases: List[str]
+    ) -> Optional[Dict[str, Optional[List[Dict[str, Any]]]]]:
+        """Строки нескольких листов: alias -> строки (None - лист не скачан). None - не удалось ничего."""
+        return {alias: self.fetch_rows_blocking(alias) for alias in sheet_aliases}
+
+    def create_row_blocking(self, sheet_alias: str, data_payload: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update_rows_blocking(
+        self, sheet_alias: str, filter_criteria: dict, new_data: dict
+    ) -> int:
+        raise NotImplementedError
+
+    def delete_rows_blocking(self, sheet_alias: str, filter_criteria: dict) -> int:
+        raise NotImplementedError
+
+    def apply_operations_blocking(
+        self, sheet_alias: str, operations: List[BatchOperation]
+    ) -> List[Tuple[bool, Any]]:
+        raise NotImplementedError
+
+    def default_change_probe(self) -> Optional[SheetChangeProbe]:
+        """Проба изменений, подходящая этому бэкенду (None - скачивать листы всегда)."""
+        return None
+
+    def close(self):
+        pass
+
+
+def _create_run_end(operations: List[BatchOperation], position: int) -> int:
+    """Конец серии подряд идущих CREATE (с данными), начинающейся с position."""
+    run_end = position
+    while (
+        run_end < len(operations)
+        and operations[run_end][0] == "CREATE"
+        and operations[run_end][2]
+    ):
+        run_end += 1
+    return run_end
+
+
+class ShillelaghGSheetBackend(SheetBackend):
+    """Google Sheets: чтение и точечная запись через Shillelagh (gsheets://), каталог и append через gspread."""
+
+    name = "gsheets"
+    supports_batch_fetch = True
+    # Адаптер gsheets ищет номер строки отдельным скачиванием и пишет/удаляет по номеру:
+    # удаление из параллельной группы между поиском и записью сдвигает строки
+    supports_concurrent_sheet_writes = False
+
+    def __init__(
+        self,
+        spreadsheet_id: str,
+        credentials_path: str,
+        model_map: Dict[str, Type[GSheetBase]],
+        batch_append_creates: bool = True,
+    ):
+        super().__init__(model_map)
+        self.spreadsheet_id = spreadsheet_id
+        self.credentials_path = credentials_path
+        self.batch_append_creates = batch_append_creates
+        self.gsheet_db_engine = None
+        self.GSheetSessionLocal = None
+        # gspread-клиент для каталога и пакетных append (Shillelagh добавляет строки по одной)
+        self._gspread_client: Optional[gspread.Client] = None
+        self._gspread_client_lock = threading.Lock()
+        self._values_decoders: Dict[str, SheetValuesDecoder] = {}
+        self.apply_catalog({})
+
+    def apply_catalog(self, catalog: Dict[str, str]):
+        """Подменяет каталог и пересоздает движок Shillelagh (он копирует каталог при создании)."""
+        previous_engine = self.gsheet_db_engine
+        super().apply_catalog(catalog)
+        # Синхронный движок для Shillelagh (Google Sheets)
+        self.gsheet_db_engine = create_sync_engine(
+            "gsheets://",
+            service_account_file=self.credentials_path,
+            catalog=self.catalog,
+        )
+        self.GSheetSessionLocal = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=self.gsheet_db_engine,
+            class_=SyncSqlAlchemySession,
+        )
+        if previous_engine is not None:
+            previous_engine.dispose()
+
+    def default_change_probe(self) -> Optional[SheetChangeProbe]:
+        return DriveRevisionChangeProbe(self.credentials_path, self.spreadsheet_id)
+
+    def close(self):
+        if self.gsheet_db_engine is not None:
+            self.gsheet_db_engine.dispose()
+
+    def _get_gspread_client(self) -> gspread.Client:
+        with self._gspread_client_lock:
+            if self._gspread_client is None:
+                self._gspread_client = gspread.service_account(
+                    filename=self.credentials_path
+                )
+            return self._gspread_client
+
+    def _open_spreadsheet(self) -> gspread.Spreadsheet:
+        return self._get_gspread_client().open_by_key(self.spreadsheet_id)
+
+    def list_sheets_blocking(self, expected_titles: Iterable[str]) -> Dict[str, str]:
+        expected_titles = list(expected_titles)
+        catalog = {}
+        try:
+            spreadsheet = self._open_spreadsheet()
+            logger.info(f"(Sync) Building GSheet catalog for: {spreadsheet.title}")
+            found_titles = []
+            for worksheet in spreadsheet.worksheets():
+                title = worksheet.title
+                found_titles.append(title)
+                if title in expected_titles:
+                    url = f"https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}/edit?headers=1#gid={worksheet.id}"
+                    catalog[title] = url
+                    logger.info(f"(Sync)  Added GSheet '{title}' to catalog: {url}")
+            for expected in expected_titles:
+                if expected not in catalog:
+                    logger.warning(
+                        f"(Sync) Expected GSheet '{expected}' not in catalog. Found: {found_titles}"
+                    )
+        except Exception as e:
+            logger.error(f"(Sync) Error building GSheet catalog: {e}", exc_info=True)
+        return catalog
+
+    @staticmethod
+    def _row_to_dict(
+        row_object: GSheetBase, model_class: Type[GSheetBase]
+    ) -> Dict[str, Any]:
+        if row_object is None:
+            return {}
+        data_dict = {}
+        for col_attr in sqlalchemy_inspect(model_class).mapper.column_attrs:
+            data_dict[col_attr.key] = getattr(row_object, col_attr.key)
+        return data_dict
+
+    def fetch_rows_blocking(self, sheet_alias: str) -> Optional[List[Dict[str, Any]]]:
+        logger.debug(f"(Sync) Fetching data from GSheet: {sheet_alias}")
+        model_class = self.get_model(sheet_alias)
+        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+        try:
+            results = gsheet_session.query(model_class).all()
+            return [self._row_to_dict(row, model_class) for row in results]
+        except Exception as e:
+            logger.error(
+                f"(Sync) Error fetching GSheet data for '{sheet_alias}': {e}",
+                exc_info=True,
+            )
+            return None
+        finally:
+            gsheet_session.close()
+
+    def _values_decoder(self, sheet_alias: str) -> SheetValuesDecoder:
+        decoder = self._values_decoders.get(sheet_alias)
+        if decoder is None:
+            decoder = self._values_decoders[sheet_alias] = SheetValuesDecoder(
+                self.get_model(sheet_alias)
+            )
+        return decoder
+
+    def fetch_sheets_rows_blocking(
+        self, sheet_aliases: List[str]
+    ) -> Optional[Dict[str, Optional[List[Dict[str, Any]]]]]:
+        """Все листы одним запросом values.batchGet (gspread) вместо ORM-запроса Shillelagh на каждый лист.
+
+        Заголовки колонок сопоставляются с атрибутами моделей по именам mapped_column,
+        типы приводятся поколоночно (SheetValuesDecoder). Название листа в каталоге -
+        это название вкладки, по нему строится диапазон. Плановое обновление одного листа
+        сервис тоже читает здесь, чтобы строки не зависели от пути скачивания.
+        """
+        logger.debug(f"(Sync) Batch fetching GSheets: {sheet_aliases}")
+        try:
+            decoders = [self._values_decoder(alias) for alias in sheet_aliases]
+            response = self._open_spreadsheet().values_batch_get(
+                [sheet_range(alias) for alias in sheet_aliases],
+                params=VALUES_RENDER_PARAMS,
+            )
+        except Exception as e:
+            logger.error(
+                f"(Sync) Error batch fetching GSheet data for {sheet_aliases}: {e}",
+                exc_info=True,
+            )
+            return None
+        value_ranges = response.get("valueRanges", [])
+        rows_by_alias: Dict[str, Optional[List[Dict[str, Any]]]] = {}
+        for position, (alias, decoder) in enumerate(zip(sheet_aliases, decoders)):
+            if position >= len(value_ranges):
+                rows_by_alias[alias] = None
+                continue
+            try:
+                rows_by_alias[alias] = decoder.decode(value_ranges[position].get("values", []))
+            except Exception as e:
+                logger.error(
+                    f"(Sync) Error decoding GSheet values of '{alias}': {e}", exc_info=True
+                )
+                rows_by_alias[alias] = None
+        return rows_by_alias
+
+    def _create_row_in_session(
+        self,
+        gsheet_session: SyncSqlAlchemySession,
+        model_class: Type[GSheetBase],
+        data_payload: dict,
+    ) -> dict:
+        valid_data = {}
+        model_attrs = set(model_attribute_names(model_class))
+        for key, value in data_payload.items():
+            if key in model_attrs:
+                valid_data[key] = value
+        new_record = model_class(**valid_data)
+        gsheet_session.add(new_record)
+        gsheet_session.flush()
+        return_data = {}
+        for attr_name in model_attrs:
+            if attr_name in valid_data:
+                return_data[attr_name] = valid_data[attr_name]
+            elif hasattr(new_record, attr_name):
+                return_data[attr_name] = getattr(new_record, attr_name)
+        return return_data
+
+    def _update_rows_in_session(
+        self,
+        gsheet_session: SyncSqlAlchemySession,
+        model_class: Type[GSheetBase],
+        filter_criteria: dict,
+        new_data: dict,
+    ) -> int:
+        updated_count = 0
+        records_to_update = (
+            gsheet_session.query(model_class).filter_by(**filter_criteria).all()
+        )
+        for record in records_to_update:
+            for key, value in new_data.items():
+                if hasattr(record, key):
+                    setattr(record, key, value)
+            updated_count += 1
+        if updated_count > 0:
+            gsheet_session.flush()
+        return updated_count
+
+    def _delete_rows_in_session(
+        self,
+        gsheet_session: SyncSqlAlchemySession,
+        model_class: Type[GSheetBase],
+        filter_criteria: dict,
+    ) -> int:
+        deleted_count = 0
+        records_to_delete = (
+            gsheet_session.query(model_class).filter_by(**filter_criteria).all()
+        )
+        for record in records_to_delete:
+            gsheet_session.delete(record)
+            deleted_count += 1
+        if deleted_count > 0:
+            gsheet_session.flush()
+        return deleted_count
+
+    def create_row_blocking(self, sheet_alias: str, data_payload: dict) -> Optional[dict]:
+        model_class = self.get_model(sheet_alias)
+        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+        try:
+            return_data = self._create_row_in_session(
+                gsheet_session, model_class, data_payload
+            )
+            gsheet_session.commit()
+            return return_data
+        except Exception as e:
+            gsheet_session.rollback()
+            logger.error(
+                f"(Sync) GSheet create_row error '{sheet_alias}': {e}", exc_info=True
+            )
+            return None
+        finally:
+            gsheet_session.close()
+
+    def update_rows_blocking(
+        self, sheet_alias: str, filter_criteria: dict, new_data: dict
+    ) -> int:
+        model_class = self.get_model(sheet_alias)
+        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+        try:
+            updated_count = self._update_rows_in_session(
+                gsheet_session, model_class, filter_criteria, new_data
+            )
+            if updated_count > 0:
+                gsheet_session.commit()
+            return updated_count
+        except Exception as e:
+            gsheet_session.rollback()
+            logger.error(
+                f"(Sync) GSheet update_rows error '{sheet_alias}': {e}", exc_info=True
+            )
+            return 0
+        finally:
+            gsheet_session.close()
+
+    def delete_rows_blocking(self, sheet_alias: str, filter_criteria: dict) -> int:
+        model_class = self.get_model(sheet_alias)
+        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+        try:
+            deleted_count = self._delete_rows_in_session(
+                gsheet_session, model_class, filter_criteria
+            )
+            if deleted_count > 0:
+                gsheet_session.commit()
+            return deleted_count
+        except Exception as e:
+            gsheet_session.rollback()
+            logger.error(
+                f"(Sync) GSheet delete_rows error '{sheet_alias}': {e}", exc_info=True
+            )
+            return 0
+        finally:
+            gsheet_session.close()
+
+    def _get_worksheet(self, sheet_alias: str) -> gspread.Worksheet:
+        worksheet_gid = int(self.catalog[sheet_alias].rsplit("gid=", 1)[1])
+        spreadsheet = self._open_spreadsheet()
+        return spreadsheet.get_worksheet_by_id(worksheet_gid)
+
+    @staticmethod
+    def _to_sheet_cell(value: Any) -> Any:
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return "TRUE" if value else "FALSE"
+        if isinstance(value, (int, float, str)):
+            return value
+        if isinstance(value, datetime.datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return str(value)
+
+    def append_rows_blocking(
+        self, sheet_alias: str, data_payloads: List[dict]
+    ) -> List[dict]:
+        """Добавляет строки в конец листа одним запросом append (Shillelagh пишет по строке за запрос).
+
+        Колонки сопоставляются по заголовкам листа (именам колонок модели).
+        Возвращает данные созданных строк в том же виде, что _create_row_in_session.
+        """
+        model_class = self.get_model(sheet_alias)
+        attr_by_column_name = model_column_attributes(model_class)
+        model_attrs = list(attr_by_column_name.values())
+        worksheet = self._get_worksheet(sheet_alias)
+        header = worksheet.row_values(1)
+        return_rows = [
+            {attr_name: payload.get(attr_name) for attr_name in model_attrs}
+            for payload in data_payloads
+        ]
+        values = [
+            [
+                self._to_sheet_cell(row.get(attr_by_column_name.get(column_name)))
+                for column_name in header
+            ]
+            for row in return_rows
+        ]
+        worksheet.append_rows(
+            values,
+            value_input_option="USER_ENTERED",
+            insert_data_option="INSERT_ROWS",
+            table_range="A1",
+        )
+        return return_rows
+
+    def apply_operations_blocking(
+        self, sheet_alias: str, operations: List[BatchOperation]
+    ) -> List[Tuple[bool, Any]]:
+        """Применяет пачку операций (op_type, criteria, payload) к одному листу в одной GSheet-сессии.
+
+        Каждая операция сбрасывается в лист отдельным flush, поэтому ошибка одной
+        операции не отменяет остальные. Подряд идущие CREATE (от двух) отправляются
+        одним append-запросом. Возвращает (успех, результат) по каждой операции.
+        """
+        model_class = self.get_model(sheet_alias)
+        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+        outcomes: List[Tuple[bool, Any]] = []
+        position = 0
+        try:
+            while position < len(operations):
+                op_type, criteria, payload = operations[position]
+                create_run_end = _create_run_end(operations, position)
+                if self.batch_append_creates and create_run_end - position > 1:
+                    payloads = [item[2] for item in operations[position:create_run_end]]
+                    try:
+                        created_rows = self.append_rows_blocking(sheet_alias, payloads)
+                        outcomes.extend((True, row) for row in created_rows)
+                    except Exception as e:
+                        logger.error(
+                            f"(Sync) GSheet batch append of {len(payloads)} row(s) error '{sheet_alias}': {e}",
+                            exc_info=True,
+                        )
+                        outcomes.extend((False, str(e)) for _ in payloads)
+                    position = create_run_end
+                    continue
+                position += 1
+                try:
+                    if op_type == "CREATE" and payload:
+                        result_info = self._create_row_in_session(
+                            gsheet_session, model_class, payload
+                        )
+                        outcomes.append((True, result_info))
+                    elif op_type == "UPDATE" and criteria and payload:
+                        result_info = self._update_rows_in_session(
+                            gsheet_session, model_class, criteria, payload
+                        )
+                        outcomes.append((result_info > 0, result_info))
+                    elif op_type == "DELETE" and criteria:
+                        result_info = self._delete_rows_in_session(
+                            gsheet_session, model_class, criteria
+                        )
+                        outcomes.append((result_info > 0, result_info))
+                    else:
+                        outcomes.append((False, f"Invalid operation '{op_type}'"))
+                except Exception as e:
+                    gsheet_session.rollback()
+                    logger.error(
+                        f"(Sync) GSheet batch {op_type} error '{sheet_alias}': {e}",
+                        exc_info=True,
+                    )
+                    outcomes.append((False, str(e)))
+            gsheet_session.commit()
+        finally:
+            gsheet_session.close()
+        return outcomes
+
+
+class FakeSheetBackendError(Exception):
+    """Сбой, который имитирует локальный fake-бэкенд (ошибка API или превышение квоты)."""
+
+
+class LocalFakeSheetBackend(SheetBackend):
+    """Листы в памяти процесса - для запуска сервиса и бота без сети и для бенчмарков.
+
+    Имитирует поведение Google Sheets API: задержку каждого запроса (latency_seconds
+    плюс случайная добавка до latency_jitter_seconds), случайные сбои с вероятностью
+    error_rate и квоту requests_per_minute (сверх нее запрос падает, как с ответом 429).
+    У каждого листа есть счетчик версий, он растет при каждом изменении листа.
+    """
+
+    name = "fake"
+    supports_batch_fetch = True
+    supports_concurrent_sheet_writes = True
+
+    def __init__(
+        self,
+        model_map: Dict[str, Type[GSheetBase]],
+        seed_rows: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        latency_seconds: float = 0.0,
+        latency_jitter_seconds: float = 0.0,
+        error_rate: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+        batch_append_creates: bool = True,
+        random_seed: Optional[int] = None,
+    ):
+        super().__init__(model_map)
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.batch_append_creates = batch_append_creates
+        self._random = random.Random(random_seed)
+        self._lock = threading.Lock()
+        self._request_times: Deque[float] = collections.deque()
+        self._model_attrs = {
+            alias: model_attribute_names(model_class)
+            for alias, model_class in model_map.items()
+        }
+        self._sheets: Dict[str, List[Dict[str, Any]]] = {alias: [] for alias in model_map}
+        self._versions: Dict[str, int] = {alias: 0 for alias in model_map}
+        # Счетчики версий живут только в этом экземпляре: токены проб различаются между запусками
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.stats: Dict[str, int] = {"requests": 0, "errors": 0, "rate_limited": 0}
+        for alias, rows in (seed_rows or {}).items():
+            self.load_rows(alias, rows)
+
+    def load_rows(self, sheet_alias: str, rows: Iterable[Dict[str, Any]]):
+        """Заменяет содержимое листа (без имитации задержек и квоты)."""
+        with self._lock:
+            self._sheets[sheet_alias] = [self._complete_row(sheet_alias, row) for row in rows]
+            self._versions[sheet_alias] = self._versions.get(sheet_alias, 0) + 1
+
+    def get_sheet_version(self, sheet_alias: str) -> Optional[int]:
+        with self._lock:
+            return self._versions.get(sheet_alias)
+
+    def default_change_probe(self) -> Optional[SheetChangeProbe]:
+        return VersionCounterChangeProbe(self.get_sheet_version, self.instance_id)
+
+    def _complete_row(self, sheet_alias: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {attr_name: data.get(attr_name) for attr_name in self._model_attrs[sheet_alias]}
+
+    def _simulate_request(self, description: str):
+        """Квота, задержка и случайный сбой одного запроса к "API"."""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.requests_per_minute:
+                now = time.monotonic()
+                while self._request_times and now - self._request_times[0] >= 60.0:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.requests_per_minute:
+                    self.stats["rate_limited"] += 1
+                    raise FakeSheetBackendError(
+                        f"429 RESOURCE_EXHAUSTED: quota of {self.requests_per_minute} requests/min exceeded ({description})"
+                    )
+                self._request_times.append(now)
+            delay = self.latency_seconds
+            if self.latency_jitter_seconds:
+                delay += self._random.uniform(0, self.latency_jitter_seconds)
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise FakeSheetBackendError(f"503 UNAVAILABLE: simulated backend error ({description})")
+
+    @staticmethod
+    def _matches(row: Dict[str, Any], filter_criteria: dict) -> bool:
+        return all(row.get(key) == value for key, value in filter_criteria.items())
+
+    def list_sheets_blocking(self, expected_titles: Iterable[str]) -> Dict[str, str]:
+        try:
+            self._simulate_request("list sheets")
+        except FakeSheetBackendError as e:
+            logger.error(f"(Sync) Error building fake sheet catalog: {e}")
+            return {}
+        return {
+            title: f"fake://{title}" for title in expected_titles if title in self._sheets
+        }
+
+    def fetch_rows_blocking(self, sheet_alias: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            self.get_model(sheet_alias)
+            self._simulate_request(f"fetch '{sheet_alias}'")
+        except Exception as e:
+            logger.error(f"(Sync) Error fetching fake sheet '{sheet_alias}': {e}")
+            return None
+        with self._lock:
+            return [dict(row) for row in self._sheets[sheet_alias]]
+
+    def fetch_sheets_rows_blocking(
+        self, sheet_aliases: List[str]
+    ) -> Optional[Dict[str, Optional[List[Dict[str, Any]]]]]:
+        """Все листы за один имитируемый запрос (как values.batchGet)."""
+        try:
+            for sheet_alias in sheet_aliases:
+                self.get_model(sheet_alias)
+            self._simulate_request(f"batch fetch {len(sheet_aliases)} sheet(s)")
+        except Exception as e:
+            logger.error(f"(Sync) Error batch fetching fake sheets {sheet_aliases}: {e}")
+            return None
+        with self._lock:
+            return {
+                sheet_alias: [dict(row) for row in self._sheets[sheet_alias]]
+                for sheet_alias in sheet_aliases
+            }
+
+    def _create_row_locked(self, sheet_alias: str, data_payload: dict) -> dict:
+        row = self._complete_row(sheet_alias, data_payload)
+        self._sheets[sheet_alias].append(row)
+        return dict(row)
+
+    def _update_rows_locked(self, sheet_alias: str, filter_criteria: dict, new_data: dict) -> int:
+        model_attrs = self._model_attrs[sheet_alias]
+        updated_count = 0
+        rows = self._sheets[sheet_alias]
+        for position, row in enumerate(rows):
+            if self._matches(row, filter_criteria):
+                rows[position] = {
+                    **row,
+                    **{key: value for key, value in new_data.items() if key in model_attrs},
+                }
+                updated_count += 1
+        return updated_count
+
+    def _delete_rows_locked(self, sheet_alias: str, filter_criteria: dict) -> int:
+        rows = self._sheets[sheet_alias]
+        kept = [row for row in rows if not self._matches(row, filter_criteria)]
+        self._sheets[sheet_alias] = kept
+        return len(rows) - len(kept)
+
+    def _bump_version_locked(self, sheet_alias: str, changed: bool):
+        if changed:
+            self._versions[sheet_alias] += 1
+
+    def create_row_blocking(self, sheet_alias: str, data_payload: dict) -> Optional[dict]:
+        try:
+            self.get_model(sheet_alias)
+            self._simulate_request(f"create in '{sheet_alias}'")
+        except Exception as e:
+            logger.error(f"(Sync) Fake create_row error '{sheet_alias}': {e}")
+            return None
+        with self._lock:
+            created = self._create_row_locked(sheet_alias, data_payload)
+            self._bump_version_locked(sheet_alias, True)
+        return created
+
+    def update_rows_blocking(
+        self, sheet_alias: str, filter_criteria: dict, new_data: dict
+    ) -> int:
+        try:
+            self.get_model(sheet_alias)
+            self._simulate_request(f"update in '{sheet_alias}'")
+        except Exception as e:
+            logger.error(f"(Sync) Fake update_rows error '{sheet_alias}': {e}")
+            return 0
+        with self._lock:
+            updated_count = self._update_rows_locked(sheet_alias, filter_criteria, new_data)
+            self._bump_version_locked(sheet_alias, updated_count > 0)
+        return updated_count
+
+    def delete_rows_blocking(self, sheet_alias: str, filter_criteria: dict) -> int:
+        try:
+            self.get_model(sheet_alias)
+            self._simulate_request(f"delete in '{sheet_alias}'")
+        except Exception as e:
+            logger.error(f"(Sync) Fake delete_rows error '{sheet_alias}': {e}")
+            return 0
+        with self._lock:
+            deleted_count = self._delete_rows_locked(sheet_alias, filter_criteria)
+            self._bump_version_locked(sheet_alias, deleted_count > 0)
+        return deleted_count
+
+    def apply_operations_blocking(
+        self, sheet_alias: str, operations: List[BatchOperation]
+    ) -> List[Tuple[bool, Any]]:
+        """Как у Google Sheets: серия CREATE - один запрос append, остальные операции - по запросу."""
+        self.get_model(sheet_alias)
+        outcomes: List[Tuple[bool, Any]] = []
+        position = 0
+        while position < len(operations):
+            op_type, criteria, payload = operations[position]
+            run_end = _create_run_end(operations, position)
+            if not (self.batch_append_creates and run_end - position > 1):
+                run_end = position + 1
+            batch = operations[position:run_end]
+            position = run_end
+            try:
+                self._simulate_request(f"{op_type} x{len(batch)} in '{sheet_alias}'")
+            except FakeSheetBackendError as e:
+                outcomes.extend((False, str(e)) for _ in batch)
+                continue
+            with self._lock:
+                for op_type, criteria, payload in batch:
+                    if op_type == "CREATE" and payload:
+                        outcomes.append((True, self._create_row_locked(sheet_alias, payload)))
+                        self._bump_version_locked(sheet_alias, True)
+                    elif op_type == "UPDATE" and criteria and payload:
+                        result_info = self._update_rows_locked(sheet_alias, criteria, payload)
+                        self._bump_version_locked(sheet_alias, result_info > 0)
+                        outcomes.append((result_info > 0, result_info))
+                    elif op_type == "DELETE" and criteria:
+                        result_info = self._delete_rows_locked(sheet_alias, criteria)
+                        self._bump_version_locked(sheet_alias, result_info > 0)
+                        outcomes.append((result_info > 0, result_info))
+                    else:
+                        outcomes.append((False, f"Invalid operation '{op_type}'"))
+        return outcomes
+
+
+def load_fake_seed_rows(path: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Начальные строки fake-бэкенда из JSON-файла {"Лист": [{атрибут: значение}, ...]}."""
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"Fake sheet backend seed file '{path}' not found, starting with empty sheets.")
+        return {}
@@ -5,13 +5,16 @@ import logging
 import asyncio
 import time
 import json
+import random
 import datetime
-from typing import Dict, List, Any, Optional, Type
+from typing import Callable, Dict, List, Any, Optional, Sequence, Tuple, Type, Union
 
 # SQLAlchemy imports for async
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy import (
+    func,
     select,
     update as sqlalchemy_update_stmt,
     delete as sqlalchemy_delete_stmt,
@@ -19,11 +22,8 @@ from sqlalchemy import (
 )
 
 # Standard SQLAlchemy imports for Shillelagh (sync)
-from sqlalchemy import create_engine as create_sync_engine
-from sqlalchemy.orm import Session as SyncSqlAlchemySession
 from sqlalchemy.inspection import inspect as sqlalchemy_inspect
 
-import gspread
 
 # aiosqlite больше не нужен для прямого импорта, SQLAlchemy будет использовать его под капотом
 
@@ -38,45 +38,190 @@ from .models import (
     PendingSheetOperation,
     User,
 )
+from .cache_index import HashIndex
+from .cache_snapshot import SheetChangeSet, SheetSnapshot
+from .compact_rows import compact_row_factory
+from .columnar_catalog import CatalogQueryResult, ColumnarCatalog
+from .cache_query import CacheQuery, SortKey
+from .catalog_views import CatalogViews
+from .cache_persistence import (
+    PersistedSheet,
+    read_cache_snapshot_file,
+    write_cache_snapshot_file,
+)
+from .change_probes import SheetChangeProbe
+from .sheet_backends import (
+    LocalFakeSheetBackend,
+    SheetBackend,
+    ShillelaghGSheetBackend,
+    load_fake_seed_rows,
+    model_attribute_names,
+)
+from .metrics import MetricsHttpServer, MetricsRegistry
+from .blocking_pool import BlockingCallPool
+from .pending_overlay import OverlayOperation, PendingOperationsOverlay
+from .queue_storage import (
+    READY_STATUSES,
+    SqliteQueueWriter,
+    claim_operations_statement,
+    configure_sqlite_queue_engine,
+    ensure_queue_indexes,
+    select_ready_operations,
+)
+from .queue_coalescing import (
+    CoalescedOperation,
+    coalesce_operations,
+    operation_ordering_key,
+)
 from config import (
     EXPECTED_SHEET_TITLES,
     CACHE_REFRESH_INTERVAL_SECONDS,
+    SHEET_REFRESH_INTERVALS_SECONDS,
+    CACHE_REFRESH_JITTER_RATIO,
+    CACHE_REFRESH_MAX_CONCURRENT_FETCHES,
+    CACHE_BATCH_FETCH,
+    CACHE_CHANGE_PROBE_ENABLED,
+    CACHE_SECONDARY_INDEXES,
+    CACHE_COMPACT_ROWS,
+    CATALOG_SHEET_ALIAS,
     SQLITE_DB_PATH,  # PENDING_OPERATIONS_TABLE_NAME (имя таблицы берется из __tablename__ модели)
+    SQLITE_QUEUE_TUNED_STORAGE,
+    SQLITE_QUEUE_JOURNAL_MODE,
+    SQLITE_QUEUE_SYNCHRONOUS,
+    SQLITE_QUEUE_WRITER_MAX_BATCH_ROWS,
     QUEUE_WORKER_INTERVAL_SECONDS,
+    QUEUE_WORKER_RETRY_DELAY_SECONDS,
+    QUEUE_WORKER_BATCH_WINDOW_SECONDS,
+    QUEUE_WORKER_SAFETY_POLL_WHEN_IDLE,
     QUEUE_WORKER_MAX_ATTEMPTS,
+    QUEUE_WORKER_BATCH_SIZE,
+    QUEUE_WORKER_CONCURRENCY,
+    QUEUE_WORKER_MAX_CONCURRENT_PER_SHEET,
+    QUEUE_COALESCE_OPERATIONS,
+    QUEUE_BATCH_APPEND_CREATES,
+    GSHEET_CATALOG_CACHE_PATH,
+    CACHE_SNAPSHOT_PATH,
+    CACHE_SNAPSHOT_SAVE_DEBOUNCE_SECONDS,
+    SHEET_BACKEND,
+    FAKE_SHEET_BACKEND_SEED_PATH,
+    FAKE_SHEET_BACKEND_LATENCY_SECONDS,
+    FAKE_SHEET_BACKEND_LATENCY_JITTER_SECONDS,
+    FAKE_SHEET_BACKEND_ERROR_RATE,
+    FAKE_SHEET_BACKEND_REQUESTS_PER_MINUTE,
+    METRICS_HTTP_ENABLED,
+    METRICS_HTTP_HOST,
+    METRICS_HTTP_PORT,
+    QUEUE_POST_WRITE_REFRESH_DEBOUNCE_SECONDS,
+    QUEUE_PENDING_OVERLAY,
+    BACKEND_REFRESH_POOL_SIZE,
+    BACKEND_WRITE_POOL_SIZE,
+    BACKEND_SHUTDOWN_TIMEOUT_SECONDS,
 )
 
 logger = logging.getLogger(__name__)
 
 
+class _ClaimConflict(Exception):
+    """Часть выбранных операций уже забрана другим воркером - транзакция выборки откатывается."""
+
+
 class AsyncSheetServiceWithQueue:
     def __init__(
         self,
         sheet_url: str,
         credentials_path: str,
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        change_probe: Optional[SheetChangeProbe] = None,
+        backend: Optional[SheetBackend] = None,
     ):
         self.sheet_url = sheet_url
         self.gsheet_credentials_path = os.path.abspath(credentials_path)
         self.loop = loop or asyncio.get_event_loop()
 
-        self._in_memory_cache: Dict[str, List[Dict[str, Any]]] = {}
-        self._in_memory_cache_last_updated: Dict[str, float] = {}
+        # Неизменяемые снимки кэша по листам. Читатели берут ссылку без блокировок,
+        # _cache_lock сериализует только писателей (refresh и оптимистичные записи)
+        self._cache_snapshots: Dict[str, SheetSnapshot] = {}
+        self._cache_last_refreshed_at: Dict[str, float] = {}
+        # Когда (UTC) к кэшу листа последний раз применялись скачанные строки
+        self._cache_last_fetch_applied_at: Dict[str, datetime.datetime] = {}
+        self._cache_change_listeners: List[Callable[[SheetChangeSet], None]] = []
         self._cache_lock = asyncio.Lock()
+        # Колоночное представление каталога товаров (строится лениво для текущего снимка листа)
+        self._columnar_catalog: Optional[ColumnarCatalog] = None
+        # Материализованные представления каталога: при чтении пересчитываются только категории
+        # строк, ключи которых пришли в наборах изменений листа после прошлого пересчета
+        self._catalog_views: Optional[CatalogViews] = None
+        self._catalog_views_pending_keys: set = set()
+        self._catalog_views_needs_rebuild = False
+        self._cache_change_listeners.append(self._on_catalog_sheet_change)
+        # Снимок кэша на диске для теплого старта. Листы, загруженные из него и еще
+        # не перепроверенные по GSheet, помечены устаревшими (alias -> когда строки были скачаны)
+        self._cache_snapshot_path = (
+            os.path.abspath(CACHE_SNAPSHOT_PATH) if CACHE_SNAPSHOT_PATH else None
+        )
+        self._cache_snapshot_save_debounce = CACHE_SNAPSHOT_SAVE_DEBOUNCE_SECONDS
+        self._cache_snapshot_save_task: Optional[asyncio.Task] = None
+        self._stale_cache_sheets: Dict[str, Optional[datetime.datetime]] = {}
 
         self._gsheet_refresh_interval = CACHE_REFRESH_INTERVAL_SECONDS
+        self._gsheet_refresh_jitter_ratio = CACHE_REFRESH_JITTER_RATIO
+        # Ограничивает число одновременных скачиваний листов (API-квота и пул потоков)
+        self._gsheet_fetch_semaphore = asyncio.Semaphore(
+            CACHE_REFRESH_MAX_CONCURRENT_FETCHES
+        )
+        self._gsheet_batch_fetch = CACHE_BATCH_FETCH
         self._queue_worker_interval = QUEUE_WORKER_INTERVAL_SECONDS
+        self._queue_worker_batch_size = max(1, QUEUE_WORKER_BATCH_SIZE)
+        self._queue_worker_retry_delay = QUEUE_WORKER_RETRY_DELAY_SECONDS
+        self._queue_worker_batch_window = QUEUE_WORKER_BATCH_WINDOW_SECONDS
+        # Параллельные группы операций: общий лимит и лимит на лист. Порядок операций
+        # одной строки (лист + PK) соблюдается через множество ключей строк в работе
+        self._queue_worker_concurrency = max(1, QUEUE_WORKER_CONCURRENCY)
+        self._queue_worker_max_per_sheet = 1  # Уточняется по бэкенду ниже
+        self._queue_worker_tasks: set = set()
+        self._queue_inflight_keys: Dict[str, set] = {}
+        self._queue_inflight_groups: Dict[str, int] = {}
+        self._queue_claim_lock = asyncio.Lock()
+        # create_row/update_rows/delete_rows будят воркер сразу после постановки в очередь
+        self._queue_wakeup_event = asyncio.Event()
+        self._queue_coalesce_operations = QUEUE_COALESCE_OPERATIONS
+        self._queue_batch_append_creates = QUEUE_BATCH_APPEND_CREATES
+        self._queue_coalescing_stats: Dict[str, int] = {
+            "claimed_operations": 0,
+            "remote_writes": 0,
+            "cancelled_operations": 0,
+            "remote_writes_saved": 0,
+        }
+        self._post_write_refresh_debounce = QUEUE_POST_WRITE_REFRESH_DEBOUNCE_SECONDS
+        self._post_write_refresh_tasks: Dict[str, asyncio.Task] = {}
+        self._post_write_refresh_stats: Dict[str, int] = {
+            "confirmed_groups": 0,
+            "refreshes_scheduled": 0,
+            "refreshes_avoided": 0,
+        }
+        # Неподтвержденные операции очереди, накладываемые на каждый скачанный снимок листа
+        self._pending_overlay: Optional[PendingOperationsOverlay] = (
+            PendingOperationsOverlay() if QUEUE_PENDING_OVERLAY else None
+        )
+
+        self.metrics = MetricsRegistry(namespace="sheet_service")
+        self._register_metrics()
+        # Свои пулы потоков для блокирующих вызовов бэкенда: чтение листов и записи очереди
+        self._blocking_pools: Dict[str, BlockingCallPool] = {
+            pool: self._create_blocking_pool(pool, size)
+            for pool, size in (
+                ("refresh", BACKEND_REFRESH_POOL_SIZE),
+                ("write", BACKEND_WRITE_POOL_SIZE),
+            )
+        }
+        self._blocking_shutdown_timeout = BACKEND_SHUTDOWN_TIMEOUT_SECONDS
+        self._metrics_http_server: Optional[MetricsHttpServer] = None
 
         self._gsheet_periodic_refresh_task: Optional[asyncio.Task] = None
         self._queue_processor_task: Optional[asyncio.Task] = None
         self._is_shutting_down = asyncio.Event()
         self._initial_gsheet_cache_populated = asyncio.Event()
 
-        if not os.path.exists(self.gsheet_credentials_path):
-            raise FileNotFoundError(
-                f"GSheet credentials file not found at: {self.gsheet_credentials_path}"
-            )
-
         self.spreadsheet_id = self._extract_spreadsheet_id_sync(sheet_url)
         if not self.spreadsheet_id:
             raise ValueError("Could not extract spreadsheet ID from URL.")
@@ -92,24 +237,49 @@ class AsyncSheetServiceWithQueue:
             "Рассылки": Mailing,
             "Пользователи": User,
         }
+        self.gsheet_pk_attributes: Dict[str, str] = {
+            alias: self._get_primary_key_attribute_sync(model_class)
+            for alias, model_class in self.gsheet_model_map.items()
+        }
+        # Индексируемые атрибуты: первичный ключ + вторичные индексы из конфига
+        self.gsheet_indexed_attributes: Dict[str, List[str]] = {
+            alias: self._resolve_indexed_attributes_sync(alias)
+            for alias in self.gsheet_model_map.keys()
+        }
+        self.gsheet_model_attributes: Dict[str, frozenset] = {
+            alias: frozenset(model_attribute_names(model_class))
+            for alias, model_class in self.gsheet_model_map.items()
+        }
+        # Приведение строк кэша к компактным классам моделей (None - строки хранятся как dict)
+        self.gsheet_row_factories: Dict[str, Optional[Callable[[Any], Any]]] = {
+            alias: compact_row_factory(model_class) if CACHE_COMPACT_ROWS else None
+            for alias, model_class in self.gsheet_model_map.items()
+        }
 
-        self.gsheet_catalog = self._build_gsheet_catalog_sync()
-        if not self.gsheet_catalog:
-            logger.warning(
-                "GSheet catalog is empty. Data fetching from GSheets might fail."
-            )
-        # Синхронный движок для Shillelagh (Google Sheets)
-        self.gsheet_db_engine = create_sync_engine(
-            "gsheets://",
-            service_account_file=self.gsheet_credentials_path,
-            catalog=self.gsheet_catalog,
-        )
-        self.GSheetSessionLocal = sessionmaker(
-            autocommit=False,
-            autoflush=False,
-            bind=self.gsheet_db_engine,
-            class_=SyncSqlAlchemySession,
-        )
+        # Источник данных листов: Google Sheets или локальный fake (SHEET_BACKEND в конфиге)
+        self.sheet_backend: SheetBackend = backend or self._create_sheet_backend_sync()
+        if self.sheet_backend.supports_concurrent_sheet_writes:
+            self._queue_worker_max_per_sheet = max(1, QUEUE_WORKER_MAX_CONCURRENT_PER_SHEET)
+
+        # Проба изменений перед плановым скачиванием листа (None - всегда скачивать)
+        if change_probe is None and CACHE_CHANGE_PROBE_ENABLED:
+            change_probe = self.sheet_backend.default_change_probe()
+        self.change_probe: Optional[SheetChangeProbe] = change_probe
+        self._sheet_revision_tokens: Dict[str, str] = {}
+        self._refresh_probe_stats: Dict[str, Dict[str, int]] = {
+            alias: {"probes": 0, "unchanged": 0, "changed": 0, "unknown": 0, "full_fetches": 0}
+            for alias in self.gsheet_model_map.keys()
+        }
+
+        # Каталог листов (title -> URL с gid) не запрашивается в конструкторе: берется из файла
+        # с прошлого запуска, а обнаружение/перепроверка идет асинхронно в start_services
+        self._gsheet_catalog_cache_path = os.path.abspath(GSHEET_CATALOG_CACHE_PATH)
+        self._gsheet_catalog_revalidation_task: Optional[asyncio.Task] = None
+        self._initial_cache_population_task: Optional[asyncio.Task] = None
+        self._extra_sheet_refresh_tasks: List[asyncio.Task] = []
+        self._scheduled_refresh_aliases: set = set()
+        self._startup_stats: Dict[str, Any] = {}
+        self._apply_gsheet_catalog_sync(self._load_persisted_gsheet_catalog_sync())
 
         # --- Асинхронный движок и фабрика сессий для SQLite ---
         self.sqlite_db_url = f"sqlite+aiosqlite:///{SQLITE_DB_PATH}"
@@ -119,6 +289,18 @@ class AsyncSheetServiceWithQueue:
         self.AsyncSqliteSessionLocal = sessionmaker(
             bind=self.sqlite_async_engine, class_=AsyncSession, expire_on_commit=False
         )
+        # Постановки в очередь идут через одного писателя с групповым коммитом (после start_services)
+        self._queue_writer: Optional[SqliteQueueWriter] = None
+        if SQLITE_QUEUE_TUNED_STORAGE:
+            configure_sqlite_queue_engine(
+                self.sqlite_async_engine,
+                journal_mode=SQLITE_QUEUE_JOURNAL_MODE,
+                synchronous=SQLITE_QUEUE_SYNCHRONOUS,
+            )
+            self._queue_writer = SqliteQueueWriter(
+                self.sqlite_async_engine,
+                max_batch_rows=SQLITE_QUEUE_WRITER_MAX_BATCH_ROWS,
+            )
 
         logger.info(
             "AsyncSheetServiceWithQueue initialized with async SQLite. Call 'await service.start_services()' to begin."
@@ -129,172 +311,377 @@ class AsyncSheetServiceWithQueue:
         async with self.sqlite_async_engine.begin() as conn:
             # await conn.run_sync(SqliteBase.metadata.drop_all) # Для тестов: удалить таблицы перед созданием
             await conn.run_sync(SqliteBase.metadata.create_all)
+            await conn.run_sync(ensure_queue_indexes)
         logger.info(
             f"Ensured SQLite tables (defined in SqliteBase) exist at {SQLITE_DB_PATH}."
         )
 
-    # === Синхронные хелперы для GSheet (остаются как есть, вызываются через to_thread) ===
-    # _extract_spreadsheet_id_sync, _build_gsheet_catalog_sync,
-    # _get_gsheet_model_by_alias_sync, _gsheet_row_to_dict_sync,
-    # _fetch_single_gsheet_data_blocking, _gsheet_create_row_blocking,
-    # _gsheet_update_rows_blocking, _gsheet_delete_rows_blocking
-    # ОНИ ОСТАЮТСЯ БЕЗ ИЗМЕНЕНИЙ, так как Shillelagh - синхронный драйвер
+    # === Синхронные хелперы для GSheet (вызываются в пулах _blocking_pools) ===
+    # Удаленный ввод-вывод - в self.sheet_backend (Shillelagh/gspread или локальный fake)
+    def _register_metrics(self):
+        metrics = self.metrics
+        self._metric_cache_reads = metrics.counter(
+            "cache_reads_total", "Cache reads by sheet and result (hit/miss).", ["sheet", "result"]
+        )
+        self._metric_cache_rows = metrics.gauge(
+            "cache_rows", "Rows in the current cache snapshot of a sheet.", ["sheet"]
+        )
+        self._metric_refresh_duration = metrics.histogram(
+            "refresh_duration_seconds", "Full sheet fetch and cache apply duration.", ["sheet"]
+        )
+        self._metric_refresh_batch_duration = metrics.histogram(
+            "refresh_batch_duration_seconds", "Duration of one batched fetch of several sheets."
+        )
+        self._metric_refresh_skipped = metrics.counter(
+            "refresh_skipped_total", "Refreshes skipped because the change probe saw no change.", ["sheet"]
+        )
+        self._metric_refresh_failures = metrics.counter(
+            "refresh_failures_total", "Sheet fetches that failed (cache kept as is).", ["sheet"]
+        )
+        self._metric_queue_operations = metrics.gauge(
+            "queue_operations", "Operations in the SQLite queue by status.", ["status"]
+        )
+        self._metric_queue_enqueued = metrics.counter(
+            "queue_enqueued_total", "Operations put into the SQLite queue.", ["sheet", "operation"]
+        )
+        self._metric_queue_outcomes = metrics.counter(
+            "queue_outcomes_total",
+            "Processed queue operations by outcome (committed/retry/failed).",
+            ["sheet", "operation", "outcome"],
+        )
+        self._metric_commit_latency = metrics.histogram(
+            "queue_commit_latency_seconds",
+            "Time from enqueue to confirmed write in the sheet.",
+            ["sheet", "operation"],
+        )
+        self._metric_overlay_operations = metrics.gauge(
+            "pending_overlay_operations",
+            "Queued operations re-applied on top of fetched sheet rows until the fetch sees them.",
+            ["sheet"],
+        )
+        self._metric_overlay_reapplied = metrics.counter(
+            "pending_overlay_reapplied_total",
+            "Fetched sheet snapshots that needed pending operations re-applied.",
+            ["sheet"],
+        )
+        self._metric_columnar_build = metrics.histogram(
+            "columnar_catalog_build_seconds", "Rebuild duration of the columnar product catalog."
+        )
+        self._metric_catalog_views_update = metrics.histogram(
+            "catalog_views_update_seconds", "Catalog views recompute duration.", ["mode"]
+        )
+        self._metric_threadpool_wait = metrics.histogram(
+            "threadpool_wait_seconds",
+            "Time a blocking call waited for a worker thread.",
+            ["pool"],
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+        )
+        self._metric_threadpool_queued = metrics.gauge(
+            "threadpool_queued_calls", "Blocking calls waiting for a thread of the pool.", ["pool"]
+        )
+        self._metric_threadpool_running = metrics.gauge(
+            "threadpool_running_calls", "Blocking calls running in the pool.", ["pool"]
+        )
+        self._metric_threadpool_abandoned = metrics.counter(
+            "threadpool_abandoned_calls_total",
+            "Blocking calls still running at the close() deadline and left behind.",
+            ["pool"],
+        )
+
+    def _create_blocking_pool(self, pool: str, size: int) -> BlockingCallPool:
+        def on_wait(seconds: float):
+            self._metric_threadpool_wait.observe(seconds, pool=pool)
+
+        def on_load(queued: int, running: int):
+            self._metric_threadpool_queued.set(queued, pool=pool)
+            self._metric_threadpool_running.set(running, pool=pool)
+
+        return BlockingCallPool(f"sheet-{pool}", size, on_wait=on_wait, on_load=on_load)
+
+    async def _run_blocking(self, pool: str, func: Callable[..., Any], *args) -> Any:
+        """Блокирующий вызов бэкенда в пуле pool ("refresh" - чтение листов, "write" - записи очереди).
+
+        Ожидание свободного потока - метрика threadpool_wait_seconds. Если ожидающую задачу
+        отменили до старта вызова, вызов не выполняется.
+        """
+        return await self._blocking_pools[pool].run(func, *args)
+
+    async def _close_blocking_pools(self):
+        """Отменяет вызовы в очереди пулов и ждет выполняющиеся до общего дедлайна, остальные бросает."""
+        deadline = time.monotonic() + self._blocking_shutdown_timeout
+        for pool, blocking_pool in self._blocking_pools.items():
+            abandoned = await blocking_pool.close(deadline - time.monotonic())
+            if abandoned:
+                self._metric_threadpool_abandoned.inc(abandoned, pool=pool)
+
+    async def _update_queue_status_gauges(self):
+        async with self.AsyncSqliteSessionLocal() as sqlite_session:
+            result = await sqlite_session.execute(
+                select(PendingSheetOperation.status, func.count()).group_by(
+                    PendingSheetOperation.status
+                )
+            )
+            counts = dict(result.all())
+        for status in (
+            "pending",
+            "processing",
+            "retry",
+            "failed_max_attempts",
+            "failed_worker_error",
+        ):
+            self._metric_queue_operations.set(counts.pop(status, 0), status=status)
+        for status, count in counts.items():
+            self._metric_queue_operations.set(count, status=status)
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Снимок метрик сервиса: {имя метрики: {"метка=значение,...": значение}}."""
+        await self._update_queue_status_gauges()
+        return self.metrics.as_dict()
+
+    async def render_prometheus_metrics(self) -> str:
+        """Метрики в текстовом формате Prometheus (его же отдает HTTP-эндпоинт /metrics)."""
+        await self._update_queue_status_gauges()
+        return self.metrics.render_prometheus()
+
+    def _create_sheet_backend_sync(self) -> SheetBackend:
+        if SHEET_BACKEND == "fake":
+            logger.info("Using local fake sheet backend (no network).")
+            return LocalFakeSheetBackend(
+                self.gsheet_model_map,
+                seed_rows=load_fake_seed_rows(FAKE_SHEET_BACKEND_SEED_PATH),
+                latency_seconds=FAKE_SHEET_BACKEND_LATENCY_SECONDS,
+                latency_jitter_seconds=FAKE_SHEET_BACKEND_LATENCY_JITTER_SECONDS,
+                error_rate=FAKE_SHEET_BACKEND_ERROR_RATE,
+                requests_per_minute=FAKE_SHEET_BACKEND_REQUESTS_PER_MINUTE,
+                batch_append_creates=self._queue_batch_append_creates,
+            )
+        if SHEET_BACKEND != "gsheets":
+            raise ValueError(f"Unknown SHEET_BACKEND '{SHEET_BACKEND}'.")
+        if not os.path.exists(self.gsheet_credentials_path):
+            raise FileNotFoundError(
+                f"GSheet credentials file not found at: {self.gsheet_credentials_path}"
+            )
+        return ShillelaghGSheetBackend(
+            self.spreadsheet_id,
+            self.gsheet_credentials_path,
+            self.gsheet_model_map,
+            batch_append_creates=self._queue_batch_append_creates,
+        )
+
     def _extract_spreadsheet_id_sync(self, url: str) -> Optional[str]:  # Same
         match = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", url)
         return match.group(1) if match else None
 
-    def _build_gsheet_catalog_sync(self) -> Dict[str, str]:  # Same
-        catalog = {}
-        try:
-            gspread_client = gspread.service_account(
-                filename=self.gsheet_credentials_path
-            )
-            spreadsheet = gspread_client.open_by_key(self.spreadsheet_id)
-            logger.info(f"(Sync) Building GSheet catalog for: {spreadsheet.title}")
-            found_titles = []
-            for worksheet in spreadsheet.worksheets():
-                title = worksheet.title
-                found_titles.append(title)
-                if title in self.expected_gsheet_titles:
-                    url = f"https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}/edit?headers=1#gid={worksheet.id}"
-                    catalog[title] = url
-                    logger.info(f"(Sync)  Added GSheet '{title}' to catalog: {url}")
-            for expected in self.expected_gsheet_titles:
-                if expected not in catalog:
-                    logger.warning(
-                        f"(Sync) Expected GSheet '{expected}' not in catalog. Found: {found_titles}"
-                    )
-        except Exception as e:
-            logger.error(f"(Sync) Error building GSheet catalog: {e}", exc_info=True)
-        return catalog
-
-    def _get_gsheet_model_by_alias_sync(
-        self, sheet_alias: str
-    ) -> Type[GSheetBase]:  # Same
-        model_class = self.gsheet_model_map.get(sheet_alias)
-        if not model_class:
-            raise ValueError(f"GSheet ORM model for alias '{sheet_alias}' not found.")
-        if sheet_alias not in self.gsheet_catalog:
-            raise ValueError(f"GSheet alias '{sheet_alias}' not in catalog.")
-        return model_class
-
-    def _gsheet_row_to_dict_sync(
-        self, row_object: GSheetBase, model_class: Type[GSheetBase]
-    ) -> Dict[str, Any]:  # Same
-        if row_object is None:
-            return {}
-        data_dict = {}
-        for col_attr in sqlalchemy_inspect(model_class).mapper.column_attrs:
-            data_dict[col_attr.key] = getattr(row_object, col_attr.key)
-        return data_dict
+    def _build_gsheet_catalog_sync(self) -> Dict[str, str]:
+        return self.sheet_backend.list_sheets_blocking(self.expected_gsheet_titles)
 
-    def _fetch_single_gsheet_data_blocking(
-        self, sheet_alias: str
-    ) -> List[Dict[str, Any]]:  # Same
-        logger.debug(f"(Sync) Fetching data from GSheet: {sheet_alias}")
-        model_class = self._get_gsheet_model_by_alias_sync(sheet_alias)
-        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+    def _load_persisted_gsheet_catalog_sync(self) -> Dict[str, str]:
+        """Каталог, сохраненный прошлым запуском для этой же таблицы (пустой, если его нет)."""
         try:
-            results = gsheet_session.query(model_class).all()
-            return [self._gsheet_row_to_dict_sync(row, model_class) for row in results]
+            with open(self._gsheet_catalog_cache_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return {}
         except Exception as e:
-            logger.error(
-                f"(Sync) Error fetching GSheet data for '{sheet_alias}': {e}",
-                exc_info=True,
+            logger.warning(
+                f"Could not read persisted GSheet catalog '{self._gsheet_catalog_cache_path}': {e}"
             )
-            return []
-        finally:
-            gsheet_session.close()
+            return {}
+        if stored.get("spreadsheet_id") != self.spreadsheet_id:
+            return {}
+        return dict(stored.get("catalog") or {})
 
-    def _gsheet_create_row_blocking(
-        self, sheet_alias: str, data_payload: dict
-    ) -> Optional[dict]:  # Same logic
-        model_class = self._get_gsheet_model_by_alias_sync(sheet_alias)
-        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
+    def _persist_gsheet_catalog_sync(self, catalog: Dict[str, str]):
+        tmp_path = f"{self._gsheet_catalog_cache_path}.tmp"
         try:
-            valid_data = {}
-            model_attrs = {
-                col.key for col in sqlalchemy_inspect(model_class).mapper.column_attrs
-            }
-            for key, value in data_payload.items():
-                if key in model_attrs:
-                    valid_data[key] = value
-            new_record = model_class(**valid_data)
-            gsheet_session.add(new_record)
-            gsheet_session.commit()
-            return_data = {}
-            for attr_name in model_attrs:
-                if attr_name in valid_data:
-                    return_data[attr_name] = valid_data[attr_name]
-                elif hasattr(new_record, attr_name):
-                    return_data[attr_name] = getattr(new_record, attr_name)
-            return return_data
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "spreadsheet_id": self.spreadsheet_id,
+                        "saved_at": datetime.datetime.utcnow().isoformat(),
+                        "catalog": catalog,
+                    },
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            os.replace(tmp_path, self._gsheet_catalog_cache_path)
         except Exception as e:
-            gsheet_session.rollback()
-            logger.error(
-                f"(Sync) GSheet create_row error '{sheet_alias}': {e}", exc_info=True
+            logger.warning(f"Could not persist GSheet catalog: {e}")
+
+    def _apply_gsheet_catalog_sync(self, catalog: Dict[str, str]):
+        """Подменяет каталог сервиса и бэкенда."""
+        self.gsheet_catalog = catalog
+        self.sheet_backend.apply_catalog(catalog)
+
+    async def _discover_gsheet_catalog(self) -> bool:
+        """Запрашивает каталог у Google, применяет и сохраняет его на диск, если он изменился.
+
+        Возвращает True, если каталог получен (иначе остается прежний).
+        """
+        catalog = await self._run_blocking("refresh", self._build_gsheet_catalog_sync)
+        if not catalog:
+            logger.warning("GSheet catalog discovery returned nothing; keeping the current catalog.")
+            return False
+        if catalog != self.gsheet_catalog:
+            added_aliases = [alias for alias in catalog if alias not in self.gsheet_catalog]
+            self._apply_gsheet_catalog_sync(catalog)
+            await asyncio.to_thread(self._persist_gsheet_catalog_sync, catalog)
+            logger.info(
+                f"GSheet catalog updated and persisted ({len(catalog)} sheets, new: {added_aliases})."
             )
-            return None
-        finally:
-            gsheet_session.close()
-
-    def _gsheet_update_rows_blocking(
-        self, sheet_alias: str, filter_criteria: dict, new_data: dict
-    ) -> int:  # Same logic
-        model_class = self._get_gsheet_model_by_alias_sync(sheet_alias)
-        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
-        updated_count = 0
+            return True
+        return True
+
+    async def _revalidate_gsheet_catalog_task(self):
+        """Фоновая перепроверка каталога, с которым сервис стартовал из файла."""
+        known_aliases = set(self.gsheet_catalog)
         try:
-            query = gsheet_session.query(model_class).filter_by(**filter_criteria)
-            records_to_update = query.all()
-            for record in records_to_update:
-                for key, value in new_data.items():
-                    if hasattr(record, key):
-                        setattr(record, key, value)
-                updated_count += 1
-            if updated_count > 0:
-                gsheet_session.commit()
-            return updated_count
+            await self._discover_gsheet_catalog()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            gsheet_session.rollback()
-            logger.error(
-                f"(Sync) GSheet update_rows error '{sheet_alias}': {e}", exc_info=True
-            )
-            return 0
-        finally:
-            gsheet_session.close()
-
-    def _gsheet_delete_rows_blocking(
-        self, sheet_alias: str, filter_criteria: dict
-    ) -> int:  # Same logic
-        model_class = self._get_gsheet_model_by_alias_sync(sheet_alias)
-        gsheet_session: SyncSqlAlchemySession = self.GSheetSessionLocal()
-        deleted_count = 0
+            logger.error(f"GSheet catalog revalidation failed: {e}", exc_info=True)
+            return
+        self._startup_stats["catalog_revalidated_seconds"] = round(
+            time.perf_counter() - self._startup_started_at, 3
+        )
+        # Листы, которых не было в сохраненном каталоге: скачиваем и обновляем по расписанию
+        await self._initial_gsheet_cache_populated.wait()
+        for alias in self.gsheet_model_map.keys():
+            if alias not in self.gsheet_catalog or alias in known_aliases:
+                continue
+            if alias not in self._cache_snapshots:
+                await self._populate_in_memory_cache_for_sheet(alias)
+            if alias not in self._scheduled_refresh_aliases:
+                self._scheduled_refresh_aliases.add(alias)
+                self._extra_sheet_refresh_tasks.append(
+                    asyncio.create_task(
+                        self._periodic_sheet_refresh_loop(
+                            alias, self._next_sheet_refresh_delay(alias)
+                        )
+                    )
+                )
+
+    async def _initial_cache_population(self):
+        """Первичная загрузка кэша в фоне; читатели ждут _initial_gsheet_cache_populated."""
         try:
-            records_to_delete = (
-                gsheet_session.query(model_class).filter_by(**filter_criteria).all()
-            )
-            for record in records_to_delete:
-                gsheet_session.delete(record)
-                deleted_count += 1
-            if deleted_count > 0:
-                gsheet_session.commit()
-            return deleted_count
+            if self.gsheet_catalog:
+                await self._populate_all_in_memory_caches()
+            else:
+                logger.warning(
+                    "GSheet catalog is empty. In-memory cache and GSheet interactions will be limited."
+                )
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            gsheet_session.rollback()
-            logger.error(
-                f"(Sync) GSheet delete_rows error '{sheet_alias}': {e}", exc_info=True
-            )
-            return 0
+            logger.error(f"Initial GSheet cache population failed: {e}", exc_info=True)
         finally:
-            gsheet_session.close()
+            # Не держим читателей вечно: при ошибке они получат пустой кэш, как раньше при пустом каталоге
+            self._initial_gsheet_cache_populated.set()
+        self._startup_stats["cache_ready_seconds"] = round(
+            time.perf_counter() - self._startup_started_at, 3
+        )
+        logger.info(
+            f"Startup ({self._startup_stats['mode']}): catalog ready in {self._startup_stats['catalog_ready_seconds']}s, "
+            f"cache ready in {self._startup_stats['cache_ready_seconds']}s."
+        )
+
+    def get_startup_stats(self) -> Dict[str, Any]:
+        """Время холодного/теплого старта: готовность каталога, кэша и перепроверки каталога (секунды от start_services)."""
+        return dict(self._startup_stats)
+
+    def _get_primary_key_attribute_sync(self, model_class: Type[GSheetBase]) -> str:
+        for col_attr in sqlalchemy_inspect(model_class).mapper.column_attrs:
+            if any(column.primary_key for column in col_attr.columns):
+                return col_attr.key
+        raise ValueError(f"GSheet ORM model '{model_class.__name__}' has no primary key.")
+
+    def _resolve_indexed_attributes_sync(self, sheet_alias: str) -> List[str]:
+        model_class = self.gsheet_model_map[sheet_alias]
+        model_attrs = {
+            col.key for col in sqlalchemy_inspect(model_class).mapper.column_attrs
+        }
+        indexed_attrs = [self.gsheet_pk_attributes[sheet_alias]]
+        for attr_name in CACHE_SECONDARY_INDEXES.get(sheet_alias, []):
+            if attr_name not in model_attrs:
+                logger.warning(
+                    f"Secondary index '{attr_name}' ignored: no such attribute in model for '{sheet_alias}'."
+                )
+            elif attr_name not in indexed_attrs:
+                indexed_attrs.append(attr_name)
+        return indexed_attrs
+
+    def _fetch_single_gsheet_data_blocking(
+        self, sheet_alias: str
+    ) -> Optional[List[Dict[str, Any]]]:  # None - лист не удалось скачать
+        if self._gsheet_batch_fetch and self.sheet_backend.supports_batch_fetch:
+            # Тот же запрос values и разбор ячеек, что у загрузки всех листов: иначе смена
+            # пути скачивания давала бы "измененные" строки из-за разного приведения типов
+            rows_by_alias = self._fetch_gsheets_data_batch_blocking([sheet_alias])
+            return None if rows_by_alias is None else rows_by_alias.get(sheet_alias)
+        return self.sheet_backend.fetch_rows_blocking(sheet_alias)
+
+    def _fetch_gsheets_data_batch_blocking(
+        self, sheet_aliases: List[str]
+    ) -> Optional[Dict[str, Optional[List[Dict[str, Any]]]]]:  # None - пакетный запрос не удался
+        return self.sheet_backend.fetch_sheets_rows_blocking(sheet_aliases)
+
+    def _gsheet_apply_operations_blocking(
+        self,
+        sheet_alias: str,
+        operations: List[Tuple[str, Optional[dict], Optional[dict]]],
+    ) -> List[Tuple[bool, Any]]:
+        """Применяет пачку операций (op_type, criteria, payload) к одному листу через бэкенд."""
+        return self.sheet_backend.apply_operations_blocking(sheet_alias, operations)
 
     # === Asynchronous In-Memory Cache Management (остается как есть) ===
     # _populate_in_memory_cache_for_sheet, _populate_all_in_memory_caches,
     # _periodic_gsheet_cache_refresh_task, force_gsheet_in_memory_cache_refresh
     # ОНИ ОСТАЮТСЯ БЕЗ ИЗМЕНЕНИЙ
-    async def _populate_in_memory_cache_for_sheet(self, sheet_alias: str):  # Same
-        logger.info(f"Populating in-memory cache for GSheet: {sheet_alias}")
+    async def _request_revision_token(self, sheet_alias: str) -> Optional[str]:
+        try:
+            return await self._run_blocking(
+                "refresh", self.change_probe.probe_revision_blocking, sheet_alias
+            )
+        except Exception as e:
+            logger.warning(f"Change probe '{self.change_probe.name}' failed for '{sheet_alias}': {e}")
+            return None
+
+    async def _probe_sheet_revision(self, sheet_alias: str) -> Optional[str]:
+        """Спрашивает токен ревизии листа и ведет статистику пробы. None - неизвестно."""
+        token = await self._request_revision_token(sheet_alias)
+        self._record_probe_result(sheet_alias, token)
+        return token
+
+    def _record_probe_result(self, sheet_alias: str, token: Optional[str]):
+        stats = self._refresh_probe_stats[sheet_alias]
+        stats["probes"] += 1
+        if token is None:
+            stats["unknown"] += 1
+        elif token == self._sheet_revision_tokens.get(sheet_alias):
+            stats["unchanged"] += 1
+        else:
+            stats["changed"] += 1
+
+    def get_refresh_probe_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика пробы изменений по листам: результаты проб и доля пропущенных скачиваний."""
+        return {
+            alias: {
+                **stats,
+                "skip_rate": stats["unchanged"] / stats["probes"] if stats["probes"] else 0.0,
+            }
+            for alias, stats in self._refresh_probe_stats.items()
+        }
+
+    async def _populate_in_memory_cache_for_sheet(
+        self, sheet_alias: str, force: bool = False
+    ):
+        """Скачивает лист и применяет изменения к кэшу.
+
+        Без force сначала спрашивается проба изменений: если ревизия листа не
+        изменилась с прошлого скачивания, полное скачивание пропускается.
+        """
         if (
             sheet_alias not in self.gsheet_model_map
             or sheet_alias not in self.gsheet_catalog
@@ -303,45 +690,305 @@ class AsyncSheetServiceWithQueue:
                 f"GSheet alias '{sheet_alias}' invalid or not in catalog. Skipping cache population."
             )
             return
-        data = await asyncio.to_thread(
-            self._fetch_single_gsheet_data_blocking, sheet_alias
+        skip_fetch, revision_token = await self._probe_before_fetch(sheet_alias, force)
+        if skip_fetch:
+            return
+        await self._fetch_and_apply_sheet(sheet_alias, revision_token)
+
+    async def _probe_before_fetch(
+        self, sheet_alias: str, force: bool
+    ) -> Tuple[bool, Optional[str]]:
+        """Проба изменений перед скачиванием листа: (можно не скачивать, токен ревизии)."""
+        if self.change_probe is None:
+            return False, None
+        revision_token = await self._probe_sheet_revision(sheet_alias)
+        return self._check_revision_token(sheet_alias, revision_token, force)
+
+    def _check_revision_token(
+        self, sheet_alias: str, revision_token: Optional[str], force: bool
+    ) -> Tuple[bool, Optional[str]]:
+        """(можно не скачивать, токен ревизии): лист не скачивается, если токен не изменился."""
+        if (
+            not force
+            and sheet_alias in self._cache_snapshots
+            and revision_token is not None
+            and revision_token == self._sheet_revision_tokens.get(sheet_alias)
+        ):
+            self._cache_last_refreshed_at[sheet_alias] = time.monotonic()
+            self._stale_cache_sheets.pop(sheet_alias, None)
+            self._metric_refresh_skipped.inc(sheet=sheet_alias)
+            logger.debug(
+                f"GSheet '{sheet_alias}' unchanged (revision {revision_token}), full fetch skipped."
+            )
+            return True, revision_token
+        return False, revision_token
+
+    async def _fetch_and_apply_sheet(self, sheet_alias: str, revision_token: Optional[str]):
+        logger.info(f"Populating in-memory cache for GSheet: {sheet_alias}")
+        refresh_started = time.perf_counter()
+        async with self._gsheet_fetch_semaphore:
+            fetch_started_at = time.monotonic()
+            data = await self._run_blocking(
+                "refresh", self._fetch_single_gsheet_data_blocking, sheet_alias
+            )
+        await self._apply_fetched_sheet(
+            sheet_alias, data, revision_token, fetch_started_at, refresh_started
         )
+
+    async def _apply_fetched_sheet(
+        self,
+        sheet_alias: str,
+        data: Optional[List[Dict[str, Any]]],
+        revision_token: Optional[str],
+        fetch_started_at: float,
+        refresh_started: float,
+    ):
+        """Применяет скачанные строки листа к кэшу (None - лист не скачан, кэш остается как есть)."""
+        self._refresh_probe_stats[sheet_alias]["full_fetches"] += 1
+        if data is None:
+            self._metric_refresh_failures.inc(sheet=sheet_alias)
+            # Пустой список здесь означал бы "все строки удалены" - оставляем кэш как есть
+            logger.warning(
+                f"GSheet '{sheet_alias}' could not be fetched; keeping cached rows"
+                + (" (stale)." if sheet_alias in self._stale_cache_sheets else ".")
+            )
+            return
+        if revision_token is not None:
+            # Токен снят до скачивания: если лист поменялся во время скачивания, следующая проба это увидит
+            self._sheet_revision_tokens[sheet_alias] = revision_token
         async with self._cache_lock:
-            self._in_memory_cache[sheet_alias] = data
-            self._in_memory_cache_last_updated[sheet_alias] = time.monotonic()
+            change_set = self._apply_fetched_rows(sheet_alias, data, fetch_started_at)
+        self._metric_refresh_duration.observe(
+            time.perf_counter() - refresh_started, sheet=sheet_alias
+        )
         logger.info(
-            f"In-memory cache populated for GSheet '{sheet_alias}', {len(data)} rows."
+            f"In-memory cache populated for GSheet '{sheet_alias}', {len(data)} rows. "
+            f"Changes: +{len(change_set.added_keys)} ~{len(change_set.changed_keys)} -{len(change_set.removed_keys)} "
+            f"(version {change_set.version})."
         )
+        self._schedule_cache_snapshot_save()
 
-    async def _populate_all_in_memory_caches(self):  # Same
+    async def _populate_all_in_memory_caches(self, force: bool = False):
         logger.info("Populating all in-memory caches from GSheets...")
-        tasks = [
-            self._populate_in_memory_cache_for_sheet(alias)
-            for alias in self.gsheet_model_map.keys()
-            if alias in self.gsheet_catalog
+        aliases = [
+            alias for alias in self.gsheet_model_map.keys() if alias in self.gsheet_catalog
         ]
-        await asyncio.gather(*tasks)
+        if self._gsheet_batch_fetch and self.sheet_backend.supports_batch_fetch and len(aliases) > 1:
+            await self._populate_caches_batched(aliases, force)
+        else:
+            await asyncio.gather(
+                *(self._populate_in_memory_cache_for_sheet(alias, force=force) for alias in aliases)
+            )
         self._initial_gsheet_cache_populated.set()
         logger.info("Initial GSheet in-memory cache population complete.")
 
-    async def _periodic_gsheet_cache_refresh_task(self):  # Same
-        await self._initial_gsheet_cache_populated.wait()
-        logger.info("Starting periodic GSheet in-memory cache refresh task.")
+    async def _populate_caches_batched(self, aliases: List[str], force: bool = False):
+        """Скачивает листы, которые изменились по пробе, одним пакетным запросом бэкенда.
+
+        Если пакетный запрос не удался целиком, листы скачиваются по одному.
+        Ревизия всей таблицы (spreadsheet_wide) спрашивается один раз на все листы.
+        """
+        if self.change_probe is not None and self.change_probe.spreadsheet_wide:
+            shared_token = await self._request_revision_token(aliases[0])
+            probes = []
+            for alias in aliases:
+                self._record_probe_result(alias, shared_token)
+                probes.append(self._check_revision_token(alias, shared_token, force))
+        else:
+            probes = await asyncio.gather(
+                *(self._probe_before_fetch(alias, force) for alias in aliases)
+            )
+        revision_tokens = {
+            alias: revision_token
+            for alias, (skip_fetch, revision_token) in zip(aliases, probes)
+            if not skip_fetch
+        }
+        if not revision_tokens:
+            return
+        fetch_aliases = list(revision_tokens)
+        logger.info(f"Populating in-memory cache for GSheets in one batch: {fetch_aliases}")
+        refresh_started = time.perf_counter()
+        async with self._gsheet_fetch_semaphore:
+            fetch_started_at = time.monotonic()
+            rows_by_alias = await self._run_blocking(
+                "refresh", self._fetch_gsheets_data_batch_blocking, fetch_aliases
+            )
+        if rows_by_alias is None:
+            logger.warning("Batched GSheet fetch failed, fetching sheets one by one.")
+            await asyncio.gather(
+                *(self._fetch_and_apply_sheet(alias, revision_tokens[alias]) for alias in fetch_aliases)
+            )
+            return
+        self._metric_refresh_batch_duration.observe(time.perf_counter() - refresh_started)
+        for alias in fetch_aliases:
+            await self._apply_fetched_sheet(
+                alias, rows_by_alias.get(alias), revision_tokens[alias], fetch_started_at, refresh_started
+            )
+
+    async def _load_cache_snapshot(self) -> int:
+        """Публикует в кэш листы из снимка на диске (помечая их устаревшими). Возвращает число листов."""
+        if not self._cache_snapshot_path:
+            return 0
+        persisted = await asyncio.to_thread(
+            read_cache_snapshot_file, self._cache_snapshot_path, self.spreadsheet_id
+        )
+        loaded = 0
+        async with self._cache_lock:
+            for sheet_alias, sheet in persisted.items():
+                if (
+                    sheet_alias not in self.gsheet_model_map
+                    or sheet_alias not in self.gsheet_catalog
+                    or sheet_alias in self._cache_snapshots
+                ):
+                    continue
+                snapshot = SheetSnapshot.build(
+                    sheet_alias,
+                    # Снимок мог сохраниться раньше последних записей очереди
+                    self._overlay_fetched_rows(sheet_alias, sheet.rows),
+                    self.gsheet_indexed_attributes.get(sheet_alias, []),
+                    version=sheet.version,
+                    row_factory=self.gsheet_row_factories.get(sheet_alias),
+                )
+                pk_attr = self.gsheet_pk_attributes[sheet_alias]
+                if sheet.fetched_at is not None:
+                    self._cache_last_fetch_applied_at[sheet_alias] = sheet.fetched_at
+                if sheet.revision_token is not None and self._revision_tokens_survive_restart():
+                    # С тем же токеном проба изменений позволит перепроверить лист без полного скачивания
+                    self._sheet_revision_tokens[sheet_alias] = sheet.revision_token
+                self._stale_cache_sheets[sheet_alias] = sheet.fetched_at
+                self._publish_snapshot(
+                    snapshot,
+                    SheetChangeSet(
+                        sheet_alias,
+                        snapshot.version,
+                        added_keys=(row.get(pk_attr) for row in snapshot.rows),
+                        source="snapshot",
+                    ),
+                )
+                loaded += 1
+        if loaded:
+            logger.info(
+                f"Loaded {loaded} sheet(s) from cache snapshot '{self._cache_snapshot_path}' (stale until revalidated)."
+            )
+        return loaded
+
+    def _revision_tokens_survive_restart(self) -> bool:
+        return self.change_probe is not None and self.change_probe.tokens_survive_restart
+
+    def _collect_persisted_sheets(self) -> Dict[str, PersistedSheet]:
+        # Снимки неизменяемы: достаточно ссылок на строки, сериализация идет в потоке.
+        # Токен ревизии сохраняется, только если он будет значить то же самое в следующем процессе
+        persist_tokens = self._revision_tokens_survive_restart()
+        return {
+            sheet_alias: PersistedSheet(
+                snapshot.rows,
+                snapshot.version,
+                self._cache_last_fetch_applied_at.get(sheet_alias),
+                self._sheet_revision_tokens.get(sheet_alias) if persist_tokens else None,
+            )
+            for sheet_alias, snapshot in self._cache_snapshots.items()
+        }
+
+    async def _save_cache_snapshot(self):
+        if not self._cache_snapshot_path or not self._cache_snapshots:
+            return
+        sheets = self._collect_persisted_sheets()
+        try:
+            await asyncio.to_thread(
+                write_cache_snapshot_file,
+                self._cache_snapshot_path,
+                self.spreadsheet_id,
+                sheets,
+            )
+            logger.debug(f"Cache snapshot saved ({len(sheets)} sheet(s)).")
+        except Exception as e:
+            logger.error(f"Failed to save cache snapshot: {e}", exc_info=True)
+
+    async def _delayed_cache_snapshot_save(self):
+        await asyncio.sleep(self._cache_snapshot_save_debounce)
+        self._cache_snapshot_save_task = None
+        await self._save_cache_snapshot()
+
+    def _schedule_cache_snapshot_save(self):
+        """Сохранение снимка после refresh; refresh нескольких листов подряд дает одну запись файла."""
+        if not self._cache_snapshot_path or self._is_shutting_down.is_set():
+            return
+        if self._cache_snapshot_save_task is not None and not self._cache_snapshot_save_task.done():
+            return
+        self._cache_snapshot_save_task = asyncio.create_task(
+            self._delayed_cache_snapshot_save()
+        )
+
+    def is_cache_stale(self, sheet_alias: str) -> bool:
+        """True, если строки листа загружены из снимка на диске и еще не перепроверены по GSheet."""
+        return sheet_alias in self._stale_cache_sheets
+
+    def get_cache_staleness(self) -> Dict[str, Dict[str, Any]]:
+        """По листам кэша: устарел ли он и когда (UTC) строки были скачаны из GSheet."""
+        now = datetime.datetime.utcnow()
+        staleness = {}
+        for sheet_alias in self._cache_snapshots:
+            fetched_at = self._cache_last_fetch_applied_at.get(sheet_alias)
+            staleness[sheet_alias] = {
+                "stale": sheet_alias in self._stale_cache_sheets,
+                "fetched_at": fetched_at.isoformat() if fetched_at else None,
+                "age_seconds": (now - fetched_at).total_seconds() if fetched_at else None,
+            }
+        return staleness
+
+    def _get_sheet_refresh_interval(self, sheet_alias: str) -> float:
+        return SHEET_REFRESH_INTERVALS_SECONDS.get(
+            sheet_alias, self._gsheet_refresh_interval
+        )
+
+    def _next_sheet_refresh_delay(self, sheet_alias: str) -> float:
+        """Интервал листа со случайным отклонением, чтобы обновления не синхронизировались."""
+        interval = self._get_sheet_refresh_interval(sheet_alias)
+        jitter = interval * self._gsheet_refresh_jitter_ratio
+        return max(1.0, interval + random.uniform(-jitter, jitter))
+
+    async def _periodic_sheet_refresh_loop(self, sheet_alias: str, start_offset: float):
+        await asyncio.sleep(start_offset)
         while not self._is_shutting_down.is_set():
             try:
-                await asyncio.sleep(self._gsheet_refresh_interval)
-                if self._is_shutting_down.is_set():
-                    break
-                logger.info("Periodic GSheet in-memory cache refresh triggered.")
-                await self._populate_all_in_memory_caches()
+                logger.info(f"Periodic GSheet cache refresh triggered for '{sheet_alias}'.")
+                await self._populate_in_memory_cache_for_sheet(sheet_alias)
             except asyncio.CancelledError:
-                logger.info("Periodic GSheet cache refresh task cancelled.")
-                break
+                raise
             except Exception as e:
                 logger.error(
-                    f"Error in periodic GSheet cache refresh: {e}", exc_info=True
+                    f"Error in periodic GSheet cache refresh for '{sheet_alias}': {e}",
+                    exc_info=True,
                 )
-                await asyncio.sleep(60)
+            await asyncio.sleep(self._next_sheet_refresh_delay(sheet_alias))
+
+    async def _periodic_gsheet_cache_refresh_task(self):
+        """Планировщик: у каждого листа свой интервал, первые запуски разнесены по времени."""
+        await self._initial_gsheet_cache_populated.wait()
+        aliases = [
+            alias for alias in self.gsheet_model_map.keys() if alias in self.gsheet_catalog
+        ]
+        self._scheduled_refresh_aliases.update(aliases)
+        logger.info(
+            "Starting periodic GSheet in-memory cache refresh task. Intervals: "
+            + ", ".join(
+                f"'{alias}'={self._get_sheet_refresh_interval(alias)}s" for alias in aliases
+            )
+        )
+        loops = [
+            self._periodic_sheet_refresh_loop(
+                alias,
+                # Сдвиг старта: листы равномерно распределены внутри своего интервала
+                start_offset=self._get_sheet_refresh_interval(alias)
+                * (position + 1)
+                / len(aliases),
+            )
+            for position, alias in enumerate(aliases)
+        ]
+        try:
+            await asyncio.gather(*loops)
+        except asyncio.CancelledError:
+            logger.info("Periodic GSheet cache refresh task cancelled.")
 
     async def force_gsheet_in_memory_cache_refresh(
         self, sheet_alias: Optional[str] = None
@@ -355,71 +1002,307 @@ class AsyncSheetServiceWithQueue:
                     f"Cannot refresh GSheet cache for '{sheet_alias}': invalid or not in catalog."
                 )
                 return
-            await self._populate_in_memory_cache_for_sheet(sheet_alias)
+            await self._populate_in_memory_cache_for_sheet(sheet_alias, force=True)
         else:
-            await self._populate_all_in_memory_caches()
+            await self._populate_all_in_memory_caches(force=True)
 
-    # === Asynchronous Read Operations (from In-Memory Cache - остается как есть) ===
-    # get_data_from_cache, read_rows_from_cache
-    # ОНИ ОСТАЮТСЯ БЕЗ ИЗМЕНЕНИЙ
-    async def get_data_from_cache(
-        self, sheet_alias: str
-    ) -> List[Dict[str, Any]]:  # Same
+    def _apply_fetched_rows(
+        self,
+        sheet_alias: str,
+        rows: List[Dict[str, Any]],
+        fetch_started_at: Optional[float] = None,
+    ) -> SheetChangeSet:
+        """Применяет к снимку только разницу со свежими строками листа (под _cache_lock).
+
+        Поверх строк накладываются операции очереди, которых скачивание, начатое в
+        fetch_started_at (time.monotonic), еще не видит.
+        """
+        previous = self._cache_snapshots.get(sheet_alias)
+        pk_attr = self.gsheet_pk_attributes[sheet_alias]
+        rows = self._overlay_fetched_rows(sheet_alias, rows, fetch_started_at)
+        self._cache_last_refreshed_at[sheet_alias] = time.monotonic()
+        self._cache_last_fetch_applied_at[sheet_alias] = datetime.datetime.utcnow()
+        self._stale_cache_sheets.pop(sheet_alias, None)
+        if previous is None:
+            snapshot = SheetSnapshot.build(
+                sheet_alias,
+                rows,
+                self.gsheet_indexed_attributes.get(sheet_alias, []),
+                version=1,
+                row_factory=self.gsheet_row_factories.get(sheet_alias),
+            )
+            change_set = SheetChangeSet(
+                sheet_alias,
+                snapshot.version,
+                added_keys=(row.get(pk_attr) for row in snapshot.rows),
+            )
+        else:
+            snapshot, change_set = previous.diff(rows, pk_attr)
+        self._publish_snapshot(snapshot, change_set)
+        return change_set
+
+    def _overlay_fetched_rows(
+        self,
+        sheet_alias: str,
+        rows: Sequence[Dict[str, Any]],
+        fetch_started_at: Optional[float] = None,
+    ) -> Sequence[Dict[str, Any]]:
+        overlay = self._pending_overlay
+        if overlay is None:
+            return rows
+        if fetch_started_at is not None:
+            overlay.prune_seen(sheet_alias, fetch_started_at)
+        self._update_overlay_gauge(sheet_alias)
+        if not overlay.has_operations(sheet_alias):
+            return rows
+        self._metric_overlay_reapplied.inc(sheet=sheet_alias)
+        return overlay.apply(sheet_alias, rows, self.gsheet_pk_attributes[sheet_alias])
+
+    def _update_overlay_gauge(self, sheet_alias: str):
+        if self._pending_overlay is not None:
+            self._metric_overlay_operations.set(
+                len(self._pending_overlay.operations(sheet_alias)), sheet=sheet_alias
+            )
+
+    async def _restore_pending_overlay(self) -> int:
+        """Восстанавливает слой неподтвержденных операций из очереди SQLite (на старте, до загрузки кэша)."""
+        if self._pending_overlay is None:
+            return 0
+        async with self.AsyncSqliteSessionLocal() as sqlite_session:
+            result = await sqlite_session.execute(
+                select(PendingSheetOperation)
+                .where(PendingSheetOperation.status.in_(READY_STATUSES + ("processing",)))
+                .order_by(PendingSheetOperation.id)
+            )
+            operations = list(result.scalars())
+        self._pending_overlay.clear()
+        for operation in operations:
+            if operation.sheet_alias in self.gsheet_model_map:
+                self._pending_overlay.add(operation.sheet_alias, OverlayOperation.from_pending(operation))
+        for sheet_alias in self.gsheet_model_map:
+            self._update_overlay_gauge(sheet_alias)
+        if operations:
+            logger.info(f"Restored {len(self._pending_overlay)} pending operation(s) into the cache overlay.")
+        return len(self._pending_overlay)
+
+    def _register_overlay_operations(
+        self, sheet_alias: str, operation_type: str, items: List[Any], op_ids: Sequence[int]
+    ):
+        """Добавляет в слой только что поставленные в очередь операции (items - как у оптимистичной записи)."""
+        if self._pending_overlay is None:
+            return
+        for op_id, item in zip(op_ids, items):
+            if operation_type == "CREATE":
+                criteria, payload = None, item
+            elif operation_type == "UPDATE":
+                criteria, payload = item
+            else:
+                criteria, payload = item, None
+            self._pending_overlay.add(
+                sheet_alias, OverlayOperation(op_id, operation_type, criteria, payload)
+            )
+        self._update_overlay_gauge(sheet_alias)
+
+    def _publish_snapshot(self, snapshot: SheetSnapshot, change_set: SheetChangeSet):
+        """Атомарно подменяет снимок листа и уведомляет подписчиков о непустом наборе изменений."""
+        if change_set.is_empty():
+            # Первый снимок пустого листа тоже публикуем: лист загружен, просто в нем нет строк
+            if snapshot.sheet_alias not in self._cache_snapshots:
+                self._cache_snapshots[snapshot.sheet_alias] = snapshot
+                self._metric_cache_rows.set(len(snapshot.rows), sheet=snapshot.sheet_alias)
+            return
+        self._cache_snapshots[snapshot.sheet_alias] = snapshot
+        self._metric_cache_rows.set(len(snapshot.rows), sheet=snapshot.sheet_alias)
+        for listener in list(self._cache_change_listeners):
+            try:
+                listener(change_set)
+            except Exception as e:
+                logger.error(
+                    f"Cache change listener failed for '{snapshot.sheet_alias}': {e}",
+                    exc_info=True,
+                )
+
+    def add_cache_change_listener(self, listener: Callable[[SheetChangeSet], None]):
+        """Подписка на изменения кэша (refresh и оптимистичные записи). Вызывается синхронно."""
+        self._cache_change_listeners.append(listener)
+
+    def remove_cache_change_listener(
+        self, listener: Callable[[SheetChangeSet], None]
+    ):
+        if listener in self._cache_change_listeners:
+            self._cache_change_listeners.remove(listener)
+
+    # === Asynchronous Read Operations (from In-Memory Cache, lock-free snapshots) ===
+    # get_cache_snapshot, get_data_from_cache, read_rows_from_cache
+    async def get_cache_snapshot(self, sheet_alias: str) -> Optional[SheetSnapshot]:
+        """Текущий неизменяемый снимок листа (без копирования и блокировок)."""
         await self._initial_gsheet_cache_populated.wait()
         if (
             sheet_alias not in self.gsheet_model_map
             or sheet_alias not in self.gsheet_catalog
         ):
             logger.warning(f"'{sheet_alias}' not configured or found for cache read.")
-            if (
-                sheet_alias not in self._in_memory_cache
-                and sheet_alias in self.gsheet_model_map
-                and sheet_alias in self.gsheet_catalog
-            ):
-                logger.info(
-                    f"Cache miss for {sheet_alias} after init, attempting one-time GSheet population."
-                )
-                await self._populate_in_memory_cache_for_sheet(sheet_alias)
-        async with self._cache_lock:
-            return list(self._in_memory_cache.get(sheet_alias, []))
+            return None
+        snapshot = self._cache_snapshots.get(sheet_alias)
+        self._metric_cache_reads.inc(
+            sheet=sheet_alias, result="hit" if snapshot is not None else "miss"
+        )
+        if snapshot is None:
+            logger.info(
+                f"Cache miss for {sheet_alias} after init, attempting one-time GSheet population."
+            )
+            await self._populate_in_memory_cache_for_sheet(sheet_alias)
+            snapshot = self._cache_snapshots.get(sheet_alias)
+        return snapshot
+
+    async def get_data_from_cache(
+        self, sheet_alias: str
+    ) -> Tuple[Dict[str, Any], ...]:
+        """Строки листа из текущего снимка. Кортеж и словари строк нельзя изменять."""
+        snapshot = await self.get_cache_snapshot(sheet_alias)
+        return snapshot.rows if snapshot else ()
+
+    def _compile_cache_query(
+        self,
+        sheet_alias: str,
+        filter_criteria: Optional[Dict[str, Any]],
+        order_by_attributes: Optional[Sequence[Union[str, SortKey]]],
+        row_limit: Optional[int],
+        row_offset: Optional[int],
+    ) -> CacheQuery:
+        model_attrs = self.gsheet_model_attributes.get(sheet_alias, ())
+        sort_keys = []
+        for spec in order_by_attributes or []:
+            sort_key = SortKey.parse(spec)
+            if sort_key.attr not in model_attrs:
+                logger.warning(f"Sort key '{sort_key.attr}' not in cached '{sheet_alias}'")
+                continue
+            sort_keys.append(sort_key)
+        return CacheQuery(filter_criteria, sort_keys, row_limit, row_offset)
 
-    async def read_rows_from_cache(  # Same logic
+    async def read_rows_from_cache(
         self,
         sheet_alias: str,
         filter_criteria: Optional[Dict[str, Any]] = None,
-        order_by_attributes: Optional[List[str]] = None,
+        order_by_attributes: Optional[List[Union[str, SortKey]]] = None,
         row_limit: Optional[int] = None,
         row_offset: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
-        sheet_data = await self.get_data_from_cache(sheet_alias)
-        if not sheet_data:
+        """Строки листа по фильтру, с сортировкой и пагинацией (см. CacheQuery).
+
+        filter_criteria: {атрибут: значение} - равенство, или {атрибут: Range/InSet/Prefix/Contains/NotNull}.
+        order_by_attributes: "attr" / "-attr" или SortKey (пустые значения - в конце, если не задано иное).
+        """
+        snapshot = await self.get_cache_snapshot(sheet_alias)
+        if not snapshot:
             return []
-        if filter_criteria:
-            sheet_data = [
-                row
-                for row in sheet_data
-                if all(row.get(k) == v for k, v in filter_criteria.items())
-            ]
-        if order_by_attributes:
-            for attr_name in reversed(order_by_attributes):
-                is_desc = attr_name.startswith("-")
-                attr_actual = attr_name[1:] if is_desc else attr_name
-                if sheet_data and attr_actual not in sheet_data[0]:
-                    logger.warning(
-                        f"Sort key '{attr_actual}' not in cached '{sheet_alias}'"
-                    )
-                    continue
-                try:
-                    sheet_data.sort(key=lambda x: x.get(attr_actual), reverse=is_desc)
-                except TypeError:
-                    logger.warning(
-                        f"TypeError sorting '{sheet_alias}' by '{attr_actual}'."
-                    )
-        if row_offset:
-            sheet_data = sheet_data[row_offset:]
-        if row_limit:
-            sheet_data = sheet_data[:row_limit]
-        return sheet_data
+        query = self._compile_cache_query(
+            sheet_alias, filter_criteria, order_by_attributes, row_limit, row_offset
+        )
+        return query.execute(snapshot)
+
+    async def explain_read(
+        self,
+        sheet_alias: str,
+        filter_criteria: Optional[Dict[str, Any]] = None,
+        order_by_attributes: Optional[List[Union[str, SortKey]]] = None,
+        row_limit: Optional[int] = None,
+        row_offset: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Как read_rows_from_cache, но возвращает описание выполнения: индекс или перебор, сколько строк просмотрено."""
+        snapshot = await self.get_cache_snapshot(sheet_alias)
+        if not snapshot:
+            return None
+        query = self._compile_cache_query(
+            sheet_alias, filter_criteria, order_by_attributes, row_limit, row_offset
+        )
+        return query.explain(snapshot)
+
+    async def get_columnar_catalog(self) -> Optional[ColumnarCatalog]:
+        """Колоночное представление листа каталога для текущего снимка (перестраивается после изменений листа)."""
+        snapshot = await self.get_cache_snapshot(CATALOG_SHEET_ALIAS)
+        if snapshot is None:
+            return None
+        catalog = self._columnar_catalog
+        if catalog is None or not catalog.matches(snapshot):
+            started = time.perf_counter()
+            catalog = ColumnarCatalog(snapshot)
+            self._metric_columnar_build.observe(time.perf_counter() - started)
+            self._columnar_catalog = catalog
+            logger.debug(
+                f"Columnar catalog rebuilt for '{CATALOG_SHEET_ALIAS}' v{snapshot.version}: {len(catalog)} rows."
+            )
+        return catalog
+
+    async def query_catalog(
+        self,
+        category: Any = None,
+        status: Any = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_quantity: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+        order_by: Sequence[str] = ("name",),
+    ) -> CatalogQueryResult:
+        """Векторный запрос к каталогу товаров: фильтр, сортировка и страницы (см. ColumnarCatalog.query)."""
+        catalog = await self.get_columnar_catalog()
+        if catalog is None:
+            return CatalogQueryResult.empty()
+        return catalog.query(
+            category=category,
+            status=status,
+            min_price=min_price,
+            max_price=max_price,
+            min_quantity=min_quantity,
+            in_stock=in_stock,
+            order_by=order_by,
+        )
+
+    async def get_catalog_categories(self) -> List[Any]:
+        """Отсортированный список непустых категорий товаров."""
+        catalog = await self.get_columnar_catalog()
+        return catalog.category_list() if catalog is not None else []
+
+    def _on_catalog_sheet_change(self, change_set: SheetChangeSet):
+        if change_set.sheet_alias != CATALOG_SHEET_ALIAS:
+            return
+        if change_set.source == "snapshot":
+            self._catalog_views_needs_rebuild = True
+            return
+        self._catalog_views_pending_keys.update(change_set.added_keys)
+        self._catalog_views_pending_keys.update(change_set.changed_keys)
+        self._catalog_views_pending_keys.update(change_set.removed_keys)
+
+    async def get_catalog_views(self) -> Optional[CatalogViews]:
+        """Материализованные представления каталога (категории, товары категорий, число страниц) для текущего снимка."""
+        snapshot = await self.get_cache_snapshot(CATALOG_SHEET_ALIAS)
+        if snapshot is None:
+            return None
+        views = self._catalog_views
+        needs_rebuild = views is None or self._catalog_views_needs_rebuild
+        if not needs_rebuild and views.snapshot_version == snapshot.version:
+            return views
+        started = time.perf_counter()
+        updated = None
+        if not needs_rebuild:
+            updated = views.updated(snapshot, self._catalog_views_pending_keys)
+        mode = "incremental"
+        if updated is None:
+            mode = "full"
+            updated = CatalogViews.build(
+                snapshot,
+                self.gsheet_pk_attributes[CATALOG_SHEET_ALIAS],
+                version=views.version + 1 if views is not None else 1,
+            )
+        self._catalog_views = updated
+        self._catalog_views_pending_keys.clear()
+        self._catalog_views_needs_rebuild = False
+        self._metric_catalog_views_update.observe(time.perf_counter() - started, mode=mode)
+        logger.debug(
+            f"Catalog views ({mode}) for '{CATALOG_SHEET_ALIAS}' v{snapshot.version}: "
+            f"views v{updated.version}, {len(updated.categories)} categories."
+        )
+        return updated
 
     # === Asynchronous Write Operations (to SQLite Queue using SQLAlchemy Async ORM) ===
     async def _add_operation_to_sqlite_queue_orm(  # ИЗМЕНЕНО: на SQLAlchemy Async ORM
@@ -429,6 +1312,24 @@ class AsyncSheetServiceWithQueue:
         filter_criteria: Optional[dict] = None,
         data_payload: Optional[dict] = None,
     ) -> int:
+        if self._queue_writer is not None and self._queue_writer.is_running:
+            try:
+                op_id = await self._queue_writer.enqueue(
+                    self._pending_operation_values(
+                        sheet_alias, operation_type, filter_criteria, data_payload
+                    )
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error adding operation to SQLite queue (writer): {e}",
+                    exc_info=True,
+                )
+                return -1
+            logger.info(
+                f"Queued operation to SQLite (writer): ID={op_id}, Sheet='{sheet_alias}', Op='{operation_type}'"
+            )
+            self._metric_queue_enqueued.inc(sheet=sheet_alias, operation=operation_type.upper())
+            return op_id
         op_id = -1
         async with self.AsyncSqliteSessionLocal() as sqlite_session:  # Используем асинхронную сессию
             async with sqlite_session.begin():  # Начинаем транзакцию
@@ -467,50 +1368,207 @@ class AsyncSheetServiceWithQueue:
                     )
                     await sqlite_session.rollback()  # Явный откат при ошибке внутри блока
                     return -1
+        self._metric_queue_enqueued.inc(sheet=sheet_alias, operation=operation_type.upper())
         return op_id
 
-    async def _optimistically_update_in_memory_cache(  # Остается как есть (async)
+    def _pending_operation_values(
+        self,
+        sheet_alias: str,
+        operation_type: str,
+        filter_criteria: Optional[dict] = None,
+        data_payload: Optional[dict] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "sheet_alias": sheet_alias,
+            "operation_type": operation_type.upper(),
+            "filter_criteria_json": (
+                json.dumps(filter_criteria) if filter_criteria else None
+            ),
+            "data_payload_json": json.dumps(data_payload) if data_payload else None,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": datetime.datetime.utcnow(),
+        }
+
+    async def _add_operations_to_sqlite_queue(
+        self,
+        sheet_alias: str,
+        operations: List[Tuple[str, Optional[dict], Optional[dict]]],
+    ) -> Optional[List[int]]:
+        """Ставит пачку операций (op_type, criteria, payload) в очередь одной транзакцией SQLite.
+
+        Возвращает ID операций в исходном порядке или None при ошибке (тогда не поставлена ни одна).
+        """
+        values = [
+            self._pending_operation_values(sheet_alias, op_type, criteria, payload)
+            for op_type, criteria, payload in operations
+        ]
+        try:
+            if self._queue_writer is not None and self._queue_writer.is_running:
+                op_ids = await self._queue_writer.enqueue_many(values)
+            else:
+                async with self.AsyncSqliteSessionLocal() as sqlite_session:
+                    async with sqlite_session.begin():
+                        pending_ops = [PendingSheetOperation(**row) for row in values]
+                        sqlite_session.add_all(pending_ops)
+                        await sqlite_session.flush()
+                        op_ids = [pending_op.id for pending_op in pending_ops]
+        except Exception as e:
+            logger.error(
+                f"Error adding {len(values)} operation(s) to SQLite queue: {e}",
+                exc_info=True,
+            )
+            return None
+        logger.info(
+            f"Queued {len(op_ids)} operation(s) to SQLite in one transaction, Sheet='{sheet_alias}'."
+        )
+        for op_type, _, _ in operations:
+            self._metric_queue_enqueued.inc(sheet=sheet_alias, operation=op_type.upper())
+        return op_ids
+
+    async def _optimistically_update_in_memory_cache(
         self,
         sheet_alias: str,
         operation_type: str,
         filter_criteria: Optional[dict] = None,
         data_payload: Optional[dict] = None,
+        op_id: Optional[int] = None,
+    ):
+        op = operation_type.upper()
+        if op == "CREATE":
+            items = [data_payload]
+        elif op == "UPDATE":
+            items = [(filter_criteria, data_payload)]
+        else:
+            items = [filter_criteria]
+        await self._optimistically_apply_operations_to_cache(
+            sheet_alias, op, items, op_ids=[op_id] if op_id is not None else None
+        )
+
+    def _collect_optimistic_updates(
+        self, snapshot: SheetSnapshot, pk_attr: str, updates: List[Tuple[dict, dict]]
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Последовательно применяет UPDATE к снимку и возвращает пары (исходная строка, итоговая).
+
+        Строка, уже измененная предыдущим UPDATE пачки, сравнивается с фильтром по новым значениям.
+        """
+        touched: Dict[int, List[Dict[str, Any]]] = {}  # id(исходной строки) -> [исходная, текущая]
+        touched_by_pk: Dict[Any, List[List[Dict[str, Any]]]] = {}
+        for criteria, payload in updates:
+            if not criteria or not payload:
+                continue
+            if pk_attr in criteria and HashIndex.is_indexable(criteria[pk_attr]):
+                touched_candidates = touched_by_pk.get(criteria[pk_attr], [])
+            else:
+                touched_candidates = list(touched.values())
+            matched = [
+                entry
+                for entry in touched_candidates
+                if all(entry[1].get(k) == v for k, v in criteria.items())
+            ]
+            matched.extend(
+                [row, row] for row in snapshot.select(criteria) if id(row) not in touched
+            )
+            for entry in matched:
+                old_key = entry[1].get(pk_attr)
+                entry[1] = {**entry[1], **payload}
+                if id(entry[0]) in touched and HashIndex.is_indexable(old_key):
+                    touched_by_pk[old_key] = [
+                        other for other in touched_by_pk[old_key] if other is not entry
+                    ]
+                touched[id(entry[0])] = entry
+                new_key = entry[1].get(pk_attr)
+                if HashIndex.is_indexable(new_key):
+                    touched_by_pk.setdefault(new_key, []).append(entry)
+        return [(original, current) for original, current in touched.values()]
+
+    async def _optimistically_apply_operations_to_cache(
+        self,
+        sheet_alias: str,
+        operation_type: str,
+        items: List[Any],
+        op_ids: Optional[Sequence[int]] = None,
     ):
-        # ... (логика без изменений, как в предыдущем ответе)
+        """Один оптимистичный патч кэша на пачку однотипных операций: один новый снимок и один набор изменений.
+
+        items: для CREATE - payload'ы, для UPDATE - пары (фильтр, payload), для DELETE - фильтры.
+        op_ids - ID операций в очереди: они попадают в слой неподтвержденных операций под той же
+        блокировкой, что и патч, поэтому обновление листа не может вклиниться между ними.
+        """
         async with self._cache_lock:
-            if sheet_alias not in self._in_memory_cache:
+            if op_ids is not None:
+                self._register_overlay_operations(
+                    sheet_alias, operation_type.upper(), items, op_ids
+                )
+            snapshot = self._cache_snapshots.get(sheet_alias)
+            if snapshot is None:
                 logger.warning(f"Optimistic: cache for '{sheet_alias}' not found.")
                 return
-            current_data = self._in_memory_cache.get(sheet_alias, [])
+            pk_attr = self.gsheet_pk_attributes[sheet_alias]
             op = operation_type.upper()
-            if op == "CREATE" and data_payload:
-                current_data.append(data_payload.copy())
-                logger.debug(f"Optimistic CREATE cache '{sheet_alias}'")
-            elif op == "UPDATE" and filter_criteria and data_payload:
-                updated_c = 0
-                for i, row in enumerate(current_data):
-                    if all(row.get(k) == v for k, v in filter_criteria.items()):
-                        current_data[i] = {**row, **data_payload}
-                        updated_c += 1
+            if op == "CREATE":
+                added = [payload.copy() for payload in items if payload]
+                new_snapshot = snapshot.with_changes(added=added)
+                change_set = SheetChangeSet(
+                    sheet_alias,
+                    new_snapshot.version,
+                    added_keys=[row.get(pk_attr) for row in added],
+                    source="optimistic",
+                )
                 logger.debug(
-                    f"Optimistic UPDATE cache '{sheet_alias}': {updated_c} affected."
+                    f"Optimistic CREATE cache '{sheet_alias}': {len(added)} added."
+                )
+            elif op == "UPDATE":
+                replaced = self._collect_optimistic_updates(snapshot, pk_attr, items)
+                new_snapshot = snapshot.with_changes(replaced=replaced)
+                change_set = SheetChangeSet(
+                    sheet_alias,
+                    new_snapshot.version,
+                    # Если обновление меняет сам PK, старый ключ пропадает, а новый появляется
+                    added_keys=[
+                        new.get(pk_attr)
+                        for old, new in replaced
+                        if new.get(pk_attr) != old.get(pk_attr)
+                    ],
+                    changed_keys=[
+                        new.get(pk_attr)
+                        for old, new in replaced
+                        if new.get(pk_attr) == old.get(pk_attr)
+                    ],
+                    removed_keys=[
+                        old.get(pk_attr)
+                        for old, new in replaced
+                        if new.get(pk_attr) != old.get(pk_attr)
+                    ],
+                    source="optimistic",
                 )
-            elif op == "DELETE" and filter_criteria:
-                new_d = []
-                deleted_c = 0
-                for row in current_data:
-                    if not all(row.get(k) == v for k, v in filter_criteria.items()):
-                        new_d.append(row)
-                    else:
-                        deleted_c += 1
-                self._in_memory_cache[sheet_alias] = new_d
                 logger.debug(
-                    f"Optimistic DELETE cache '{sheet_alias}': {deleted_c} removed."
+                    f"Optimistic UPDATE cache '{sheet_alias}': {len(replaced)} affected."
+                )
+            elif op == "DELETE":
+                removed: Dict[int, Dict[str, Any]] = {}
+                for criteria in items:
+                    if criteria:
+                        for row in snapshot.select(criteria):
+                            removed[id(row)] = row
+                new_snapshot = snapshot.with_changes(
+                    replaced=[(row, None) for row in removed.values()]
+                )
+                change_set = SheetChangeSet(
+                    sheet_alias,
+                    new_snapshot.version,
+                    removed_keys=[row.get(pk_attr) for row in removed.values()],
+                    source="optimistic",
+                )
+                logger.debug(
+                    f"Optimistic DELETE cache '{sheet_alias}': {len(removed)} removed."
                 )
             else:
                 logger.warning(
                     f"Unknown op '{operation_type}' for optimistic cache update."
                 )
+                return
+            self._publish_snapshot(new_snapshot, change_set)
 
     async def create_row(self, sheet_alias: str, data_payload: dict) -> Optional[dict]:
         op_id = await self._add_operation_to_sqlite_queue_orm(
@@ -519,8 +1577,9 @@ class AsyncSheetServiceWithQueue:
         if op_id == -1:
             return None
         await self._optimistically_update_in_memory_cache(
-            sheet_alias, "CREATE", data_payload=data_payload
+            sheet_alias, "CREATE", data_payload=data_payload, op_id=op_id
         )
+        self._wake_queue_worker()
         logger.info(
             f"CREATE op for '{sheet_alias}' queued (ID: {op_id}). Optimistic cache update done."
         )
@@ -542,7 +1601,9 @@ class AsyncSheetServiceWithQueue:
             "UPDATE",
             filter_criteria=filter_criteria,
             data_payload=new_data_payload,
+            op_id=op_id,
         )
+        self._wake_queue_worker()
         logger.info(
             f"UPDATE op for '{sheet_alias}' queued (ID: {op_id}). Optimistic cache update done."
         )
@@ -555,151 +1616,568 @@ class AsyncSheetServiceWithQueue:
         if op_id == -1:
             return 0
         await self._optimistically_update_in_memory_cache(
-            sheet_alias, "DELETE", filter_criteria=filter_criteria
+            sheet_alias, "DELETE", filter_criteria=filter_criteria, op_id=op_id
         )
+        self._wake_queue_worker()
         logger.info(
             f"DELETE op for '{sheet_alias}' queued (ID: {op_id}). Optimistic cache update done."
         )
         return 1
 
-    # === SQLite Queue Processor (Background Worker) using SQLAlchemy Async ORM ===
-    async def _process_pending_operations_task(self):
-        await self._initial_gsheet_cache_populated.wait()
+    async def create_rows(
+        self, sheet_alias: str, data_payloads: List[dict]
+    ) -> Optional[List[dict]]:
+        """Пакетный create_row: одна транзакция SQLite и один патч кэша на весь список.
+
+        Возвращает payload'ы (как create_row) или None, если пачку не удалось поставить в очередь.
+        """
+        if not data_payloads:
+            return []
+        op_ids = await self._add_operations_to_sqlite_queue(
+            sheet_alias, [("CREATE", None, payload) for payload in data_payloads]
+        )
+        if op_ids is None:
+            return None
+        await self._optimistically_apply_operations_to_cache(
+            sheet_alias, "CREATE", data_payloads, op_ids=op_ids
+        )
+        self._wake_queue_worker()
         logger.info(
-            "Starting SQLite pending operations processor task (SQLAlchemy Async ORM)."
+            f"{len(op_ids)} CREATE ops for '{sheet_alias}' queued (IDs {op_ids[0]}..{op_ids[-1]}). Optimistic cache update done."
         )
-        while not self._is_shutting_down.is_set():
-            op_id_processed: Optional[int] = None
-            try:
-                async with self.AsyncSqliteSessionLocal() as sqlite_session:
-                    async with sqlite_session.begin():  # Начинаем транзакцию для выбора и обновления статуса
-                        stmt = (
-                            select(PendingSheetOperation)
-                            .where(
-                                PendingSheetOperation.status.in_(["pending", "retry"])
-                            )
-                            .order_by(PendingSheetOperation.created_at)
-                            .limit(1)
-                        )
-                        result = await sqlite_session.execute(stmt)
-                        operation_to_process = result.scalar_one_or_none()
+        return data_payloads
 
-                        if not operation_to_process:
-                            # Явно закрываем сессию перед длительным сном, если нет операций
-                            await sqlite_session.close()  # Закрываем сессию перед sleep
-                            await asyncio.sleep(self._queue_worker_interval)
-                            continue  # Переходим к следующей итерации цикла while
+    async def update_rows_many(
+        self, sheet_alias: str, updates: List[Tuple[dict, dict]]
+    ) -> int:
+        """Пакетный update_rows: updates - пары (filter_criteria, new_data_payload), применяются по порядку.
 
-                        op_id_processed = operation_to_process.id
-                        logger.info(
-                            f"Processing operation ID {op_id_processed}: {operation_to_process.operation_type} on {operation_to_process.sheet_alias}"
+        Возвращает число поставленных в очередь операций (0 при ошибке).
+        """
+        if not updates:
+            return 0
+        op_ids = await self._add_operations_to_sqlite_queue(
+            sheet_alias,
+            [("UPDATE", criteria, payload) for criteria, payload in updates],
+        )
+        if op_ids is None:
+            return 0
+        await self._optimistically_apply_operations_to_cache(
+            sheet_alias, "UPDATE", updates, op_ids=op_ids
+        )
+        self._wake_queue_worker()
+        logger.info(
+            f"{len(op_ids)} UPDATE ops for '{sheet_alias}' queued (IDs {op_ids[0]}..{op_ids[-1]}). Optimistic cache update done."
+        )
+        return len(op_ids)
+
+    async def delete_rows_many(
+        self, sheet_alias: str, filters: List[dict]
+    ) -> int:
+        """Пакетный delete_rows. Возвращает число поставленных в очередь операций (0 при ошибке)."""
+        if not filters:
+            return 0
+        op_ids = await self._add_operations_to_sqlite_queue(
+            sheet_alias, [("DELETE", criteria, None) for criteria in filters]
+        )
+        if op_ids is None:
+            return 0
+        await self._optimistically_apply_operations_to_cache(
+            sheet_alias, "DELETE", filters, op_ids=op_ids
+        )
+        self._wake_queue_worker()
+        logger.info(
+            f"{len(op_ids)} DELETE ops for '{sheet_alias}' queued (IDs {op_ids[0]}..{op_ids[-1]}). Optimistic cache update done."
+        )
+        return len(op_ids)
+
+    # === SQLite Queue Processor (Background Worker) using SQLAlchemy Async ORM ===
+    async def _claim_pending_operations(
+        self, limit: int, max_groups: Optional[int] = None
+    ) -> List[PendingSheetOperation]:
+        """Забирает до limit самых старых готовых операций в статус "processing".
+
+        Операции одной строки (лист + PK) выполняются строго по порядку: операция не
+        забирается, пока в работе или отложена более ранняя операция той же строки.
+        Операция без PK упорядочивается со всем листом. max_groups ограничивает число
+        листов, по которым можно начать новые группы (параллельные воркеры).
+        Очередь читается страницами; листы, из которых в этот проход ничего больше не
+        забрать (отложенный повтор без PK, лимит групп листа), исключаются прямо в запросе,
+        поэтому они не закрывают готовые операции других листов.
+        Статус меняется одним условным UPDATE ... RETURNING, поэтому одну операцию
+        нельзя забрать дважды.
+        """
+        now = datetime.datetime.utcnow()
+        retry_due_before = now - datetime.timedelta(seconds=self._queue_worker_retry_delay)
+        page_size = limit * 4
+        # Сколько операций заблокированных строк листа можно пропустить за проход; дальше лист
+        # исключается до следующего прохода (длинный хвост одной строки не читается целиком)
+        max_skipped_per_sheet = limit * 4
+        try:
+            async with self._queue_claim_lock, self.AsyncSqliteSessionLocal() as sqlite_session:
+                async with sqlite_session.begin():
+                    candidates = []
+                    blocked_sheets = {
+                        sheet_alias
+                        for sheet_alias, groups_count in self._queue_inflight_groups.items()
+                        if groups_count >= self._queue_worker_max_per_sheet
+                    }
+                    blocked_keys: Dict[str, set] = {}
+                    skipped_by_sheet: Dict[str, int] = {}
+                    group_sheets = set()
+                    after = None
+                    while len(candidates) < limit:
+                        only_sheets = None
+                        if max_groups is not None and len(group_sheets) >= max_groups:
+                            # Новых групп не будет: дальше интересны только листы уже набранных групп
+                            only_sheets = group_sheets - blocked_sheets
+                            if not only_sheets:
+                                break
+                        ready_operations = await select_ready_operations(
+                            sqlite_session,
+                            page_size,
+                            after=after,
+                            exclude_sheets=blocked_sheets,
+                            only_sheets=only_sheets,
                         )
+                        if not ready_operations:
+                            break
+                        after = (ready_operations[-1].created_at, ready_operations[-1].id)
+                        for operation in ready_operations:
+                            sheet_alias = operation.sheet_alias
+                            if sheet_alias in blocked_sheets:
+                                continue
+                            if sheet_alias not in group_sheets and (
+                                max_groups is not None and len(group_sheets) >= max_groups
+                            ):
+                                blocked_sheets.add(sheet_alias)
+                                continue
+                            key = operation_ordering_key(
+                                operation, self.gsheet_pk_attributes.get(sheet_alias)
+                            )
+                            sheet_blocked_keys = blocked_keys.setdefault(sheet_alias, set())
+                            inflight_keys = self._queue_inflight_keys.get(sheet_alias, set())
+                            if key is None:
+                                conflict = bool(sheet_blocked_keys or inflight_keys)
+                            else:
+                                conflict = (
+                                    key in sheet_blocked_keys
+                                    or key in inflight_keys
+                                    or None in inflight_keys
+                                )
+                            if not conflict:
+                                conflict = (
+                                    operation.status == "retry"
+                                    and operation.last_attempt_at is not None
+                                    and operation.last_attempt_at > retry_due_before
+                                )
+                            if conflict:
+                                # Более поздние операции той же строки (или всего листа) ждут эту
+                                if key is None:
+                                    blocked_sheets.add(sheet_alias)
+                                else:
+                                    sheet_blocked_keys.add(key)
+                                    skipped_by_sheet[sheet_alias] = skipped_by_sheet.get(sheet_alias, 0) + 1
+                                    if skipped_by_sheet[sheet_alias] >= max_skipped_per_sheet:
+                                        blocked_sheets.add(sheet_alias)
+                                continue
+                            candidates.append((operation, key))
+                            group_sheets.add(sheet_alias)
+                            if len(candidates) >= limit:
+                                break
+                        if len(ready_operations) < page_size:
+                            break
 
-                        operation_to_process.status = "processing"
-                        operation_to_process.attempts += 1
-                        operation_to_process.last_attempt_at = (
-                            datetime.datetime.utcnow()
+                    if not candidates:
+                        return []
+                    claim_result = await sqlite_session.execute(
+                        claim_operations_statement(
+                            [operation.id for operation, _ in candidates], now
                         )
-                        # Коммит для обновления статуса произойдет при выходе из `async with sqlite_session.begin()`
-
-                    # Операция с GSheet происходит вне транзакции SQLite для статуса "processing"
-                    op_type = operation_to_process.operation_type
-                    sheet_alias = operation_to_process.sheet_alias
-                    criteria = (
-                        json.loads(operation_to_process.filter_criteria_json)
-                        if operation_to_process.filter_criteria_json
-                        else None
-                    )
-                    payload = (
-                        json.loads(operation_to_process.data_payload_json)
-                        if operation_to_process.data_payload_json
-                        else None
                     )
+                    if len(set(claim_result.scalars())) != len(candidates):
+                        # Часть операций уже забрал кто-то другой. Откатываем весь проход, чтобы
+                        # не взять более поздние операции тех же строк; следующий проход увидит новое состояние
+                        raise _ClaimConflict()
+        except _ClaimConflict:
+            logger.warning("Queue claim conflicted with another worker, retrying on next pass.")
+            return []
+        claimed_operations = []
+        for operation, _ in candidates:
+            set_committed_value(operation, "status", "processing")
+            set_committed_value(operation, "attempts", operation.attempts + 1)
+            set_committed_value(operation, "last_attempt_at", now)
+            claimed_operations.append(operation)
+        return claimed_operations
+
+    async def _requeue_interrupted_operations(self) -> int:
+        """Возвращает в очередь операции, оставшиеся в "processing" после прошлого запуска."""
+        async with self.AsyncSqliteSessionLocal() as sqlite_session:
+            async with sqlite_session.begin():
+                result = await sqlite_session.execute(
+                    sqlalchemy_update_stmt(PendingSheetOperation)
+                    .where(PendingSheetOperation.status == "processing")
+                    .values(status="pending")
+                )
+        if result.rowcount:
+            logger.warning(
+                f"Requeued {result.rowcount} operation(s) interrupted while processing."
+            )
+        return result.rowcount
 
-                    success = False
-                    result_info = None
+    async def _record_operation_outcomes(
+        self, outcomes: List[Tuple[PendingSheetOperation, bool, Any, Optional[str]]]
+    ):
+        """Фиксирует результат каждой операции отдельно: успех - удалить из очереди, ошибка - retry/failed.
 
-                    if op_type == "CREATE" and payload:
-                        result_info = await asyncio.to_thread(
-                            self._gsheet_create_row_blocking, sheet_alias, payload
+        Подтвержденные операции остаются в слое до скачивания, которое их увидит; окончательно
+        неудачные убираются из слоя сразу, операции на повтор остаются в нем. Оптимистичная
+        запись окончательно неудачной операции откатывается перескачиванием листа.
+        """
+        now = datetime.datetime.utcnow()
+        confirmed_ops: List[Tuple[PendingSheetOperation, Any]] = []
+        failed_ops: List[PendingSheetOperation] = []
+        async with self.AsyncSqliteSessionLocal() as sqlite_session:
+            async with sqlite_session.begin():
+                for operation, success, result_info, worker_error in outcomes:
+                    stored_op = await sqlite_session.get(
+                        PendingSheetOperation, operation.id
+                    )
+                    if not stored_op:
+                        continue
+                    if success:
+                        logger.info(
+                            f"GSheet Operation ID {operation.id} successful. Result: {result_info}. Removing from SQLite."
+                        )
+                        await sqlite_session.delete(stored_op)
+                        confirmed_ops.append((operation, result_info))
+                        self._metric_queue_outcomes.inc(
+                            sheet=operation.sheet_alias,
+                            operation=operation.operation_type,
+                            outcome="committed",
+                        )
+                        if operation.created_at is not None:
+                            self._metric_commit_latency.observe(
+                                (now - operation.created_at).total_seconds(),
+                                sheet=operation.sheet_alias,
+                                operation=operation.operation_type,
+                            )
+                    elif worker_error:
+                        logger.error(
+                            f"GSheet operation ID {operation.id} failed with worker error: {worker_error}"
                         )
-                        success = result_info is not None
-                    elif op_type == "UPDATE" and criteria and payload:
-                        result_info = await asyncio.to_thread(
-                            self._gsheet_update_rows_blocking,
-                            sheet_alias,
-                            criteria,
-                            payload,
+                        stored_op.status = "failed_worker_error"
+                        stored_op.error_message = worker_error[:1000]
+                        failed_ops.append(operation)
+                        self._metric_queue_outcomes.inc(
+                            sheet=operation.sheet_alias,
+                            operation=operation.operation_type,
+                            outcome="failed",
                         )
-                        success = result_info > 0  # Предполагая, что >0 означает успех
-                    elif op_type == "DELETE" and criteria:
-                        result_info = await asyncio.to_thread(
-                            self._gsheet_delete_rows_blocking, sheet_alias, criteria
+                    else:
+                        error_msg = f"GSheet operation ID {operation.id} failed (worker). Result: {result_info}. See GSheet interaction logs."
+                        logger.error(error_msg)
+                        stored_op.error_message = error_msg[:1000]
+                        if stored_op.attempts >= QUEUE_WORKER_MAX_ATTEMPTS:
+                            stored_op.status = "failed_max_attempts"
+                            failed_ops.append(operation)
+                        else:
+                            stored_op.status = "retry"
+                        self._metric_queue_outcomes.inc(
+                            sheet=operation.sheet_alias,
+                            operation=operation.operation_type,
+                            outcome="failed" if stored_op.status == "failed_max_attempts" else "retry",
                         )
-                        success = result_info > 0  # Предполагая, что >0 означает успех
-
-                    # Обновляем/удаляем запись в SQLite в новой транзакции
-                    async with self.AsyncSqliteSessionLocal() as sqlite_update_session:
-                        async with sqlite_update_session.begin():
-                            if success:
-                                logger.info(
-                                    f"GSheet Operation ID {op_id_processed} successful. Result: {result_info}. Removing from SQLite."
-                                )
-                                # Перезапросим объект в новой сессии для удаления
-                                op_to_delete = await sqlite_update_session.get(
-                                    PendingSheetOperation, op_id_processed
-                                )
-                                if op_to_delete:
-                                    await sqlite_update_session.delete(op_to_delete)
-                                # Коммит произойдет автоматически
-                                # Обновляем кэш после успешной записи в GSheet
-                                await self.force_gsheet_in_memory_cache_refresh(
-                                    sheet_alias
-                                )
-                            else:
-                                error_msg = f"GSheet operation ID {op_id_processed} failed (worker). See GSheet interaction logs."
-                                logger.error(error_msg)
-                                # Перезапросим объект для обновления
-                                op_to_update = await sqlite_update_session.get(
-                                    PendingSheetOperation, op_id_processed
-                                )
-                                if op_to_update:
-                                    op_to_update.error_message = error_msg
-                                    if (
-                                        op_to_update.attempts
-                                        >= QUEUE_WORKER_MAX_ATTEMPTS
-                                    ):
-                                        op_to_update.status = "failed_max_attempts"
-                                    else:
-                                        op_to_update.status = "retry"
-                                # Коммит произойдет автоматически
+        self._settle_overlay_operations(confirmed_ops, failed_ops)
+        for sheet_alias in {operation.sheet_alias for operation in failed_ops}:
+            self._revert_failed_optimistic_writes(sheet_alias)
+
+    def _revert_failed_optimistic_writes(self, sheet_alias: str):
+        """Запись не дошла до листа, а ее оптимистичная версия осталась в кэше.
+
+        Ревизия листа при этом не менялась, поэтому проба изменений пропускала бы
+        скачивания, а снимок на диске хранил бы фантомную строку как свежую. Токен
+        ревизии сбрасывается (в том числе в снимке на диске), и лист перескачивается.
+        """
+        logger.warning(
+            f"Queued write to '{sheet_alias}' failed permanently; refreshing the sheet to drop its optimistic changes."
+        )
+        self._sheet_revision_tokens.pop(sheet_alias, None)
+        self._schedule_cache_snapshot_save()
+        self._schedule_post_write_refresh(sheet_alias)
+
+    def _settle_overlay_operations(
+        self,
+        confirmed_ops: List[Tuple[PendingSheetOperation, Any]],
+        failed_ops: List[PendingSheetOperation],
+    ):
+        if self._pending_overlay is None:
+            return
+        confirmed_at = time.monotonic()
+        touched_sheets = set()
+        for operation, result_info in confirmed_ops:
+            self._pending_overlay.confirm(
+                operation.sheet_alias, operation.id, result_info, confirmed_at
+            )
+        for operation in failed_ops:
+            self._pending_overlay.discard(operation.sheet_alias, operation.id)
+            touched_sheets.add(operation.sheet_alias)
+        for sheet_alias in touched_sheets:
+            self._update_overlay_gauge(sheet_alias)
+
+    async def _apply_operations_group(
+        self, sheet_alias: str, operations: List[PendingSheetOperation]
+    ) -> List[Tuple[PendingSheetOperation, bool, Any, Optional[str]]]:
+        """Сливает операции листа и отправляет оставшиеся в GSheet одной сессией.
+
+        Исход слитой записи распространяется на все исходные операции очереди.
+        """
+        if self._queue_coalesce_operations:
+            coalesced, cancelled = coalesce_operations(
+                operations, self.gsheet_pk_attributes.get(sheet_alias)
+            )
+        else:
+            coalesced = [CoalescedOperation.from_pending(op) for op in operations]
+            cancelled = []
+        saved_writes = len(operations) - len(coalesced)
+        stats = self._queue_coalescing_stats
+        stats["claimed_operations"] += len(operations)
+        stats["remote_writes"] += len(coalesced)
+        stats["cancelled_operations"] += len(cancelled)
+        stats["remote_writes_saved"] += saved_writes
+        logger.info(
+            f"Processing {len(operations)} operation(s) on {sheet_alias}: IDs {[op.id for op in operations]}. "
+            f"Remote writes after coalescing: {len(coalesced)} (saved {saved_writes})."
+        )
+        outcomes: List[Tuple[PendingSheetOperation, bool, Any, Optional[str]]] = [
+            (operation, True, "coalesced away", None) for operation in cancelled
+        ]
+        if not coalesced:
+            return outcomes
+        batch_error = None
+        try:
+            results = await self._run_blocking(
+                "write",
+                self._gsheet_apply_operations_blocking,
+                sheet_alias,
+                [operation.as_batch_item() for operation in coalesced],
+            )
+        except Exception as e:
+            logger.error(
+                f"Error applying operations batch to '{sheet_alias}': {e}", exc_info=True
+            )
+            batch_error = str(e)
+        confirmed: List[Tuple[CoalescedOperation, Any]] = []
+        for index, operation in enumerate(coalesced):
+            if batch_error is None and results[index][0]:
+                confirmed.append((operation, results[index][1]))
+            for source_operation in operation.source_operations:
+                if batch_error is not None:
+                    outcomes.append((source_operation, False, None, batch_error))
+                else:
+                    success, result_info = results[index]
+                    outcomes.append((source_operation, success, result_info, None))
+        if confirmed:
+            await self._apply_confirmed_writes_to_cache(sheet_alias, confirmed)
+        return outcomes
+
+    async def _apply_confirmed_writes_to_cache(
+        self, sheet_alias: str, confirmed: List[Tuple[CoalescedOperation, Any]]
+    ):
+        """Доводит кэш до подтвержденного GSheet состояния без перескачивания листа.
+
+        Оптимистичная запись уже в кэше, поэтому UPDATE и DELETE ничего не добавляют,
+        а CREATE дополняет строку атрибутами, которые заполнил лист (их не было в payload).
+        Повторно применять сами операции нельзя: в кэше уже могут быть более поздние
+        оптимистичные записи. Если же за время записи кэш перезаписало обновление листа,
+        оптимистичное состояние потеряно - тогда лист перескачивается (с debounce).
+        Со слоем неподтвержденных операций перескачивание не нужно: обновление листа
+        уже наложило на свежие строки операции, которых еще не видело.
+        """
+        self._post_write_refresh_stats["confirmed_groups"] += 1
+        pk_attr = self.gsheet_pk_attributes[sheet_alias]
+        async with self._cache_lock:
+            fetch_applied_at = self._cache_last_fetch_applied_at.get(sheet_alias)
+            needs_refresh = self._pending_overlay is None and fetch_applied_at is not None and any(
+                source_operation.created_at <= fetch_applied_at
+                for operation, _ in confirmed
+                for source_operation in operation.source_operations
+            )
+            snapshot = self._cache_snapshots.get(sheet_alias)
+            replaced = []
+            for operation, result_info in confirmed:
+                if (
+                    snapshot is None
+                    or operation.operation_type != "CREATE"
+                    or not isinstance(result_info, dict)
+                ):
+                    continue
+                key_value = result_info.get(pk_attr)
+                if key_value is None:
+                    continue
+                for row in snapshot.select({pk_attr: key_value}):
+                    missing = {k: v for k, v in result_info.items() if k not in row}
+                    if missing:
+                        replaced.append((row, {**row, **missing}))
+            if replaced:
+                new_snapshot = snapshot.with_changes(replaced=replaced)
+                self._publish_snapshot(
+                    new_snapshot,
+                    SheetChangeSet(
+                        sheet_alias,
+                        new_snapshot.version,
+                        changed_keys=[new.get(pk_attr) for _, new in replaced],
+                        source="confirmed",
+                    ),
+                )
+        if needs_refresh:
+            self._schedule_post_write_refresh(sheet_alias)
+        else:
+            self._post_write_refresh_stats["refreshes_avoided"] += 1
+
+    def _schedule_post_write_refresh(self, sheet_alias: str):
+        """Одно отложенное перескачивание листа на окно debounce, сколько бы записей его ни запросило."""
+        pending_task = self._post_write_refresh_tasks.get(sheet_alias)
+        if pending_task is not None and not pending_task.done():
+            self._post_write_refresh_stats["refreshes_avoided"] += 1
+            return
+        self._post_write_refresh_stats["refreshes_scheduled"] += 1
+        self._post_write_refresh_tasks[sheet_alias] = asyncio.create_task(
+            self._delayed_post_write_refresh(sheet_alias)
+        )
+
+    async def _delayed_post_write_refresh(self, sheet_alias: str):
+        try:
+            await asyncio.sleep(self._post_write_refresh_debounce)
+            logger.info(f"Refreshing '{sheet_alias}' after queued writes.")
+            await self.force_gsheet_in_memory_cache_refresh(sheet_alias)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(
+                f"Post-write refresh of '{sheet_alias}' failed: {e}", exc_info=True
+            )
+
+    def get_post_write_refresh_stats(self) -> Dict[str, int]:
+        """Сколько групп подтвержденных записей применено к кэшу и сколько перескачиваний листа удалось избежать."""
+        return dict(self._post_write_refresh_stats)
+
+    def get_queue_coalescing_stats(self) -> Dict[str, int]:
+        """Сколько операций забрано из очереди, сколько удаленных записей ушло и сколько сэкономлено слиянием."""
+        return dict(self._queue_coalescing_stats)
+
+    async def _dispatch_pending_operations(self) -> int:
+        """Забирает операции на свободные слоты воркеров и запускает по задаче на каждую группу листа.
+
+        Возвращает число забранных операций (0 - нечего запускать или все слоты заняты).
+        """
+        free_slots = self._queue_worker_concurrency - len(self._queue_worker_tasks)
+        if free_slots <= 0:
+            return 0
+        claimed_operations = await self._claim_pending_operations(
+            self._queue_worker_batch_size, max_groups=free_slots
+        )
+        if not claimed_operations:
+            return 0
+        groups: Dict[str, List[PendingSheetOperation]] = {}
+        for operation in claimed_operations:
+            groups.setdefault(operation.sheet_alias, []).append(operation)
+
+        for sheet_alias, operations in groups.items():
+            pk_attr = self.gsheet_pk_attributes.get(sheet_alias)
+            group_keys = {
+                operation_ordering_key(operation, pk_attr) for operation in operations
+            }
+            self._queue_inflight_keys.setdefault(sheet_alias, set()).update(group_keys)
+            self._queue_inflight_groups[sheet_alias] = (
+                self._queue_inflight_groups.get(sheet_alias, 0) + 1
+            )
+            task = asyncio.create_task(
+                self._run_operations_group(sheet_alias, operations, group_keys)
+            )
+            self._queue_worker_tasks.add(task)
+            task.add_done_callback(self._queue_worker_tasks.discard)
+        return len(claimed_operations)
+
+    async def _run_operations_group(
+        self,
+        sheet_alias: str,
+        operations: List[PendingSheetOperation],
+        group_keys: set,
+    ):
+        try:
+            outcomes = await self._apply_operations_group(sheet_alias, operations)
+            await self._record_operation_outcomes(outcomes)
+        except asyncio.CancelledError:
+            # Операции останутся в "processing" и вернутся в очередь при следующем запуске
+            raise
+        except Exception as e:
+            logger.error(
+                f"Error processing operations group for '{sheet_alias}': {e}",
+                exc_info=True,
+            )
+        finally:
+            self._queue_inflight_keys[sheet_alias].difference_update(group_keys)
+            self._queue_inflight_groups[sheet_alias] -= 1
+            # Освободились слот и ключи строк - диспетчер может забрать следующие операции
+            self._wake_queue_worker()
+
+    def _wake_queue_worker(self):
+        self._queue_wakeup_event.set()
+
+    async def _seconds_until_next_retry(self) -> Optional[float]:
+        """Через сколько секунд наступит ближайший повтор (None - операций в статусе retry нет)."""
+        async with self.AsyncSqliteSessionLocal() as sqlite_session:
+            result = await sqlite_session.execute(
+                select(func.min(PendingSheetOperation.last_attempt_at)).where(
+                    PendingSheetOperation.status == "retry"
+                )
+            )
+            oldest_attempt_at = result.scalar_one_or_none()
+        if oldest_attempt_at is None:
+            return None
+        due_at = oldest_attempt_at + datetime.timedelta(
+            seconds=self._queue_worker_retry_delay
+        )
+        return max(0.0, (due_at - datetime.datetime.utcnow()).total_seconds())
+
+    async def _wait_for_queue_work(self):
+        """Ждет сигнала о новой записи, ближайшего повтора или (опционально) страховочного опроса."""
+        timeout = await self._seconds_until_next_retry()
+        if QUEUE_WORKER_SAFETY_POLL_WHEN_IDLE:
+            timeout = min(timeout, self._queue_worker_interval) if timeout is not None else self._queue_worker_interval
+        try:
+            await asyncio.wait_for(self._queue_wakeup_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return
+        if self._queue_worker_batch_window > 0 and not self._is_shutting_down.is_set():
+            # Короткое окно, чтобы всплеск записей попал в одну пачку
+            await asyncio.sleep(self._queue_worker_batch_window)
+
+    async def _process_pending_operations_task(self):
+        await self._initial_gsheet_cache_populated.wait()
+        logger.info(
+            f"Starting SQLite pending operations processor task (batch size {self._queue_worker_batch_size}, "
+            f"{self._queue_worker_concurrency} worker(s), up to {self._queue_worker_max_per_sheet} per sheet)."
+        )
+        while not self._is_shutting_down.is_set():
+            # Сбрасываем сигнал до выборки: запись, пришедшая во время прохода, снова его выставит
+            self._queue_wakeup_event.clear()
+            try:
+                processed_count = await self._dispatch_pending_operations()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(
                     f"Error in SQLite queue processor task (SQLAlchemy ORM): {e}",
                     exc_info=True,
                 )
-                if op_id_processed:  # Если ID операции был получен
-                    try:
-                        async with self.AsyncSqliteSessionLocal() as sqlite_err_session:
-                            async with sqlite_err_session.begin():
-                                op_to_mark_failed = await sqlite_err_session.get(
-                                    PendingSheetOperation, op_id_processed
-                                )
-                                if op_to_mark_failed:
-                                    op_to_mark_failed.status = "failed_worker_error"
-                                    op_to_mark_failed.error_message = str(e)[
-                                        :1000
-                                    ]  # Ограничиваем длину сообщения об ошибке
-                    except Exception as e_db_update:
-                        logger.error(
-                            f"Failed to mark operation {op_id_processed} as 'failed_worker_error' in SQLite: {e_db_update}"
-                        )
-                await asyncio.sleep(
-                    self._queue_worker_interval
-                )  # Пауза перед следующей попыткой цикла
-
+                processed_count = 0
+                await asyncio.sleep(self._queue_worker_interval)
             if self._is_shutting_down.is_set():
                 break
+            if not processed_count:
+                await self._wait_for_queue_work()
         logger.info(
             "SQLite pending operations processor task (SQLAlchemy ORM) stopped."
         )
@@ -707,14 +2185,41 @@ class AsyncSheetServiceWithQueue:
     # === Service Start/Stop ===
     async def start_services(self):
         await self._ensure_sqlite_tables_exist()  # Убедимся, что таблицы SQLite существуют
+        await self._requeue_interrupted_operations()
+        # Слой неподтвержденных операций нужен до первой публикации кэша (снимок с диска или скачивание)
+        await self._restore_pending_overlay()
+        if self._queue_writer is not None:
+            await self._queue_writer.start()
 
-        if not self.gsheet_catalog:
-            logger.warning(
-                "GSheet catalog is empty. In-memory cache and GSheet interactions will be limited."
+        self._startup_started_at = time.perf_counter()
+        if self.gsheet_catalog:
+            # Теплый старт: работаем по сохраненному каталогу, перепроверяем его в фоне
+            self._startup_stats["mode"] = "warm"
+            self._gsheet_catalog_revalidation_task = asyncio.create_task(
+                self._revalidate_gsheet_catalog_task()
             )
-            self._initial_gsheet_cache_populated.set()
         else:
-            await self._populate_all_in_memory_caches()
+            # Холодный старт: без каталога листы не прочитать, ждем обнаружения
+            self._startup_stats["mode"] = "cold"
+            await self._discover_gsheet_catalog()
+        self._startup_stats["catalog_ready_seconds"] = round(
+            time.perf_counter() - self._startup_started_at, 3
+        )
+        # Снимок с прошлого запуска отпускает читателей сразу, если покрывает все листы каталога
+        snapshot_sheets = await self._load_cache_snapshot()
+        self._startup_stats["snapshot_sheets"] = snapshot_sheets
+        catalog_aliases = [
+            alias for alias in self.gsheet_model_map.keys() if alias in self.gsheet_catalog
+        ]
+        if snapshot_sheets and all(alias in self._cache_snapshots for alias in catalog_aliases):
+            self._startup_stats["snapshot_ready_seconds"] = round(
+                time.perf_counter() - self._startup_started_at, 3
+            )
+            self._initial_gsheet_cache_populated.set()
+        # Кэш загружается (или перепроверяется) в фоне: start_services не ждет все листы
+        self._initial_cache_population_task = asyncio.create_task(
+            self._initial_cache_population()
+        )
 
         if (
             self._gsheet_periodic_refresh_task is None
@@ -733,17 +2238,52 @@ class AsyncSheetServiceWithQueue:
                 "Background SQLite queue processor task (SQLAlchemy ORM) started."
             )
 
+        if METRICS_HTTP_ENABLED and self._metrics_http_server is None:
+            self._metrics_http_server = MetricsHttpServer(
+                self.render_prometheus_metrics, METRICS_HTTP_HOST, METRICS_HTTP_PORT
+            )
+            try:
+                await self._metrics_http_server.start()
+            except OSError as e:
+                logger.error(f"Could not start metrics endpoint: {e}")
+                self._metrics_http_server = None
+
     async def close(self):
         logger.info(
             "Closing AsyncSheetServiceWithQueue (SQLAlchemy async SQLite version)..."
         )
         self._is_shutting_down.set()
+        self._wake_queue_worker()
+        if self._metrics_http_server is not None:
+            await self._metrics_http_server.close()
+            self._metrics_http_server = None
 
         tasks_to_await = []
         if self._gsheet_periodic_refresh_task:
             tasks_to_await.append(self._gsheet_periodic_refresh_task)
         if self._queue_processor_task:
             tasks_to_await.append(self._queue_processor_task)
+        tasks_to_await.extend(self._post_write_refresh_tasks.values())
+        tasks_to_await.extend(
+            task
+            for task in [
+                self._gsheet_catalog_revalidation_task,
+                self._initial_cache_population_task,
+                *self._extra_sheet_refresh_tasks,
+            ]
+            if task is not None
+        )
+        tasks_to_await.extend(self._queue_worker_tasks)
+
+        # Воркер очереди сам выходит из цикла по _is_shutting_down. Отмена посреди работы
+        # с SQLite (например, при открытии соединения) может оставить соединение незакрытым
+        queue_tasks = {
+            task
+            for task in [self._queue_processor_task, *self._queue_worker_tasks]
+            if task and not task.done()
+        }
+        if queue_tasks:
+            await asyncio.wait(queue_tasks, timeout=5.0)
 
         for task in tasks_to_await:
             if task and not task.done():
@@ -757,8 +2297,19 @@ class AsyncSheetServiceWithQueue:
                 except Exception as e:
                     logger.error(f"Error shutting down {task.get_name()}: {e}")
 
-        if self.gsheet_db_engine:
-            await asyncio.to_thread(self.gsheet_db_engine.dispose)
+        if self._cache_snapshot_save_task is not None and not self._cache_snapshot_save_task.done():
+            # Отложенное сохранение не дождалось паузы - пишем снимок сейчас
+            self._cache_snapshot_save_task.cancel()
+            try:
+                await self._cache_snapshot_save_task
+            except asyncio.CancelledError:
+                pass
+            await self._save_cache_snapshot()
+        if self._queue_writer is not None:
+            await self._queue_writer.close()
+        # Задачи уже отменены: вызовы в очереди пулов сняты, выполняющиеся дожидаемся до дедлайна
+        await self._close_blocking_pools()
+        await asyncio.to_thread(self.sheet_backend.close)
         if self.sqlite_async_engine:
             await self.sqlite_async_engine.dispose()  # Закрываем асинхронный движок SQLite
         logger.info(
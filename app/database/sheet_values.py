@@ -0,0 +1,179 @@
+# robotiaga-perfumeshopnew/app/database/sheet_values.py
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, String
+from sqlalchemy.inspection import inspect as sqlalchemy_inspect
+
+from .models import GSheetBase
+
+# Параметры values.batchGet: числа - числами, даты - серийными номерами (не зависят от локали таблицы)
+VALUES_RENDER_PARAMS = {
+    "valueRenderOption": "UNFORMATTED_VALUE",
+    "dateTimeRenderOption": "SERIAL_NUMBER",
+}
+# Нулевой день серийных дат Google Sheets
+_SERIAL_EPOCH = datetime.datetime(1899, 12, 30)
+
+ColumnConverter = Callable[[List[Any]], List[Any]]
+
+
+def model_column_attributes(model_class: Type[GSheetBase]) -> Dict[str, str]:
+    """Заголовок колонки листа (имя mapped_column) -> атрибут модели, например "ID Товара" -> product_id."""
+    return {
+        column.name: column_attr.key
+        for column_attr in sqlalchemy_inspect(model_class).mapper.column_attrs
+        for column in column_attr.columns
+    }
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == ""
+
+
+def _to_int(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                number = float(value)
+            except ValueError:
+                return value
+            return int(number) if number.is_integer() else number
+    return value
+
+
+def _to_float(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", "."))
+        except ValueError:
+            return value
+    return value
+
+
+def _to_str(value: Any) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_bool(value: Any) -> Any:
+    if isinstance(value, str):
+        upper = value.strip().upper()
+        if upper in ("TRUE", "1"):
+            return True
+        if upper in ("FALSE", "0"):
+            return False
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    return value
+
+
+def _to_datetime(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Дробная часть серийного номера - доля суток; округляем, чтобы 10:00 не стало 09:59:59.999999
+        return _SERIAL_EPOCH + datetime.timedelta(seconds=round(value * 86400, 3))
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _to_date(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (_SERIAL_EPOCH + datetime.timedelta(days=int(value))).date()
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _column_converter(convert: Callable[[Any], Any], native: type) -> ColumnConverter:
+    """Конвертер колонки: пустые ячейки -> None, значения уже нужного типа не трогаются."""
+
+    def convert_column(values: List[Any]) -> List[Any]:
+        return [
+            None if _is_empty(value) else value if type(value) is native else convert(value)
+            for value in values
+        ]
+
+    return convert_column
+
+
+# Порядок важен: DateTime проверяется раньше Date, Boolean - раньше Integer
+_CONVERTERS = (
+    (DateTime, _column_converter(_to_datetime, datetime.datetime)),
+    (Date, _column_converter(_to_date, datetime.date)),
+    (Boolean, _column_converter(_to_bool, bool)),
+    (Integer, _column_converter(_to_int, int)),
+    (Float, _column_converter(_to_float, float)),
+    (String, _column_converter(_to_str, str)),
+)
+
+
+def _converter_for(column_type: Any) -> ColumnConverter:
+    for sql_type, converter in _CONVERTERS:
+        if isinstance(column_type, sql_type):
+            return converter
+    return _column_converter(lambda value: value, object)
+
+
+class SheetValuesDecoder:
+    """Превращает диапазон значений листа (первая строка - заголовки) в строки модели.
+
+    Заголовки сопоставляются с атрибутами по именам mapped_column; типы приводятся
+    по колонке целиком (один конвертер на колонку, а не inspect модели на каждую строку).
+    Пустые строки листа пропускаются; атрибуты, колонок которых нет в листе, - None.
+    """
+
+    def __init__(self, model_class: Type[GSheetBase]):
+        self.model_class = model_class
+        self.attribute_names: List[str] = []
+        self._converters: List[ColumnConverter] = []
+        self._attrs_by_header = model_column_attributes(model_class)
+        for column_attr in sqlalchemy_inspect(model_class).mapper.column_attrs:
+            self.attribute_names.append(column_attr.key)
+            self._converters.append(_converter_for(column_attr.columns[0].type))
+
+    def decode(self, values: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        if not values:
+            return []
+        header = values[0]
+        positions: Dict[str, int] = {}
+        for position, column_name in enumerate(header):
+            attr_name = self._attrs_by_header.get(column_name)
+            if attr_name is not None and attr_name not in positions:
+                positions[attr_name] = position
+        data_rows = [row for row in values[1:] if any(not _is_empty(cell) for cell in row)]
+        columns: List[List[Any]] = []
+        for attr_name, convert_column in zip(self.attribute_names, self._converters):
+            position: Optional[int] = positions.get(attr_name)
+            if position is None:
+                columns.append([None] * len(data_rows))
+                continue
+            raw = [row[position] if position < len(row) else None for row in data_rows]
+            columns.append(convert_column(raw))
+        attribute_names = self.attribute_names
+        return [dict(zip(attribute_names, row_values)) for row_values in zip(*columns)]
+
+
+def sheet_range(sheet_title: str) -> str:
+    """A1-диапазон всего листа для values.batchGet (название в кавычках, ' удваивается)."""
+    return "'" + sheet_title.replace("'", "''") + "'"
@@ -0,0 +1,261 @@
+# robotiaga-perfumeshopnew/benchmarks/batch_fetch_benchmark.py
+"""Бенчмарк загрузки всех листов: ORM-путь Shillelagh (запрос на лист) против одного values.batchGet.
+
+Оба пути идут через код ShillelaghGSheetBackend, удаленная часть заменена локальными заглушками
+с одинаковой задержкой на запрос (--latency, по умолчанию 0.3 с - типичный ответ Sheets API):
+- ORM: адаптер Shillelagh в памяти отдает строки листа; дальше как в проде -
+  session.query(model).all() и _row_to_dict на каждую строку. Разбор ответа gviz
+  настоящего адаптера gsheets в заглушке не делается, так что разница - нижняя оценка;
+- batch: заглушка таблицы gspread отвечает на values_batch_get значениями ячеек
+  (UNFORMATTED_VALUE, даты - серийными номерами), строки собирает SheetValuesDecoder.
+
+Размеры листов - как в живой таблице магазина, умноженные на --scale. ORM-путь меряется
+последовательно и с параллельностью CACHE_REFRESH_MAX_CONCURRENT_FETCHES (как в сервисе).
+Проверяется, что оба пути дают одинаковые строки, а плановое обновление одного листа
+(тот же values-запрос с одним диапазоном) - в точности те же строки, что пакетная загрузка.
+
+Запуск из корня проекта:
+    python -m benchmarks.batch_fetch_benchmark
+    python -m benchmarks.batch_fetch_benchmark --scale 10 --latency 0 --output fetch.json
+"""
+import argparse
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from shillelagh.adapters.base import Adapter
+from shillelagh.adapters.registry import registry
+from shillelagh.fields import Boolean, Date, DateTime, Float, Integer, String
+from sqlalchemy import create_engine
+from sqlalchemy.inspection import inspect as sqlalchemy_inspect
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database import ShillelaghGSheetBackend
+from app.database.sheet_backends import SheetBackend
+from config import CACHE_REFRESH_MAX_CONCURRENT_FETCHES
+
+from .service_benchmark import MODEL_MAP, _order, _product, _user
+
+# Строк в листе при --scale 1
+SHEET_ROWS = {
+    "Товары": 2_000,
+    "Пользователи": 5_000,
+    "Заказы": 10_000,
+}
+_SERIAL_EPOCH = datetime.datetime(1899, 12, 30)
+_STUB_ADAPTER = "bench_stub_sheets"
+
+
+def _sheet_rows(scale: float) -> Dict[str, List[Dict[str, Any]]]:
+    rows_count = {alias: max(1, int(count * scale)) for alias, count in SHEET_ROWS.items()}
+    return {
+        "Товары": [_product(position) for position in range(1, rows_count["Товары"] + 1)],
+        "Пользователи": [
+            {**_user(position), "agreement_accepted_at": datetime.datetime(2024, 5, 1, 10, position % 60)}
+            for position in range(1, rows_count["Пользователи"] + 1)
+        ],
+        "Заказы": [_order(position) for position in range(1, rows_count["Заказы"] + 1)],
+        "Тип доставки": [{"delivery_type_name": "Курьер", "cost": 300.0, "is_active": "TRUE"}],
+        "Настройка платежей": [{"payment_format": "СБП", "recipient_name": "ИП"}],
+        "Рассылки": [],
+    }
+
+
+def _shillelagh_field(column_type: Any):
+    for sql_type, field in (
+        ("DATETIME", DateTime),
+        ("DATE", Date),
+        ("BOOLEAN", Boolean),
+        ("INTEGER", Integer),
+        ("FLOAT", Float),
+    ):
+        if column_type.__visit_name__.upper() == sql_type:
+            return field()
+    return String()
+
+
+class _StubSheetsAdapter(Adapter):
+    """Листы в памяти для Shillelagh: таблица - название листа, колонки - заголовки (имена mapped_column)."""
+
+    safe = True
+    supports_limit = False
+    supports_offset = False
+    sheets: Dict[str, List[Dict[str, Any]]] = {}
+    latency_seconds = 0.0
+
+    @staticmethod
+    def supports(uri: str, fast: bool = True, **kwargs: Any) -> bool:
+        return uri in _StubSheetsAdapter.sheets
+
+    @staticmethod
+    def parse_uri(uri: str):
+        return (uri,)
+
+    def __init__(self, sheet_alias: str):
+        super().__init__()
+        self.sheet_alias = sheet_alias
+        model_class = MODEL_MAP[sheet_alias]
+        self._columns = {}
+        self._attr_by_column = {}
+        for column_attr in sqlalchemy_inspect(model_class).mapper.column_attrs:
+            column = column_attr.columns[0]
+            self._columns[column.name] = _shillelagh_field(column.type)
+            self._attr_by_column[column.name] = column_attr.key
+
+    def get_columns(self):
+        return self._columns
+
+    def get_data(self, bounds, order, **kwargs):
+        time.sleep(self.latency_seconds)  # Один запрос к API на лист
+        for row_id, row in enumerate(self.sheets[self.sheet_alias]):
+            yield {
+                "rowid": row_id,
+                **{column_name: row.get(attr) for column_name, attr in self._attr_by_column.items()},
+            }
+
+
+registry.add(_STUB_ADAPTER, _StubSheetsAdapter)
+
+
+def _to_cell(value: Any) -> Any:
+    """Ячейка, как ее отдает values.batchGet с UNFORMATTED_VALUE и SERIAL_NUMBER."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return (value - _SERIAL_EPOCH).total_seconds() / 86400
+    if isinstance(value, datetime.date):
+        return (value - _SERIAL_EPOCH.date()).days
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # API отдает целые числа без дробной части
+    return value
+
+
+class _StubSpreadsheet:
+    def __init__(self, sheets: Dict[str, List[Dict[str, Any]]], latency_seconds: float):
+        self.latency_seconds = latency_seconds
+        self.value_ranges = {}
+        for alias, rows in sheets.items():
+            column_attrs = sqlalchemy_inspect(MODEL_MAP[alias]).mapper.column_attrs
+            header = [column_attr.columns[0].name for column_attr in column_attrs]
+            values = [header]
+            for row in rows:
+                cells = [_to_cell(row.get(column_attr.key)) for column_attr in column_attrs]
+                while cells and cells[-1] == "":
+                    cells.pop()  # API не отдает пустые ячейки в конце строки
+                values.append(cells)
+            self.value_ranges[f"'{alias}'"] = values
+
+    def values_batch_get(self, ranges, params=None):
+        time.sleep(self.latency_seconds)  # Один запрос на все листы
+        return {
+            "valueRanges": [
+                {"range": sheet_range, "values": self.value_ranges[sheet_range]} for sheet_range in ranges
+            ]
+        }
+
+
+class _StubBackend(ShillelaghGSheetBackend):
+    """ShillelaghGSheetBackend, у которого удаленные Google Sheets заменены заглушками."""
+
+    def __init__(self, spreadsheet: _StubSpreadsheet):
+        self._stub_spreadsheet = spreadsheet
+        super().__init__("local-benchmark", "unused.json", MODEL_MAP)
+
+    def apply_catalog(self, catalog: Dict[str, str]):
+        SheetBackend.apply_catalog(self, catalog)
+        self.gsheet_db_engine = create_engine("shillelagh://", adapters=[_STUB_ADAPTER])
+        self.GSheetSessionLocal = sessionmaker(bind=self.gsheet_db_engine, class_=Session)
+
+    def _open_spreadsheet(self):
+        return self._stub_spreadsheet
+
+
+def _normalize(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Shillelagh отдает целые числа из Float-колонок как int, а пакетный путь - как float
+    return [
+        {k: float(v) if isinstance(v, int) and not isinstance(v, bool) else v for k, v in row.items()}
+        for row in rows
+    ]
+
+
+def run_benchmark(scale: float, latency_seconds: float) -> dict:
+    sheets = _sheet_rows(scale)
+    _StubSheetsAdapter.sheets = sheets
+    _StubSheetsAdapter.latency_seconds = latency_seconds
+    backend = _StubBackend(_StubSpreadsheet(sheets, latency_seconds))
+    backend.apply_catalog({alias: f"stub://{alias}" for alias in MODEL_MAP})
+    aliases = list(MODEL_MAP)
+
+    orm_sheet_seconds = {}
+    orm_rows = {}
+    started = time.perf_counter()
+    for alias in aliases:
+        sheet_started = time.perf_counter()
+        orm_rows[alias] = backend.fetch_rows_blocking(alias)
+        orm_sheet_seconds[alias] = round(time.perf_counter() - sheet_started, 4)
+    orm_sequential_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CACHE_REFRESH_MAX_CONCURRENT_FETCHES) as pool:
+        list(pool.map(backend.fetch_rows_blocking, aliases))
+    orm_concurrent_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch_rows = backend.fetch_sheets_rows_blocking(aliases)
+    batch_seconds = time.perf_counter() - started
+    # CPU-часть пакетного пути: только разбор значений (без задержки запроса)
+    started = time.perf_counter()
+    for alias in aliases:
+        backend._values_decoder(alias).decode(backend._stub_spreadsheet.value_ranges[f"'{alias}'"])
+    decode_seconds = time.perf_counter() - started
+
+    # Плановое обновление листа при CACHE_BATCH_FETCH: сравнение без нормализации типов
+    periodic_mismatched = []
+    for alias in aliases:
+        single_rows = backend.fetch_sheets_rows_blocking([alias])
+        if single_rows is None or batch_rows is None or single_rows[alias] != batch_rows[alias]:
+            periodic_mismatched.append(alias)
+
+    mismatched = [
+        alias
+        for alias in aliases
+        if orm_rows[alias] is None
+        or batch_rows is None
+        or _normalize(orm_rows[alias]) != _normalize(batch_rows[alias])
+    ]
+    backend.close()
+    return {
+        "scale": scale,
+        "latency_seconds": latency_seconds,
+        "rows": {alias: len(rows) for alias, rows in sheets.items()},
+        "remote_requests": {"orm": len(aliases), "batch": 1},
+        "orm_sheet_seconds": orm_sheet_seconds,
+        "orm_sequential_seconds": round(orm_sequential_seconds, 4),
+        f"orm_concurrent_{CACHE_REFRESH_MAX_CONCURRENT_FETCHES}_seconds": round(orm_concurrent_seconds, 4),
+        "batch_seconds": round(batch_seconds, 4),
+        "batch_decode_seconds": round(decode_seconds, 4),
+        "speedup_vs_concurrent_orm": round(orm_concurrent_seconds / batch_seconds, 2),
+        "rows_equal": not mismatched,
+        "mismatched_sheets": mismatched,
+        "periodic_rows_equal": not periodic_mismatched,
+        "periodic_mismatched_sheets": periodic_mismatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Множитель размеров листов")
+    parser.add_argument("--latency", type=float, default=0.3, help="Задержка одного запроса к API, с")
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию только stdout)")
+    args = parser.parse_args()
+    report_json = json.dumps(run_benchmark(args.scale, args.latency), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report_json)
+    print(report_json)
+
+
+if __name__ == "__main__":
+    main()
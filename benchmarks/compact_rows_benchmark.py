@@ -0,0 +1,99 @@
+# robotiaga-perfumeshopnew/benchmarks/compact_rows_benchmark.py
+"""Бенчмарк представления строк кэша: dict на строку против компактных классов со __slots__.
+
+Для "Товары", "Пользователи" и "Заказы" (по умолчанию 100k строк) меряется:
+- удерживаемая память снимка листа со всеми индексами (tracemalloc);
+- время построения снимка и диффа со свежими строками без изменений;
+- задержка чтения: row.get по всем строкам и select по индексу.
+
+Запуск из корня проекта:
+    python -m benchmarks.compact_rows_benchmark
+    python -m benchmarks.compact_rows_benchmark --rows 10000 --output rows.json
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from app.database import Order, Product, SheetSnapshot, User, compact_row_class
+
+from .service_benchmark import _order, _product, _user
+
+SHEETS = {
+    "Товары": (Product, _product, ["product_id", "category", "status"], {"category": "Категория 7"}),
+    "Пользователи": (User, _user, ["user_id"], {"user_id": 777}),
+    "Заказы": (Order, _order, ["order_number", "user_id", "status"], {"user_id": "77"}),
+}
+
+
+def _measure_layout(rows_count: int, model_class, make_row, indexed, criteria, row_factory) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    # Словари строк, как их отдает бэкенд: в варианте dict они и остаются в снимке
+    source_rows = [make_row(position) for position in range(1, rows_count + 1)]
+    started = time.perf_counter()
+    snapshot = SheetSnapshot.build(model_class.__name__, source_rows, indexed, 1, row_factory=row_factory)
+    build_seconds = time.perf_counter() - started
+    del source_rows
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fresh_rows = [make_row(position) for position in range(1, rows_count + 1)]
+    started = time.perf_counter()
+    _, change_set = snapshot.diff(fresh_rows, indexed[0])
+    diff_seconds = time.perf_counter() - started
+    assert change_set.is_empty()
+
+    started = time.perf_counter()
+    for row in snapshot.rows:
+        row.get("status")
+    scan_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    selected = snapshot.select(criteria)
+    select_seconds = time.perf_counter() - started
+    return {
+        "retained_bytes": current - baseline,
+        "bytes_per_row": round((current - baseline) / rows_count, 1),
+        "peak_bytes": peak - baseline,
+        "build_ms": round(build_seconds * 1000, 2),
+        "diff_unchanged_ms": round(diff_seconds * 1000, 2),
+        "scan_get_ms": round(scan_seconds * 1000, 2),
+        "select_indexed_ms": round(select_seconds * 1000, 3),
+        "selected_rows": len(selected),
+    }
+
+
+def run_benchmark(rows_count: int) -> dict:
+    report = {"rows": rows_count, "sheets": {}}
+    for sheet_alias, (model_class, make_row, indexed, criteria) in SHEETS.items():
+        layouts = {
+            "dict": _measure_layout(rows_count, model_class, make_row, indexed, criteria, None),
+            "compact": _measure_layout(
+                rows_count, model_class, make_row, indexed, criteria,
+                compact_row_class(model_class).from_mapping,
+            ),
+        }
+        layouts["compact_to_dict_memory_ratio"] = round(
+            layouts["compact"]["retained_bytes"] / layouts["dict"]["retained_bytes"], 3
+        )
+        report["sheets"][sheet_alias] = layouts
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию только stdout)")
+    args = parser.parse_args()
+    report_json = json.dumps(run_benchmark(args.rows), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report_json)
+    print(report_json)
+
+
+if __name__ == "__main__":
+    main()
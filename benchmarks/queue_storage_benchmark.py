@@ -0,0 +1,204 @@
+# robotiaga-perfumeshopnew/benchmarks/queue_storage_benchmark.py
+"""Бенчмарк хранилища очереди SQLite: настройки по умолчанию против настроенного режима.
+
+default - настройки SQLite по умолчанию, без индекса (status, created_at), ORM-сессия на каждую постановку.
+tuned   - WAL + synchronous=NORMAL, составной индекс, один писатель с групповым коммитом.
+
+Меряется скорость постановки в очередь (операций/с при параллельных постановках)
+и задержка выборки пачки воркером при 10k / 100k / 1M строк в очереди.
+
+Запуск из корня проекта:
+    python -m benchmarks.queue_storage_benchmark
+    python -m benchmarks.queue_storage_benchmark --sizes 10000 100000 --enqueue-ops 5000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import PendingSheetOperation, SqliteBase
+from app.database.queue_storage import (
+    SqliteQueueWriter,
+    configure_sqlite_queue_engine,
+    claim_operations_statement,
+    select_ready_operations,
+)
+
+INDEX_NAME = "ix_pending_sheet_operations_status_created_at"
+
+
+def _operation_values(position: int) -> dict:
+    return {
+        "sheet_alias": "Пользователи",
+        "operation_type": "UPDATE",
+        "filter_criteria_json": json.dumps({"user_id": position}),
+        "data_payload_json": json.dumps({"username": f"user_{position}"}),
+        "status": "pending",
+        "attempts": 0,
+        "created_at": datetime.datetime.utcnow(),
+    }
+
+
+async def _open_queue_engine(db_path: str, tuned: bool):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    if tuned:
+        configure_sqlite_queue_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SqliteBase.metadata.create_all)
+        if not tuned:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+    return engine
+
+
+async def _bench_enqueue(db_path: str, tuned: bool, total_ops: int, concurrency: int) -> dict:
+    engine = await _open_queue_engine(db_path, tuned)
+    writer = None
+    if tuned:
+        writer = SqliteQueueWriter(engine)
+        await writer.start()
+
+        async def enqueue(position: int):
+            await writer.enqueue(_operation_values(position))
+
+    else:
+        session_factory = sessionmaker(
+            bind=engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+        async def enqueue(position: int):
+            async with session_factory() as session:
+                async with session.begin():
+                    session.add(PendingSheetOperation(**_operation_values(position)))
+                    await session.flush()
+
+    async def producer(start: int):
+        for position in range(start, total_ops, concurrency):
+            await enqueue(position)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(producer(start) for start in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = {"ops": total_ops, "seconds": round(elapsed, 3), "ops_per_sec": round(total_ops / elapsed, 1)}
+    if writer is not None:
+        result["commits"] = writer.stats["commits"]
+        await writer.close()
+    await engine.dispose()
+    return result
+
+
+def _prefill(db_path: str, rows: int):
+    """Быстрое наполнение очереди напрямую через sqlite3 (только для бенчмарка)."""
+    connection = sqlite3.connect(db_path)
+    base_time = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    chunk = 50_000
+    for chunk_start in range(0, rows, chunk):
+        connection.executemany(
+            "INSERT INTO pending_sheet_operations (sheet_alias, operation_type, filter_criteria_json, "
+            "data_payload_json, status, attempts, created_at) VALUES (?, ?, ?, ?, ?, 0, ?)",
+            (
+                (
+                    "Пользователи",
+                    "UPDATE",
+                    json.dumps({"user_id": position}),
+                    json.dumps({"username": f"user_{position}"}),
+                    # Часть очереди - уже упавшие операции, которые выборка должна пропускать
+                    "failed_max_attempts" if position % 10 == 0 else "pending",
+                    base_time + datetime.timedelta(milliseconds=position),
+                )
+                for position in range(chunk_start, min(rows, chunk_start + chunk))
+            ),
+        )
+        connection.commit()
+    # Наполнение не должно оставлять большой WAL: его перенос в базу попал бы в замер первых выборок
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+
+
+async def _bench_claim(db_path: str, tuned: bool, rows: int, claims: int, batch_size: int) -> dict:
+    engine = await _open_queue_engine(db_path, tuned)
+    _prefill(db_path, rows)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    latencies = []
+    for _ in range(claims):
+        started = time.perf_counter()
+        claimed_at = datetime.datetime.utcnow()
+        async with session_factory() as session:
+            async with session.begin():
+                if tuned:
+                    operations = await select_ready_operations(session, batch_size)
+                else:
+                    # Прежняя выборка: один запрос со status IN (...)
+                    result = await session.execute(
+                        select(PendingSheetOperation)
+                        .where(PendingSheetOperation.status.in_(["pending", "retry"]))
+                        .order_by(PendingSheetOperation.created_at, PendingSheetOperation.id)
+                        .limit(batch_size)
+                    )
+                    operations = list(result.scalars())
+                await session.execute(
+                    claim_operations_statement(
+                        [operation.id for operation in operations], claimed_at
+                    )
+                )
+        latencies.append((time.perf_counter() - started) * 1000)
+    await engine.dispose()
+    return {
+        "rows": rows,
+        "claim_p50_ms": round(statistics.median(latencies), 3),
+        "claim_max_ms": round(max(latencies), 3),
+    }
+
+
+async def run_benchmark(sizes, enqueue_ops: int, concurrency: int, claims: int, batch_size: int) -> dict:
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in ("default", "tuned"):
+            tuned = mode == "tuned"
+            mode_report = {
+                "enqueue": await _bench_enqueue(
+                    os.path.join(tmp_dir, f"enqueue_{mode}.sqlite3"), tuned, enqueue_ops, concurrency
+                ),
+                "claim": [],
+            }
+            for rows in sizes:
+                db_path = os.path.join(tmp_dir, f"claim_{mode}_{rows}.sqlite3")
+                mode_report["claim"].append(
+                    await _bench_claim(db_path, tuned, rows, claims, batch_size)
+                )
+                os.remove(db_path)
+            report[mode] = mode_report
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--enqueue-ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--claims", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    report = asyncio.run(
+        run_benchmark(args.sizes, args.enqueue_ops, args.concurrency, args.claims, args.batch_size)
+    )
+    for mode, mode_report in report.items():
+        enqueue = mode_report["enqueue"]
+        print(f"[{mode}] enqueue: {enqueue['ops_per_sec']} ops/s ({enqueue['ops']} ops, {enqueue['seconds']} s)")
+        for claim in mode_report["claim"]:
+            print(
+                f"[{mode}] claim at {claim['rows']:>9} rows: p50 {claim['claim_p50_ms']} ms, "
+                f"max {claim['claim_max_ms']} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+# robotiaga-perfumeshopnew/benchmarks/service_benchmark.py
+"""Бенчмарк AsyncSheetServiceWithQueue на локальном fake-бэкенде (без сети).
+
+Для каждого размера листов (по умолчанию 1k / 10k / 100k строк в "Товары",
+"Пользователи" и "Заказы") меряется:
+- задержка read_rows_from_cache (p50/p99) без фильтра, с фильтрами и сортировкой;
+- длительность refresh листа (без изменений и с изменением 1% строк);
+- пиковая и удерживаемая память кэша по листам (tracemalloc).
+Отдельно меряется скорость постановки create_row / update_rows в очередь
+и скорость разбора очереди воркером (с задержкой fake-бэкенда --backend-latency).
+
+Результат - JSON (stdout и --output), чтобы сравнивать релизы между собой.
+
+Запуск из корня проекта:
+    python -m benchmarks.service_benchmark
+    python -m benchmarks.service_benchmark --sizes 1000 10000 --output bench.json
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import func, select
+
+from app.database import (
+    AsyncSheetServiceWithQueue,
+    DeliveryType,
+    LocalFakeSheetBackend,
+    Mailing,
+    Order,
+    PaymentSetting,
+    PendingSheetOperation,
+    Product,
+    User,
+)
+
+SHEET_URL = "https://docs.google.com/spreadsheets/d/local-benchmark/edit"
+MODEL_MAP = {
+    "Товары": Product,
+    "Заказы": Order,
+    "Тип доставки": DeliveryType,
+    "Настройка платежей": PaymentSetting,
+    "Рассылки": Mailing,
+    "Пользователи": User,
+}
+SCALED_SHEETS = ("Товары", "Пользователи", "Заказы")
+CATEGORIES = [f"Категория {position}" for position in range(40)]
+STATUSES = ["В наличии", "Нет в наличии", "Забронирован"]
+
+READ_CASES = {
+    "all_rows": {},
+    "filter_indexed": {"filter_criteria": {"category": "Категория 7"}},
+    "filter_not_indexed": {"filter_criteria": {"product_type": "Штучный"}},
+    "sort_by_name": {"order_by_attributes": ["product_name"]},
+    "filter_sort_page": {
+        "filter_criteria": {"category": "Категория 7", "status": "В наличии"},
+        "order_by_attributes": ["-price_per_unit", "product_name"],
+        "row_limit": 10,
+        "row_offset": 5,
+    },
+}
+
+
+def _product(position: int) -> dict:
+    return {
+        "product_id": position,
+        "product_name": f"Аромат {position:07d}",
+        "photo_url": None,
+        "category": CATEGORIES[position % len(CATEGORIES)],
+        "description": "Описание товара",
+        "price_per_unit": float(100 + (position * 37) % 5000),
+        "unit_of_measure": "мл" if position % 3 else "шт",
+        "product_type": "Объемный" if position % 3 else "Штучный",
+        "portion_type": "Обычный",
+        "order_step": "2.5;5;10",
+        "available_quantity": float(position % 50),
+        "status": STATUSES[position % len(STATUSES)],
+    }
+
+
+def _user(position: int) -> dict:
+    return {
+        "user_id": position,
+        "username": f"user_{position}",
+        "first_name": "Имя",
+        "last_name": None,
+        "is_active": "TRUE",
+        "agreement_accepted_at": None,
+    }
+
+
+def _order(position: int) -> dict:
+    return {
+        "order_number": f"ORD-{position:08d}",
+        "user_id": str(position % 5000),
+        "order_date": datetime.date(2024, 1, 1) + datetime.timedelta(days=position % 365),
+        "item_list_raw": f"{position % 1000}:Объемный:5",
+        "total_amount": float(position % 9000),
+        "delivery_cost": 300.0,
+        "delivery_type_name": "Курьер",
+        "delivery_address": None,
+        "comment": None,
+        "status": "Принят",
+    }
+
+
+def _seed_rows(rows: int) -> dict:
+    return {
+        "Товары": [_product(position) for position in range(1, rows + 1)],
+        "Пользователи": [_user(position) for position in range(1, rows + 1)],
+        "Заказы": [_order(position) for position in range(1, rows + 1)],
+        "Тип доставки": [{"delivery_type_name": "Курьер", "cost": 300.0, "is_active": "TRUE"}],
+        "Настройка платежей": [{"payment_format": "СБП", "recipient_name": "ИП"}],
+        "Рассылки": [],
+    }
+
+
+def _percentiles(latencies_ms) -> dict:
+    ordered = sorted(latencies_ms)
+    return {
+        "p50_ms": round(statistics.median(ordered), 4),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 4),
+        "max_ms": round(ordered[-1], 4),
+        "samples": len(ordered),
+    }
+
+
+async def _start_service(backend: LocalFakeSheetBackend) -> AsyncSheetServiceWithQueue:
+    service = AsyncSheetServiceWithQueue(SHEET_URL, "unused-credentials.json", backend=backend)
+    await service.start_services()
+    await service._initial_gsheet_cache_populated.wait()
+    return service
+
+
+async def _bench_reads(service, iterations: int) -> dict:
+    report = {}
+    for case_name, kwargs in READ_CASES.items():
+        latencies = []
+        result_rows = 0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            rows = await service.read_rows_from_cache("Товары", **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            result_rows = len(rows)
+        report[case_name] = {**_percentiles(latencies), "result_rows": result_rows}
+    return report
+
+
+async def _bench_refresh(service, backend, rows: int, repeats: int) -> dict:
+    unchanged = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await service.force_gsheet_in_memory_cache_refresh("Товары")
+        unchanged.append((time.perf_counter() - started) * 1000)
+    changed = []
+    for repeat in range(repeats):
+        # Меняется 1% строк листа - как при обычном изменении остатков
+        seed = [_product(position) for position in range(1, rows + 1)]
+        for position in range(repeat, rows, 100):
+            seed[position]["available_quantity"] = float(1000 + repeat)
+        backend.load_rows("Товары", seed)
+        started = time.perf_counter()
+        await service.force_gsheet_in_memory_cache_refresh("Товары")
+        changed.append((time.perf_counter() - started) * 1000)
+    return {"unchanged": _percentiles(unchanged), "changed_1pct": _percentiles(changed)}
+
+
+async def _bench_memory(service) -> dict:
+    """Память снимка каждого листа: пик во время скачивания и построения, и сколько остается после."""
+    report = {}
+    for sheet_alias in MODEL_MAP:
+        service._cache_snapshots.pop(sheet_alias, None)
+        gc.collect()
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        await service.force_gsheet_in_memory_cache_refresh(sheet_alias)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = service._cache_snapshots.get(sheet_alias)
+        report[sheet_alias] = {
+            "rows": len(snapshot.rows) if snapshot else 0,
+            "retained_bytes": current - baseline,
+            "peak_bytes": peak - baseline,
+        }
+    return report
+
+
+async def _queue_backlog(service) -> int:
+    async with service.AsyncSqliteSessionLocal() as session:
+        result = await session.execute(
+            select(func.count()).where(
+                PendingSheetOperation.status.in_(["pending", "retry", "processing"])
+            )
+        )
+        return result.scalar_one()
+
+
+async def _bench_queue(enqueue_ops: int, concurrency: int, backend_latency: float) -> dict:
+    backend = LocalFakeSheetBackend(
+        MODEL_MAP, seed_rows=_seed_rows(enqueue_ops), latency_seconds=backend_latency
+    )
+    service = await _start_service(backend)
+    report = {}
+    try:
+        for operation_name in ("create_row", "update_rows"):
+
+            async def enqueue(position: int):
+                if operation_name == "create_row":
+                    await service.create_row("Товары", _product(10_000_000 + position))
+                else:
+                    await service.update_rows(
+                        "Товары", {"product_id": position + 1}, {"available_quantity": 1.0}
+                    )
+
+            async def producer(start: int):
+                for position in range(start, enqueue_ops, concurrency):
+                    await enqueue(position)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(producer(start) for start in range(concurrency)))
+            enqueued_at = time.perf_counter()
+            while await _queue_backlog(service):
+                await asyncio.sleep(0.02)
+            drained_at = time.perf_counter()
+            report[operation_name] = {
+                "ops": enqueue_ops,
+                "enqueue_seconds": round(enqueued_at - started, 3),
+                "enqueue_ops_per_sec": round(enqueue_ops / (enqueued_at - started), 1),
+                # От первой постановки до пустой очереди: воркер разбирает очередь параллельно с постановкой
+                "drain_seconds": round(drained_at - started, 3),
+                "drain_ops_per_sec": round(enqueue_ops / (drained_at - started), 1),
+            }
+        report["backend_requests"] = backend.stats["requests"]
+        report["coalescing"] = service.get_queue_coalescing_stats()
+    finally:
+        await service.close()
+    return report
+
+
+async def run_benchmark(
+    sizes, read_iterations: int, refresh_repeats: int, enqueue_ops: int, concurrency: int,
+    backend_latency: float,
+) -> dict:
+    report = {
+        "meta": {
+            "started_at": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend_latency_seconds": backend_latency,
+        },
+        "sizes": [],
+    }
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Очередь SQLite, каталог и снимок кэша сервис создает в текущем каталоге
+        os.chdir(tmp_dir)
+        try:
+            for rows in sizes:
+                backend = LocalFakeSheetBackend(
+                    MODEL_MAP, seed_rows=_seed_rows(rows), latency_seconds=backend_latency
+                )
+                started = time.perf_counter()
+                service = await _start_service(backend)
+                initial_population = time.perf_counter() - started
+                try:
+                    report["sizes"].append(
+                        {
+                            "rows": rows,
+                            "initial_population_seconds": round(initial_population, 3),
+                            "read_rows_from_cache": await _bench_reads(service, read_iterations),
+                            "refresh": await _bench_refresh(service, backend, rows, refresh_repeats),
+                            "memory": await _bench_memory(service),
+                        }
+                    )
+                finally:
+                    await service.close()
+                for path in os.listdir(tmp_dir):
+                    os.remove(os.path.join(tmp_dir, path))
+            report["queue"] = await _bench_queue(enqueue_ops, concurrency, backend_latency)
+        finally:
+            os.chdir(original_cwd)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--read-iterations", type=int, default=50)
+    parser.add_argument("--refresh-repeats", type=int, default=3)
+    parser.add_argument("--enqueue-ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--backend-latency", type=float, default=0.05)
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию только stdout)")
+    args = parser.parse_args()
+    # Сервис подробно логирует каждое скачивание и операцию - в бенчмарке это шум
+    logging.getLogger().setLevel(logging.WARNING)
+    report = asyncio.run(
+        run_benchmark(
+            args.sizes,
+            args.read_iterations,
+            args.refresh_repeats,
+            args.enqueue_ops,
+            args.concurrency,
+            args.backend_latency,
+        )
+    )
+    report_json = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report_json)
+    print(report_json)
+
+
+if __name__ == "__main__":
+    main()
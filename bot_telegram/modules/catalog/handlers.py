@@ -1,10 +1,11 @@
 # robotiaga-perfumeshopnew/bot_telegram/modules/catalog/handlers.py
 import logging
-import math
+from typing import Dict, Optional, Tuple
+
 from aiogram import Router, F, types
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, Message, InlineKeyboardButton
+from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -22,6 +23,12 @@ from bot_telegram.modules.user_management.handlers import send_or_edit_main_menu
 logger = logging.getLogger(__name__)
 catalog_router = Router()
 
+# Отрисованные клавиатуры каталога, привязанные к версиям представлений каталога в sheet_service:
+# (версия списка категорий, клавиатура) и (категория, страница) -> (версия категории, текст, клавиатура)
+RENDERED_PAGES_CACHE_SIZE = 1000
+_rendered_categories: Optional[Tuple[int, InlineKeyboardMarkup]] = None
+_rendered_product_pages: Dict[Tuple[str, int], Tuple[int, str, InlineKeyboardMarkup]] = {}
+
 
 # --- Утилита для отправки/редактирования сообщений ---
 async def send_or_edit_message(
@@ -77,8 +84,8 @@ async def show_categories_list(target: Message | CallbackQuery, state: FSMContex
     await state.set_state(CatalogNavigation.choosing_category)
     logger.info(f"User {target.from_user.id} choosing category.")
 
-    all_products = await sheet_service.get_data_from_cache("Товары")
-    if not all_products:
+    catalog_views = await sheet_service.get_catalog_views()
+    if catalog_views is None or not catalog_views.sheet_rows:
         await send_or_edit_message(
             target,
             "К сожалению, каталог товаров сейчас пуст.",
@@ -87,8 +94,7 @@ async def show_categories_list(target: Message | CallbackQuery, state: FSMContex
         )
         return
 
-    categories = sorted(list(set(p.get("category") for p in all_products if p.get("category"))))
-    if not categories:
+    if not catalog_views.categories:
         await send_or_edit_message(
             target,
             "Категории товаров не найдены.",
@@ -97,7 +103,14 @@ async def show_categories_list(target: Message | CallbackQuery, state: FSMContex
         )
         return
 
-    await send_or_edit_message(target, "Выберите категорию:", get_categories_keyboard(categories))
+    # Клавиатура категорий перестраивается, только если изменился сам список категорий
+    global _rendered_categories
+    if _rendered_categories is None or _rendered_categories[0] != catalog_views.categories_version:
+        _rendered_categories = (
+            catalog_views.categories_version,
+            get_categories_keyboard(list(catalog_views.categories)),
+        )
+    await send_or_edit_message(target, "Выберите категорию:", _rendered_categories[1])
 
 
 # Вход в каталог из главного меню
@@ -125,16 +138,12 @@ async def show_products_page(
     await state.update_data(current_category=category_name, current_page_in_category=page)
     logger.info(f"User {target.from_user.id} viewing category '{category_name}', page {page}.")
 
-    # Получаем все товары этой категории (sheet_service вернет уже отфильтрованные)
-    all_products_in_cat = await sheet_service.read_rows_from_cache(
-        "Товары", filter_criteria={"category": category_name}
-    )
-
+    # Товары категории, уже отсортированные по имени без учета регистра (представления каталога в sheet_service)
     # Дополнительная фильтрация, если нужна (например, по статусу "Доступен" или "Активен")
     # По ТЗ: "Если флакон полностью забронирован, отображается статус «Забронирован» и недоступен для заказа."
     # Это будет учтено при формировании кнопки товара или на странице деталей. Для списка покажем все.
-    # Сортировка
-    products_to_display = sorted(all_products_in_cat, key=lambda p: p.get("product_name", "").lower())
+    catalog_views = await sheet_service.get_catalog_views()
+    products_to_display = catalog_views.products(category_name) if catalog_views is not None else ()
 
     if not products_to_display:
         text = f"В категории '{category_name}' пока нет товаров."
@@ -143,18 +152,22 @@ async def show_products_page(
         builder.row(InlineKeyboardButton(text="⏪ К категориям", callback_data=NavigationCallback(to="catalog").pack()))
         reply_markup = builder.as_markup()
     else:
-        total_items = len(products_to_display)
-        total_pages = math.ceil(total_items / ITEMS_PER_PAGE)
-        page = max(1, min(page, total_pages))  # Коррекция номера страницы, если он вышел за пределы
-
-        start_index = (page - 1) * ITEMS_PER_PAGE
-        end_index = start_index + ITEMS_PER_PAGE
-        products_on_page = products_to_display[start_index:end_index]
-
-        text = f"Категория: {category_name} (стр. {page}/{total_pages})\nВыберите товар:"
-        reply_markup = get_products_in_category_keyboard(
-            category_name, products_on_page, page, total_pages
-        )
+        # page корректируется, если номер страницы вышел за пределы
+        products_on_page, page, total_pages = catalog_views.page(category_name, page, ITEMS_PER_PAGE)
+
+        # Страница перерисовывается, только если товары категории изменились с прошлой отрисовки
+        category_version = catalog_views.category_version(category_name)
+        rendered = _rendered_product_pages.get((category_name, page))
+        if rendered is not None and rendered[0] == category_version:
+            _, text, reply_markup = rendered
+        else:
+            text = f"Категория: {category_name} (стр. {page}/{total_pages})\nВыберите товар:"
+            reply_markup = get_products_in_category_keyboard(
+                category_name, list(products_on_page), page, total_pages
+            )
+            if len(_rendered_product_pages) >= RENDERED_PAGES_CACHE_SIZE:
+                _rendered_product_pages.clear()
+            _rendered_product_pages[(category_name, page)] = (category_version, text, reply_markup)
 
     await send_or_edit_message(target, text, reply_markup)
 
@@ -25,16 +25,94 @@ EXPECTED_SHEET_TITLES = [
     "Пользователи",
 ]
 
+# Источник данных листов: "gsheets" - Google Sheets (Shillelagh + gspread),
+# "fake" - листы в памяти процесса, для запуска и нагрузочных тестов без сети
+SHEET_BACKEND = "gsheets"
+FAKE_SHEET_BACKEND_SEED_PATH = None  # JSON {"Лист": [{атрибут: значение}, ...]} с начальными строками
+FAKE_SHEET_BACKEND_LATENCY_SECONDS = 0.0  # Задержка каждого запроса к fake-бэкенду
+FAKE_SHEET_BACKEND_LATENCY_JITTER_SECONDS = 0.0  # Случайная добавка к задержке (0..значение)
+FAKE_SHEET_BACKEND_ERROR_RATE = 0.0  # Доля запросов, падающих с ошибкой
+FAKE_SHEET_BACKEND_REQUESTS_PER_MINUTE = None  # Квота запросов в минуту (None - без ограничения)
+
+# Каталог листов (название -> URL с gid), сохраненный с прошлого запуска: с ним сервис стартует
+# без обращения к Google, а актуальный каталог перепроверяется в фоне
+GSHEET_CATALOG_CACHE_PATH = "gsheet_catalog_cache.json"
+# Снимок in-memory кэша (строки листов с версиями и временем скачивания) для теплого старта.
+# Пишется после refresh с паузой CACHE_SNAPSHOT_SAVE_DEBOUNCE_SECONDS; None - не сохранять
+CACHE_SNAPSHOT_PATH = "gsheet_cache_snapshot.bin"
+CACHE_SNAPSHOT_SAVE_DEBOUNCE_SECONDS = 5
+
 # Cache settings
-CACHE_REFRESH_INTERVAL_SECONDS = 5 * 60  # 5 minutes
+CACHE_REFRESH_INTERVAL_SECONDS = 5 * 60  # 5 minutes (по умолчанию для листов без своего интервала)
+# Индивидуальные интервалы обновления листов: остатки в "Товары" меняются часто,
+# настройки платежей и доставки - почти никогда
+SHEET_REFRESH_INTERVALS_SECONDS = {
+    "Товары": 60,
+    "Заказы": 5 * 60,
+    "Пользователи": 5 * 60,
+    "Рассылки": 5 * 60,
+    "Тип доставки": 30 * 60,
+    "Настройка платежей": 60 * 60,
+}
+CACHE_REFRESH_JITTER_RATIO = 0.1  # Случайное отклонение интервала, +-10%
+CACHE_REFRESH_MAX_CONCURRENT_FETCHES = 2  # Сколько листов можно скачивать одновременно
+# Загрузка всех листов (старт, принудительное обновление всего кэша) одним пакетным запросом
+# values.batchGet вместо отдельного ORM-запроса Shillelagh на каждый лист. Плановое обновление
+# одного листа тогда тоже идет через values (тот же разбор ячеек, строки не различаются по пути)
+CACHE_BATCH_FETCH = True
+# Перед плановым обновлением листа спрашивать дешевую ревизию таблицы и не скачивать лист, если она не менялась
+CACHE_CHANGE_PROBE_ENABLED = True
+# Вторичные хэш-индексы in-memory кэша (первичный ключ модели индексируется всегда)
+CACHE_SECONDARY_INDEXES = {
+    "Товары": ["category", "status"],
+    "Заказы": ["user_id", "status"],
+}
+# Хранить строки кэша в компактных классах со __slots__ по моделям листов (вместо dict на строку).
+# Для кода бота ничего не меняется: строки по-прежнему читаются как словари (.get, [], {**row})
+CACHE_COMPACT_ROWS = True
+# Лист каталога товаров: по нему строится колоночное представление для фильтров и сортировок каталога
+CATALOG_SHEET_ALIAS = "Товары"
+
+# Метрики сервиса в формате Prometheus: GET http://METRICS_HTTP_HOST:METRICS_HTTP_PORT/metrics
+METRICS_HTTP_ENABLED = False
+METRICS_HTTP_HOST = "127.0.0.1"  # Только локально; наружу - через прокси или агент сбора метрик
+METRICS_HTTP_PORT = 9108
 
 # SQLite database path (for pending operations queue)
 SQLITE_DB_PATH = "sheet_operations_queue.sqlite3" # Будет создан в корне проекта
 PENDING_OPERATIONS_TABLE_NAME = "pending_sheet_operations"
+# Настроенное хранилище очереди: WAL, synchronous и один долгоживущий писатель с групповым коммитом
+# (False - как раньше: настройки SQLite по умолчанию и отдельная ORM-сессия на каждую постановку)
+SQLITE_QUEUE_TUNED_STORAGE = True
+SQLITE_QUEUE_JOURNAL_MODE = "WAL"
+SQLITE_QUEUE_SYNCHRONOUS = "NORMAL" # В режиме WAL без fsync на каждый коммит
+SQLITE_QUEUE_WRITER_MAX_BATCH_ROWS = 500 # Сколько строк максимум в одном групповом коммите
 
 # Worker settings
-QUEUE_WORKER_INTERVAL_SECONDS = 30 # Как часто воркер проверяет очередь SQLite
+QUEUE_WORKER_INTERVAL_SECONDS = 30 # Страховочный опрос очереди SQLite (основной сигнал - пробуждение при записи)
+QUEUE_WORKER_RETRY_DELAY_SECONDS = 30 # Пауза перед повтором неудачной операции
+QUEUE_WORKER_BATCH_WINDOW_SECONDS = 0.2 # После пробуждения подождать, чтобы собрать всплеск записей в одну пачку
+QUEUE_WORKER_SAFETY_POLL_WHEN_IDLE = False # Опрашивать пустую очередь по интервалу (нужно, если в ту же SQLite пишет другой процесс)
 QUEUE_WORKER_MAX_ATTEMPTS = 5 # Макс. попыток для одной операции
+QUEUE_WORKER_BATCH_SIZE = 50 # Сколько операций воркер забирает за один проход (1 - по одной, как раньше)
+QUEUE_WORKER_CONCURRENCY = 4 # Сколько групп операций (пачек одного листа) отправляется в GSheet параллельно
+QUEUE_WORKER_MAX_CONCURRENT_PER_SHEET = 1 # Лимит параллельных групп на один лист; >1 действует только для бэкендов с адресацией строк по ключу (не gsheets)
+QUEUE_COALESCE_OPERATIONS = True # Сливать операции одной строки из пачки перед отправкой в GSheet
+QUEUE_BATCH_APPEND_CREATES = True # Подряд идущие CREATE одного листа отправлять одним append-запросом
+# После подтвержденной записи лист не перескачивается: результат применяется к кэшу напрямую.
+# Перескачивание нужно, только если во время записи кэш был перезаписан обновлением листа -
+# такие перескачивания сливаются в одно на лист за окно
+QUEUE_POST_WRITE_REFRESH_DEBOUNCE_SECONDS = 10
+# Слой неподтвержденных операций очереди: накладывается на каждый скачанный снимок листа,
+# пока запись не подтверждена (и не видна в скачанных строках) или не завершилась ошибкой.
+# Обновление листа не стирает оптимистичные записи, и перескачивание после записи не нужно
+QUEUE_PENDING_OVERLAY = True
+
+# Блокирующие вызовы бэкенда листов идут в свои пулы потоков, а не в общий executor asyncio:
+# скачивания листов (и пробы изменений) и записи воркера очереди не отнимают потоки друг у друга
+BACKEND_REFRESH_POOL_SIZE = 4
+BACKEND_WRITE_POOL_SIZE = 4
+BACKEND_SHUTDOWN_TIMEOUT_SECONDS = 10 # close() ждет выполняющиеся вызовы столько, затем бросает их
 
 # Check for credentials file existence
 if not os.path.exists(CREDENTIALS_JSON_PATH):